@@ -0,0 +1,131 @@
+"""
+Running grade totals for GPA and class-average lookups.
+
+Instead of summing every grade entry on each lookup, the JSON layouts keep
+the count and sum of grades per student and subject and per subject
+school-wide:
+
+    {
+      "students": {"student_1": {"Math": {"count": 3, "sum": 251.0}, ...}},
+      "subjects": {"Math": {"count": 120, "sum": 9874.5}, ...}
+    }
+
+database.json stores them under its "aggregates" key, in the same write as
+the grades they describe; the students.py layout keeps them in
+data/grade_totals.json. The functions here only build change records (see
+jsonstore), so the callers decide where and how they are persisted.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from jsonstore import change
+
+EMPTY = {"count": 0, "sum": 0.0}
+
+def totals(entries: List[Dict]) -> Dict:
+    """Count and sum of a list of grade entries"""
+    return {"count": len(entries), "sum": float(sum(e["grade"] for e in entries))}
+
+def build(grades: Dict) -> Dict:
+    """Compute the aggregates of a {student_id: {subject: [entries]}} dictionary from scratch"""
+    students = {}
+    subjects = {}
+    for student_id, student_grades in grades.items():
+        for subject, entries in student_grades.items():
+            if not entries:
+                continue
+            pair = totals(entries)
+            students.setdefault(student_id, {})[subject] = pair
+            subject_totals = subjects.setdefault(subject, {"count": 0, "sum": 0.0})
+            subject_totals["count"] += pair["count"]
+            subject_totals["sum"] += pair["sum"]
+    return {"students": students, "subjects": subjects}
+
+def subject_totals(students: Dict) -> Dict:
+    """School-wide per-subject totals from the per-student ones"""
+    subjects = {}
+    for pairs in students.values():
+        for subject, pair in pairs.items():
+            subject_totals = subjects.setdefault(subject, {"count": 0, "sum": 0.0})
+            subject_totals["count"] += pair["count"]
+            subject_totals["sum"] += pair["sum"]
+    return subjects
+
+def refresh(aggregates: Dict, lists: Dict[Tuple[str, str], List[Dict]], prefix: List) -> List[Dict]:
+    """Changes that bring the aggregates in line with new grade lists.
+
+    lists maps (student_id, subject) to that pair's complete list of grade
+    entries after a write. A pair whose stored count is already higher was
+    refreshed by a later write and is left alone, so refreshes that reach a
+    separate aggregates document out of order are harmless.
+    """
+    changes = []
+    deltas: Dict[str, List] = {}
+    stored_students = aggregates.get("students", {})
+
+    for (student_id, subject), entries in lists.items():
+        new = totals(entries)
+        old = stored_students.get(student_id, {}).get(subject, EMPTY)
+        if new["count"] < old["count"] or new == old:
+            continue
+        changes.append(change("set", prefix + ["students", student_id, subject], new))
+        delta = deltas.setdefault(subject, [0, 0.0])
+        delta[0] += new["count"] - old["count"]
+        delta[1] += new["sum"] - old["sum"]
+
+    changes.extend(_shift_subjects(aggregates, deltas, prefix))
+    return changes
+
+def remove(aggregates: Dict, student_id: str, prefix: List) -> List[Dict]:
+    """Changes that drop a student's grades from the aggregates"""
+    pairs = aggregates.get("students", {}).get(student_id)
+    if pairs is None:
+        return []
+
+    deltas = {subject: [-pair["count"], -pair["sum"]] for subject, pair in pairs.items()}
+    return [change("delete", prefix + ["students", student_id])] + _shift_subjects(aggregates, deltas, prefix)
+
+def _shift_subjects(aggregates: Dict, deltas: Dict[str, List], prefix: List) -> List[Dict]:
+    changes = []
+    stored_subjects = aggregates.get("subjects", {})
+    for subject, (count, total) in deltas.items():
+        old = stored_subjects.get(subject, EMPTY)
+        if old["count"] + count <= 0:
+            if subject in stored_subjects:
+                changes.append(change("delete", prefix + ["subjects", subject]))
+            continue
+        changes.append(change("set", prefix + ["subjects", subject],
+                              {"count": old["count"] + count, "sum": old["sum"] + total}))
+    return changes
+
+def average(pair: Optional[Dict]) -> Tuple[float, int]:
+    """(average, count) of a count/sum pair; (0.0, 0) when there is nothing to average"""
+    if not pair or pair["count"] == 0:
+        return 0.0, 0
+    return pair["sum"] / pair["count"], pair["count"]
+
+def compare(stored: Any, rebuilt: Dict) -> List[Dict]:
+    """Differences between stored aggregates and freshly built ones"""
+    stored = stored or {}
+    mismatches = []
+
+    def check(key: str, old: Optional[Dict], new: Optional[Dict]):
+        old = old or EMPTY
+        new = new or EMPTY
+        if old["count"] != new["count"] or abs(old["sum"] - new["sum"]) > 1e-6 * max(1.0, abs(new["sum"])):
+            mismatches.append({"key": key, "stored": dict(old), "actual": dict(new)})
+
+    stored_students = stored.get("students", {})
+    rebuilt_students = rebuilt["students"]
+    for student_id in list(rebuilt_students) + [s for s in stored_students if s not in rebuilt_students]:
+        old_pairs = stored_students.get(student_id, {})
+        new_pairs = rebuilt_students.get(student_id, {})
+        for subject in list(new_pairs) + [s for s in old_pairs if s not in new_pairs]:
+            check(f"{student_id}/{subject}", old_pairs.get(subject), new_pairs.get(subject))
+
+    stored_subjects = stored.get("subjects", {})
+    rebuilt_subjects = rebuilt["subjects"]
+    for subject in list(rebuilt_subjects) + [s for s in stored_subjects if s not in rebuilt_subjects]:
+        check(subject, stored_subjects.get(subject), rebuilt_subjects.get(subject))
+
+    return mismatches
@@ -1,15 +1,13 @@
+import instrument  # first, so the import phase covers the other imports
 import json
 import sys
 from datetime import datetime
-from database import load_db, save_db
+from typing import Dict, List, Optional, Tuple
+from database import STORE
+from jsonstore import change
 
 def create_assignment(title: str, description: str, subject: str, due_date: str, created_by: str):
     """Create a new assignment"""
-    db = load_db()
-    
-    if "assignments" not in db:
-        db["assignments"] = {}
-    
     assignment_id = f"assignment_{datetime.now().timestamp()}_{id(object())}"
     
     assignment = {
@@ -22,102 +20,196 @@ def create_assignment(title: str, description: str, subject: str, due_date: str,
         "createdAt": datetime.now().isoformat()
     }
     
-    db["assignments"][assignment_id] = assignment
-    save_db(db)
+    # The assignment index (see storage.DERIVED) follows by itself
+    STORE.put("assignments", assignment_id, assignment)
     
     return json.dumps(assignment)
 
-def get_assignments_by_subject(subject: str):
-    """Get all assignments for a subject"""
-    db = load_db()
-    
-    if "assignments" not in db:
-        return json.dumps([])
-    
-    assignments = [a for a in db["assignments"].values() if a["subject"] == subject]
-    return json.dumps(assignments)
+def query_assignments(subject: Optional[str] = None, created_by: Optional[str] = None,
+                      due_from: Optional[str] = None, due_to: Optional[str] = None, by_due_date: bool = False,
+                      limit: Optional[int] = None, after: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+    """Filtered assignments in creation (or due date) order, one page at a time.
 
-def get_all_assignments():
-    """Get all assignments"""
-    db = load_db()
-    
-    if "assignments" not in db:
-        return json.dumps([])
-    
-    return json.dumps(list(db["assignments"].values()))
+    A due date range implies due date order. after is the ID of the last
+    assignment of the previous page. Returns the page and the cursor for the
+    next one (None on the last page).
+    """
+    by_due_date = by_due_date or due_from is not None or due_to is not None
+    page = STORE.query_assignments(subject, created_by, due_from, due_to, by_due_date,
+                                   None if limit is None else limit + 1, after)
+    
+    if limit is not None and len(page) > limit:
+        page = page[:limit]
+        return page, page[-1]["id"] if page else None
+    return page, None
+
+def _paged(page: Tuple[List[Dict], Optional[str]], limit: Optional[int]) -> str:
+    # Without --limit the commands keep returning a plain list
+    assignments, cursor = page
+    if limit is None:
+        return json.dumps(assignments)
+    return json.dumps({"assignments": assignments, "next": cursor})
+
+def get_assignments_by_subject(subject: str, limit: int = None, after: str = None, **filters):
+    """Get assignments for a subject, optionally one page at a time"""
+    return _paged(query_assignments(subject, limit=limit, after=after, **filters), limit)
+
+def get_all_assignments(limit: int = None, after: str = None, **filters):
+    """Get all assignments, optionally one page at a time"""
+    return _paged(query_assignments(limit=limit, after=after, **filters), limit)
 
 def update_submission(student_id: str, assignment_id: str, status: str, grade: float = None, feedback: str = ""):
     """Update assignment submission status"""
-    db = load_db()
-    
-    if "submissions" not in db:
-        db["submissions"] = {}
-    
-    if student_id not in db["submissions"]:
-        db["submissions"][student_id] = []
-    
-    # Find existing submission
-    submission = None
-    for i, s in enumerate(db["submissions"][student_id]):
-        if s["assignmentId"] == assignment_id:
-            submission = db["submissions"][student_id][i]
-            break
-    
-    if submission is None:
-        submission = {
-            "assignmentId": assignment_id,
-            "studentId": student_id,
-            "status": status,
-            "submittedAt": None,
-            "grade": None,
-            "feedback": ""
-        }
-        db["submissions"][student_id].append(submission)
-    
-    submission["status"] = status
-    if status in ["submitted", "late"]:
-        submission["submittedAt"] = datetime.now().isoformat()
-    if grade is not None:
-        submission["grade"] = grade
-    if feedback:
-        submission["feedback"] = feedback
-    
-    save_db(db)
-    return json.dumps(submission)
+    def apply(existing):
+        if existing is None:
+            submission = {
+                "assignmentId": assignment_id,
+                "studentId": student_id,
+                "status": status,
+                "submittedAt": None,
+                "grade": None,
+                "feedback": ""
+            }
+        else:
+            submission = dict(existing)
+        
+        submission["status"] = status
+        if status in ["submitted", "late"]:
+            submission["submittedAt"] = datetime.now().isoformat()
+        if grade is not None:
+            submission["grade"] = grade
+        if feedback:
+            submission["feedback"] = feedback
+        return submission
+    
+    def plan(db):
+        # Find existing submission
+        entries = db.get("submissions", {}).get(student_id, [])
+        if "submissionIndex" in db:
+            position = db["submissionIndex"].get(assignment_id, {}).get(student_id)
+        else:
+            # Written before the index existed (this update builds it), or
+            # an engine that keeps none
+            position = next((i for i, s in enumerate(entries) if s["assignmentId"] == assignment_id), None)
+        
+        # The submission index (see storage.DERIVED) follows by itself
+        if position is not None:
+            submission = apply(entries[position])
+            return submission, [change("set", ["submissions", student_id, position], submission)]
+        submission = apply(None)
+        return submission, [change("append", ["submissions", student_id], submission)]
+    
+    return json.dumps(STORE.update(plan, ["submissions", "submissionIndex"]))
+
+GRADE_BANDS = ["0-9", "10-19", "20-29", "30-39", "40-49", "50-59", "60-69", "70-79", "80-89", "90-100"]
+
+def submission_summary(assignment_id: str, due_date: Optional[str], submissions: List[Dict]) -> Dict:
+    """Status counts, late count and grade distribution of an assignment's submissions"""
+    statuses = {}
+    for submission in submissions:
+        statuses[submission["status"]] = statuses.get(submission["status"], 0) + 1
+    
+    # Late: marked late, or handed in after the due day
+    due = due_date[:10] if due_date else None
+    late = sum(
+        1 for s in submissions
+        if s["status"] == "late" or (due and s.get("submittedAt") and s["submittedAt"][:10] > due)
+    )
+    
+    grades = [s["grade"] for s in submissions if s.get("grade") is not None]
+    distribution = {band: 0 for band in GRADE_BANDS}
+    for grade in grades:
+        distribution[GRADE_BANDS[min(max(int(grade // 10), 0), 9)]] += 1
+    
+    return {
+        "assignmentId": assignment_id,
+        "total": len(submissions),
+        "statusCounts": statuses,
+        "late": late,
+        "grades": {
+            "count": len(grades),
+            "average": round(sum(grades) / len(grades), 2) if grades else 0.0,
+            "min": min(grades) if grades else None,
+            "max": max(grades) if grades else None,
+            "distribution": distribution
+        },
+        "submissions": submissions
+    }
+
+def get_assignment_submissions(assignment_id: str):
+    """Get every submission for an assignment with status counts, late count and grade distribution"""
+    assignment, submissions = STORE.assignment_submissions(assignment_id)
+    if assignment is None and not submissions:
+        return json.dumps({"error": "Assignment not found"})
+    
+    due_date = assignment.get("dueDate") if assignment else None
+    return json.dumps(submission_summary(assignment_id, due_date, submissions))
 
 def get_student_submissions(student_id: str):
     """Get all submissions for a student"""
-    db = load_db()
-    
-    if "submissions" not in db or student_id not in db["submissions"]:
-        return json.dumps([])
-    
-    return json.dumps(db["submissions"][student_id])
+    return json.dumps(STORE.get("submissions", student_id) or [])
 
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print(json.dumps({"error": "No command provided"}))
-        sys.exit(1)
+QUERY_OPTIONS = {
+    "--limit": "limit",
+    "--after": "after",
+    "--created-by": "created_by",
+    "--due-from": "due_from",
+    "--due-to": "due_to"
+}
+
+def _query_options(args: List[str]) -> Tuple[List[str], Dict]:
+    """Split listing options from positional arguments"""
+    positional = []
+    options = {}
+    i = 0
+    while i < len(args):
+        if args[i] == "--by-due-date":
+            options["by_due_date"] = True
+            i += 1
+        elif args[i] in QUERY_OPTIONS:
+            if i + 1 >= len(args):
+                raise ValueError(f"{args[i]} needs a value")
+            options[QUERY_OPTIONS[args[i]]] = args[i + 1]
+            i += 2
+        else:
+            positional.append(args[i])
+            i += 1
+    if "limit" in options:
+        options["limit"] = int(options["limit"])
+        if options["limit"] < 1:
+            raise ValueError("--limit must be positive")
+    return positional, options
+
+def run_command(args: List[str]) -> Tuple[str, int]:
+    """Run a CLI command and return its output and exit code"""
+    if len(args) < 1:
+        return json.dumps({"error": "No command provided"}), 1
     
-    command = sys.argv[1]
+    command = args[0]
     
     try:
         if command == "create":
-            result = create_assignment(sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5], sys.argv[6])
+            result = create_assignment(args[1], args[2], args[3], args[4], args[5])
         elif command == "get_by_subject":
-            result = get_assignments_by_subject(sys.argv[2])
+            args, options = _query_options(args)
+            result = get_assignments_by_subject(args[1], **options)
         elif command == "get_all":
-            result = get_all_assignments()
+            args, options = _query_options(args)
+            result = get_all_assignments(**options)
         elif command == "update_submission":
-            grade = float(sys.argv[5]) if len(sys.argv) > 5 and sys.argv[5] else None
-            feedback = sys.argv[6] if len(sys.argv) > 6 else ""
-            result = update_submission(sys.argv[2], sys.argv[3], sys.argv[4], grade, feedback)
+            grade = float(args[4]) if len(args) > 4 and args[4] else None
+            feedback = args[5] if len(args) > 5 else ""
+            result = update_submission(args[1], args[2], args[3], grade, feedback)
         elif command == "get_submissions":
-            result = get_student_submissions(sys.argv[2])
+            result = get_student_submissions(args[1])
+        elif command == "get_assignment_submissions":
+            result = get_assignment_submissions(args[1])
         else:
             result = json.dumps({"error": "Unknown command"})
         
-        print(result)
+        return result, 0
     except Exception as e:
-        print(json.dumps({"error": str(e)}))
-        sys.exit(1)
+        return json.dumps({"error": str(e)}), 1
+
+if __name__ == "__main__":
+    sys.exit(instrument.run_cli("assignments.py", run_command, sys.argv[1:]))
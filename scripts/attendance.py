@@ -1,18 +1,15 @@
+import instrument  # first, so the import phase covers the other imports
 import json
 import sys
-from datetime import datetime
-from database import load_db, save_db
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import storage
+from database import STORE
+
+STATUSES = list(storage.ATTENDANCE_STATUSES)
 
 def add_attendance(student_id: str, status: str, subject: str, teacher: str, notes: str = ""):
     """Add attendance record for a student"""
-    db = load_db()
-    
-    if "attendance" not in db:
-        db["attendance"] = {}
-    
-    if student_id not in db["attendance"]:
-        db["attendance"][student_id] = []
-    
     record = {
         "date": datetime.now().isoformat(),
         "status": status,
@@ -21,38 +18,40 @@ def add_attendance(student_id: str, status: str, subject: str, teacher: str, not
         "notes": notes
     }
     
-    db["attendance"][student_id].append(record)
-    save_db(db)
+    STORE.append("attendance", [student_id], record)
     
     return json.dumps(record)
 
-def get_attendance(student_id: str):
-    """Get all attendance records for a student"""
-    db = load_db()
-    
-    if "attendance" not in db:
-        return json.dumps([])
-    
-    return json.dumps(db["attendance"].get(student_id, []))
+def date_range(start: Optional[str], end: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """Turn --from/--to values into [start, end) bounds comparable with record dates.
 
-def get_attendance_stats(student_id: str, subject: str = None):
-    """Calculate attendance statistics"""
-    db = load_db()
-    
-    if "attendance" not in db or student_id not in db["attendance"]:
-        return json.dumps({"present": 0, "absent": 0, "late": 0, "total": 0, "percentage": 0})
-    
-    records = db["attendance"][student_id]
+    Both accept a date (YYYY-MM-DD) or a full ISO timestamp; a date --to
+    includes that whole day.
+    """
+    lower = upper = None
+    if start:
+        lower = datetime.fromisoformat(start).isoformat() if "T" in start else date.fromisoformat(start).isoformat()
+    if end:
+        if "T" in end:
+            upper = (datetime.fromisoformat(end) + timedelta(microseconds=1)).isoformat()
+        else:
+            upper = (date.fromisoformat(end) + timedelta(days=1)).isoformat()
+    return lower, upper
+
+def get_attendance(student_id: str, subject: str = None, start: str = None, end: str = None):
+    """Get attendance records for a student, optionally for one subject and a --from/--to date range"""
+    lower, upper = date_range(start, end)
     
-    if subject:
-        records = [r for r in records if r["subject"] == subject]
+    # Found through the student's date index (see storage.Engine.attendance)
+    return json.dumps(STORE.attendance(student_id, subject, lower, upper))
+
+def get_attendance_stats(student_id: str, subject: str = None, start: str = None, end: str = None):
+    """Calculate attendance statistics, optionally for a --from/--to date range"""
+    lower, upper = date_range(start, end)
     
-    stats = {
-        "present": sum(1 for r in records if r["status"] == "present"),
-        "absent": sum(1 for r in records if r["status"] == "absent"),
-        "late": sum(1 for r in records if r["status"] == "late"),
-        "total": len(records)
-    }
+    counts = STORE.attendance_counts(student_id, subject, lower, upper)
+    stats = {status: counts.get(status, 0) for status in STATUSES}
+    stats["total"] = sum(counts.values())
     
     if stats["total"] > 0:
         stats["percentage"] = round((stats["present"] / stats["total"]) * 100, 2)
@@ -61,24 +60,45 @@ def get_attendance_stats(student_id: str, subject: str = None):
     
     return json.dumps(stats)
 
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print(json.dumps({"error": "No command provided"}))
-        sys.exit(1)
+def _options(args: List[str]) -> Tuple[List[str], Dict[str, str]]:
+    """Split --from/--to/--subject <value> options from positional arguments"""
+    positional = []
+    options = {}
+    i = 0
+    while i < len(args):
+        if args[i] in ("--from", "--to", "--subject"):
+            if i + 1 >= len(args):
+                raise ValueError(f"{args[i]} needs a value")
+            options[args[i][2:]] = args[i + 1]
+            i += 2
+        else:
+            positional.append(args[i])
+            i += 1
+    return positional, options
+
+def run_command(args: List[str]) -> Tuple[str, int]:
+    """Run a CLI command and return its output and exit code"""
+    if len(args) < 1:
+        return json.dumps({"error": "No command provided"}), 1
     
-    command = sys.argv[1]
+    command = args[0]
     
     try:
         if command == "add":
-            result = add_attendance(sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5], sys.argv[6] if len(sys.argv) > 6 else "")
+            result = add_attendance(args[1], args[2], args[3], args[4], args[5] if len(args) > 5 else "")
         elif command == "get":
-            result = get_attendance(sys.argv[2])
+            args, options = _options(args)
+            result = get_attendance(args[1], options.get("subject"), options.get("from"), options.get("to"))
         elif command == "stats":
-            result = get_attendance_stats(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None)
+            args, options = _options(args)
+            subject = options.get("subject", args[2] if len(args) > 2 else None)
+            result = get_attendance_stats(args[1], subject, options.get("from"), options.get("to"))
         else:
             result = json.dumps({"error": "Unknown command"})
         
-        print(result)
+        return result, 0
     except Exception as e:
-        print(json.dumps({"error": str(e)}))
-        sys.exit(1)
+        return json.dumps({"error": str(e)}), 1
+
+if __name__ == "__main__":
+    sys.exit(instrument.run_cli("attendance.py", run_command, sys.argv[1:]))
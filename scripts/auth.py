@@ -1,15 +1,19 @@
+import instrument  # first, so the import phase covers the other imports
 import json
 import os
-from typing import Optional, Dict
+from datetime import datetime
+from typing import Optional, Dict, List, Tuple
+import sessions
+import storage
+from passwords import hash_password, needs_rehash, verify_password
+from jsonstore import change
 
 # Data file path
 DATA_FILE = "data/users.json"
 
-def init_auth_db():
-    """Initialize authentication database with teacher accounts"""
-    
-    # Teacher accounts (10 subjects)
-    teachers = {
+def teacher_accounts() -> Dict:
+    """Default teacher accounts (10 subjects)"""
+    return {
         "EnglishTeacher": {
             "username": "EnglishTeacher",
             "password": "English",
@@ -81,59 +85,93 @@ def init_auth_db():
             "name": "Physical Education Teacher"
         }
     }
+
+# The functions below take the engine to work on (see storage.py);
+# database.py passes its own, the auth.py commands use this one
+STORE = storage.select_engine(storage.FilesEngine({"users": DATA_FILE}, {"users": teacher_accounts}))
+
+def init_auth_db():
+    """Initialize authentication database with teacher accounts"""
+    
+    teachers = teacher_accounts()
     
     # Create data directory if it doesn't exist
     os.makedirs(os.path.dirname(DATA_FILE), exist_ok=True)
     
     # Write initial data
-    with open(DATA_FILE, 'w') as f:
-        json.dump(teachers, f, indent=2)
+    STORE.reset("users", teachers)
+    _refresh_sessions(teachers)
     
     return teachers
 
 def load_users() -> Dict:
     """Load users from file"""
-    if not os.path.exists(DATA_FILE):
-        return init_auth_db()
-    
-    with open(DATA_FILE, 'r') as f:
-        return json.load(f)
+    return STORE.load("users")
 
 def save_users(users: Dict):
     """Save users to file"""
-    os.makedirs(os.path.dirname(DATA_FILE), exist_ok=True)
-    with open(DATA_FILE, 'w') as f:
-        json.dump(users, f, indent=2)
+    STORE.reset("users", users)
+    _refresh_sessions(users)
+
+def session_user(user: Dict) -> Dict:
+    """The part of an account that sessions keep (everything but the password)"""
+    return {
+        "username": user["username"],
+        "role": user["role"],
+        "name": user["name"],
+        "subject": user.get("subject")
+    }
+
+def _refresh_sessions(users: Dict):
+    # Sessions of changed accounts see the change, those of removed ones end
+    sessions.refresh_users(lambda username: session_user(users[username]) if username in users else None)
 
-def authenticate(username: str, password: str) -> Optional[Dict]:
+def authenticate(username: str, password: str, store: Optional[storage.Engine] = None) -> Optional[Dict]:
     """Authenticate a user with username and password"""
-    users = load_users()
-    user = users.get(username)
-    
-    if user and user["password"] == password:
-        return {
-            "username": user["username"],
-            "role": user["role"],
-            "name": user["name"],
-            "subject": user.get("subject")
-        }
+    store = store or STORE
+    user = store.get("users", username)
+    
+    if user and verify_password(password, user["password"]):
+        if needs_rehash(user["password"]):
+            _store_password(username, hash_password(password), store)
+        return session_user(user)
     return None
 
-def register_parent_user(username: str, password: str, name: str) -> Optional[Dict]:
-    """Register a new parent user"""
-    users = load_users()
+def _store_password(username: str, hashed: str, store: storage.Engine):
+    # Replaces a plain (pre-hashing) password after a successful login
+    def plan(view):
+        if username not in view["users"]:
+            return None, []
+        return None, [change("set", ["users", username, "password"], hashed)]
     
-    if username in users:
+    store.update(plan, ["users"])
+
+def login(username: str, password: str) -> Optional[Dict]:
+    """Authenticate and start a session: {"user", "token", "expiresAt"}"""
+    user = authenticate(username, password)
+    if user is None:
         return None
     
-    users[username] = {
+    token, expires = sessions.create_session(user)
+    return {"user": user, "token": token, "expiresAt": datetime.fromtimestamp(expires).isoformat()}
+
+def register_parent_user(username: str, password: str, name: str,
+                         store: Optional[storage.Engine] = None) -> Optional[Dict]:
+    """Register a new parent user"""
+    user = {
         "username": username,
-        "password": password,
+        "password": hash_password(password),
         "role": "parent",
         "name": name
     }
     
-    save_users(users)
+    def plan(view):
+        if username in view["users"]:
+            return False, []
+        return True, [change("set", ["users", username], user)]
+    
+    if not (store or STORE).update(plan, ["users"]):
+        return None
     
     return {
         "username": username,
@@ -141,44 +179,67 @@ def register_parent_user(username: str, password: str, name: str) -> Optional[Di
         "name": name
     }
 
-if __name__ == "__main__":
-    import sys
-    
-    if len(sys.argv) < 2:
-        print("Usage: python auth.py <command> [args]")
-        sys.exit(1)
+def run_command(args: List[str]) -> Tuple[str, int]:
+    """Run a CLI command and return its output and exit code"""
+    if len(args) < 1:
+        return "Usage: python auth.py <command> [args]", 1
     
-    command = sys.argv[1]
+    command = args[0]
     
     if command == "init":
         init_auth_db()
-        print(json.dumps({"success": True, "message": "Database initialized"}))
+        return json.dumps({"success": True, "message": "Database initialized"}), 0
     
     elif command == "login":
-        if len(sys.argv) < 4:
-            print(json.dumps({"success": False, "error": "Username and password required"}))
-            sys.exit(1)
+        if len(args) < 3:
+            return json.dumps({"success": False, "error": "Username and password required"}), 1
+        
+        username = args[1]
+        password = args[2]
+        session = login(username, password)
         
-        username = sys.argv[2]
-        password = sys.argv[3]
-        user = authenticate(username, password)
+        if session:
+            return json.dumps({"success": True, **session}), 0
+        else:
+            return json.dumps({"success": False, "error": "Invalid credentials"}), 0
+    
+    elif command == "verify_token":
+        if len(args) < 2:
+            return json.dumps({"success": False, "error": "Token required"}), 1
+        
+        user = sessions.verify_token(args[1])
         
         if user:
-            print(json.dumps({"success": True, "user": user}))
+            return json.dumps({"success": True, "user": user}), 0
         else:
-            print(json.dumps({"success": False, "error": "Invalid credentials"}))
+            return json.dumps({"success": False, "error": "Invalid or expired token"}), 0
+    
+    elif command == "logout":
+        if len(args) < 2:
+            return json.dumps({"success": False, "error": "Token required"}), 1
+        
+        if sessions.end_session(args[1]):
+            return json.dumps({"success": True, "message": "Logged out"}), 0
+        else:
+            return json.dumps({"success": False, "error": "Invalid or expired token"}), 0
     
     elif command == "register":
-        if len(sys.argv) < 5:
-            print(json.dumps({"success": False, "error": "Username, password, and name required"}))
-            sys.exit(1)
+        if len(args) < 4:
+            return json.dumps({"success": False, "error": "Username, password, and name required"}), 1
         
-        username = sys.argv[2]
-        password = sys.argv[3]
-        name = sys.argv[4]
+        username = args[1]
+        password = args[2]
+        name = args[3]
         user = register_parent_user(username, password, name)
         
         if user:
-            print(json.dumps({"success": True, "user": user}))
+            return json.dumps({"success": True, "user": user}), 0
         else:
-            print(json.dumps({"success": False, "error": "Username already exists"}))
+            return json.dumps({"success": False, "error": "Username already exists"}), 0
+    
+    return "", 0
+
+if __name__ == "__main__":
+    import sys
+
+    sys.exit(instrument.run_cli("auth.py", run_command, sys.argv[1:]))
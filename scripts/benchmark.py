@@ -0,0 +1,516 @@
+"""
+Benchmarks for the data scripts.
+
+Generates deterministic synthetic schools (the same seed and size always give
+the same data) and times the public functions of database.py, students.py,
+auth.py, assignments.py, attendance.py and gpa.py, in-process and through
+their command lines. Results are written as JSON: per school size and case,
+the timing percentiles in milliseconds and the peak memory (Python
+allocations in-process, resident set size for commands).
+
+Every school size runs in a fresh process and working directory, with the
+storage engine and cache settings of the environment (SCHOOL_STORAGE,
+SCHOOL_CACHE). Cases run in a fixed order, so writes made by earlier cases
+are the same in every run and results stay comparable.
+
+Usage:
+    python3 scripts/benchmark.py run [--students 1000,10000] [--years 1] [--seed 1]
+                                     [--repeat 20] [--budget 10] [--cli] [--only gpa.,attendance.get]
+                                     [--output results.json]
+    python3 scripts/benchmark.py generate <directory> [--students 1000] [--years 1] [--seed 1]
+    python3 scripts/benchmark.py startup [--repeat 20] [--budget 10] [--zipapp] [--output startup.json]
+    python3 scripts/benchmark.py compare <old.json> <new.json>
+
+startup times how long each module's command line takes to start and exit
+(run without a command, in an empty directory): as its own script, through
+schoolctl.py and, with --zipapp, from a freshly built archive. compare
+accepts both kinds of report.
+"""
+
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import aggregates
+import assignments
+import attendance
+import auth
+import database
+import gpa
+import jsonstore
+import schoolctl
+import sqlite_store
+import storage
+import students
+from jsonstore import STORAGE_ENGINE, reset
+
+SCRIPTS = os.path.dirname(os.path.abspath(__file__))
+
+FIRST_NAMES = ["Emma", "Liam", "Olivia", "Noah", "Ava", "Elijah", "Sophia", "Lucas", "Mia", "Mason",
+               "Amelia", "Ethan", "Harper", "Logan", "Ella", "James", "Chloe", "Aiden", "Grace", "Jack"]
+SURNAMES = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Wilson", "Moore",
+            "Taylor", "Anderson", "Thomas", "Jackson", "White", "Harris", "Martin", "Thompson", "Lee", "Clark"]
+STATUS_WEIGHTS = {"present": 90, "late": 5, "absent": 5}
+
+# Records per student (grades: per subject) and per subject (assignments) in each school year
+GRADES_PER_YEAR = 4
+ATTENDANCE_PER_YEAR = 20
+ASSIGNMENTS_PER_YEAR = 10
+CLASS_SIZE = 30
+FIRST_YEAR = 2020
+
+# Synthetic schools
+
+def generate_school(student_count: int, years: int = 1, seed: int = 1) -> Dict[str, Any]:
+    """A deterministic synthetic school in the database.json layout"""
+    rng = random.Random(seed)
+    teachers = auth.teacher_accounts()
+    subject_teachers = {t["subject"]: name for name, t in teachers.items()}
+    subjects = list(database.new_student_grades())
+    start = datetime(FIRST_YEAR, 9, 1, 8)
+    school_days = 300 * years
+
+    def moment() -> str:
+        day = start + timedelta(days=rng.randrange(school_days), minutes=rng.randrange(8 * 60))
+        return day.isoformat()
+
+    db = {"users": teachers, "students": {}, "grades": {}, "attendance": {}, "assignments": {}, "submissions": {}}
+    for i in range(1, student_count + 1):
+        student_id = f"student_{i}"
+        db["students"][student_id] = {
+            "id": student_id,
+            "name": rng.choice(FIRST_NAMES),
+            "surname": rng.choice(SURNAMES),
+            "age": rng.randint(11, 18),
+            "created_at": start.isoformat()
+        }
+        db["grades"][student_id] = {
+            subject: sorted(
+                ({"grade": float(min(100, max(0, round(rng.gauss(75, 12))))), "teacher": subject_teachers[subject],
+                  "date": moment(), "comment": ""}
+                 for _ in range(GRADES_PER_YEAR * years)),
+                key=lambda e: e["date"]
+            )
+            for subject in subjects
+        }
+        records = []
+        for _ in range(ATTENDANCE_PER_YEAR * years):
+            subject = rng.choice(subjects)
+            status = rng.choices(list(STATUS_WEIGHTS), weights=list(STATUS_WEIGHTS.values()))[0]
+            records.append({"date": moment(), "status": status, "subject": subject,
+                            "teacher": subject_teachers[subject], "notes": ""})
+        db["attendance"][student_id] = sorted(records, key=lambda r: r["date"])
+
+    number = 0
+    for subject in subjects:
+        for _ in range(ASSIGNMENTS_PER_YEAR * years):
+            number += 1
+            assignment_id = f"assignment_{number}"
+            created = moment()
+            due = (datetime.fromisoformat(created) + timedelta(days=rng.randint(3, 21))).date().isoformat()
+            db["assignments"][assignment_id] = {
+                "id": assignment_id, "title": f"{subject} assignment {number}", "description": "",
+                "subject": subject, "dueDate": due, "createdBy": subject_teachers[subject], "createdAt": created
+            }
+            for index in sorted(rng.sample(range(1, student_count + 1), min(CLASS_SIZE, student_count))):
+                status = rng.choice(["pending", "submitted", "submitted", "late"])
+                db["submissions"].setdefault(f"student_{index}", []).append({
+                    "assignmentId": assignment_id,
+                    "studentId": f"student_{index}",
+                    "status": status,
+                    "submittedAt": None if status == "pending" else f"{due}T18:00:00",
+                    "grade": None if status == "pending" else float(rng.randint(40, 100)),
+                    "feedback": ""
+                })
+    return db
+
+def record_counts(db: Dict) -> Dict[str, int]:
+    """Number of records per collection of a database.json-layout school"""
+    return {
+        "students": len(db["students"]),
+        "grades": sum(len(e) for g in db["grades"].values() for e in g.values()),
+        "attendance": sum(len(r) for r in db["attendance"].values()),
+        "assignments": len(db["assignments"]),
+        "submissions": sum(len(s) for s in db["submissions"].values())
+    }
+
+def write_school(db: Dict):
+    """Store a school in the working directory, for database.py and for the students.py/auth.py layout"""
+    os.makedirs("data", exist_ok=True)
+    if STORAGE_ENGINE == "sqlite":
+        sqlite_store.import_db(db)
+        return
+
+    full = dict(db)
+    full["aggregates"] = aggregates.build(db["grades"])
+    full["assignmentIndex"] = storage.build_assignment_index(db["assignments"])
+    full["submissionIndex"] = storage.build_submission_index(db["submissions"])
+    reset(database.DATA_FILE, full)
+
+    grades = {
+        student_id: {subject: [{k: v for k, v in e.items() if k != "comment"} for e in entries]
+                     for subject, entries in student_grades.items()}
+        for student_id, student_grades in db["grades"].items()
+    }
+    reset(students.STUDENTS_FILE, db["students"])
+    reset(students.GRADES_FILE, grades)
+    reset(students.TOTALS_FILE, aggregates.build(grades))
+    reset(auth.DATA_FILE, db["users"])
+
+def data_bytes(directory: str = "data") -> int:
+    """Size of every data file"""
+    total = 0
+    for root, _, files in os.walk(directory):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total
+
+# Cases
+#
+# A case is (name, call, command): call(rng) runs once in-process; command(rng)
+# returns the script and arguments of the equivalent command line, or None.
+
+def _cases(student_count: int) -> List[Tuple[str, Callable, Optional[Callable]]]:
+    subjects = list(database.new_student_grades())
+    teachers = auth.teacher_accounts()
+    assignment_count = len(subjects) * ASSIGNMENTS_PER_YEAR
+    counter = iter(range(1, 1 << 30))
+
+    def student(rng) -> str:
+        return f"student_{rng.randint(1, student_count)}"
+
+    def subject(rng) -> str:
+        return rng.choice(subjects)
+
+    def teacher(rng) -> Tuple[str, str]:
+        name = rng.choice(sorted(teachers))
+        return name, teachers[name]["password"]
+
+    def assignment(rng) -> str:
+        return f"assignment_{rng.randint(1, assignment_count)}"
+
+    def removable_student(rng) -> str:
+        # Created outside the timing by the setup below
+        return database.add_student("Bench", "Mark", 12)["id"]
+
+    csv_lines = ["student_id,subject,grade,teacher,comment\n"] + [
+        f"student_{i % student_count + 1},{subjects[i % len(subjects)]},{60 + i % 40},Teacher,\n" for i in range(1000)
+    ]
+    bulk_rows = [
+        {"student_id": f"student_{i % student_count + 1}", "subject": subjects[i % len(subjects)],
+         "grade": float(60 + i % 40), "teacher": "Teacher"}
+        for i in range(100)
+    ]
+
+    return [
+        # database.py
+        ("database.load_db", lambda rng: database.load_db(), None),
+        ("database.get_all_students", lambda rng: database.get_all_students(), None),
+        ("database.get_student", lambda rng: database.get_student(student(rng)), None),
+        ("database.get_student_grades", lambda rng: database.get_student_grades(student(rng)), None),
+        ("database.add_grade", lambda rng: database.add_grade(student(rng), subject(rng), 80.0, "Teacher"), None),
+        ("database.add_student", lambda rng: database.add_student("Bench", "Mark", 12), None),
+        ("database.delete_student", (removable_student, lambda sid: database.delete_student(sid)), None),
+        ("database.authenticate_user", lambda rng: database.authenticate_user(*teacher(rng)), None),
+        ("database.register_parent", lambda rng: database.register_parent(f"parent_{next(counter)}", "secret", "Parent"), None),
+        ("database.save_db", lambda rng: database.save_db(database.load_db()), None),
+        # students.py
+        ("students.load_students", lambda rng: students.load_students(), None),
+        ("students.load_grades", lambda rng: students.load_grades(), None),
+        ("students.get_all_students", lambda rng: students.get_all_students(),
+         lambda rng: ["students.py", "list"]),
+        ("students.list_students", lambda rng: list(students.list_students("surname", None, 50)),
+         lambda rng: ["students.py", "list", "--limit", "50", "--sort", "surname"]),
+        ("students.get_student", lambda rng: students.get_student(student(rng)),
+         lambda rng: ["students.py", "get", student(rng)]),
+        ("students.get_student_grades", lambda rng: students.get_student_grades(student(rng)),
+         lambda rng: ["students.py", "get_grades", student(rng)]),
+        ("students.get_class_average", lambda rng: students.get_class_average(subject(rng)),
+         lambda rng: ["students.py", "class_average", subject(rng)]),
+        ("students.add_student_grade", lambda rng: students.add_student_grade(student(rng), subject(rng), 80.0, "Teacher"),
+         lambda rng: ["students.py", "add_grade", student(rng), subject(rng), "80", "Teacher"]),
+        ("students.read_grade_rows", lambda rng: students.read_grade_rows(csv_lines), None),
+        ("students.add_grades_bulk", lambda rng: students.add_grades_bulk(bulk_rows), None),
+        ("students.create_student", lambda rng: students.create_student("Bench", "Mark", 12),
+         lambda rng: ["students.py", "add", "Bench", "Mark", "12"]),
+        ("students.save_students", lambda rng: students.save_students(students.load_students()), None),
+        # auth.py
+        ("auth.load_users", lambda rng: auth.load_users(), None),
+        ("auth.authenticate", lambda rng: auth.authenticate(*teacher(rng)), None),
+        ("auth.login", lambda rng: auth.login(*teacher(rng)),
+         lambda rng: ["auth.py", "login", *teacher(rng)]),
+        ("auth.register_parent_user", lambda rng: auth.register_parent_user(f"user_{next(counter)}", "secret", "Parent"),
+         lambda rng: ["auth.py", "register", f"cli_{rng.randrange(1 << 40)}", "secret", "Parent"]),
+        # assignments.py
+        ("assignments.create_assignment",
+         lambda rng: assignments.create_assignment("Bench", "", subject(rng), "2021-06-01", "Teacher"),
+         lambda rng: ["assignments.py", "create", "Bench", "", subject(rng), "2021-06-01", "Teacher"]),
+        ("assignments.get_assignments_by_subject", lambda rng: assignments.get_assignments_by_subject(subject(rng), 50),
+         lambda rng: ["assignments.py", "get_by_subject", subject(rng), "--limit", "50"]),
+        ("assignments.get_all_assignments", lambda rng: assignments.get_all_assignments(50),
+         lambda rng: ["assignments.py", "get_all", "--limit", "50"]),
+        ("assignments.update_submission",
+         lambda rng: assignments.update_submission(student(rng), assignment(rng), "submitted", 85.0),
+         lambda rng: ["assignments.py", "update_submission", student(rng), assignment(rng), "submitted", "85"]),
+        ("assignments.get_student_submissions", lambda rng: assignments.get_student_submissions(student(rng)),
+         lambda rng: ["assignments.py", "get_submissions", student(rng)]),
+        ("assignments.get_assignment_submissions", lambda rng: assignments.get_assignment_submissions(assignment(rng)),
+         lambda rng: ["assignments.py", "get_assignment_submissions", assignment(rng)]),
+        # attendance.py
+        ("attendance.add_attendance", lambda rng: attendance.add_attendance(student(rng), "present", subject(rng), "Teacher"),
+         lambda rng: ["attendance.py", "add", student(rng), "present", subject(rng), "Teacher"]),
+        ("attendance.get_attendance", lambda rng: attendance.get_attendance(student(rng)),
+         lambda rng: ["attendance.py", "get", student(rng)]),
+        ("attendance.get_attendance_range",
+         lambda rng: attendance.get_attendance(student(rng), subject(rng), f"{FIRST_YEAR}-10-01", f"{FIRST_YEAR}-12-31"),
+         lambda rng: ["attendance.py", "get", student(rng), "--subject", subject(rng),
+                      "--from", f"{FIRST_YEAR}-10-01", "--to", f"{FIRST_YEAR}-12-31"]),
+        ("attendance.get_attendance_stats", lambda rng: attendance.get_attendance_stats(student(rng)),
+         lambda rng: ["attendance.py", "stats", student(rng)]),
+        # gpa.py
+        ("gpa.calculate_gpa", lambda rng: gpa.calculate_gpa(student(rng)),
+         lambda rng: ["gpa.py", "calculate", student(rng)]),
+        ("gpa.get_class_average", lambda rng: gpa.get_class_average(subject(rng)),
+         lambda rng: ["gpa.py", "class_average", subject(rng)]),
+        ("gpa.gpa_table", lambda rng: gpa.gpa_table(), lambda rng: ["gpa.py", "table"]),
+        ("gpa.format_table_csv", lambda rng: gpa.format_table_csv(gpa.gpa_table()), lambda rng: ["gpa.py", "table", "csv"]),
+        ("gpa.check_aggregates", lambda rng: gpa.check_aggregates(), lambda rng: ["gpa.py", "verify_aggregates"]),
+    ]
+
+# Measuring
+
+def percentile(ordered: List[float], q: float) -> float:
+    """The q-th percentile (0-100) of sorted samples, interpolating between neighbours"""
+    if len(ordered) == 1:
+        return ordered[0]
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Timing statistics of samples in seconds, reported in milliseconds"""
+    ordered = sorted(s * 1000 for s in samples)
+    stats = {f"p{q}": percentile(ordered, q) for q in (50, 90, 99)}
+    stats.update(min=ordered[0], max=ordered[-1], mean=sum(ordered) / len(ordered))
+    return {key: round(value, 3) for key, value in stats.items()}
+
+def _measure_call(call, seed: int, repeat: int, budget: float) -> Dict:
+    setup, run = call if isinstance(call, tuple) else (None, call)
+    rng = random.Random(seed)
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < repeat and (not samples or time.perf_counter() - started < budget):
+        argument = setup(rng) if setup else rng
+        t = time.perf_counter()
+        run(argument)
+        samples.append(time.perf_counter() - t)
+
+    # One more call under tracemalloc, which slows allocation down too much to time
+    argument = setup(rng) if setup else rng
+    tracemalloc.start()
+    try:
+        run(argument)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"n": len(samples), "ms": summarize(samples), "peakBytes": peak}
+
+# Commands are started by a small launcher process: a child forked from this
+# (large) process would report this process's memory as its peak
+_LAUNCHER = """
+import json, os, subprocess, sys, time
+for line in sys.stdin:
+    t = time.perf_counter()
+    process = subprocess.Popen(json.loads(line), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    print(json.dumps([time.perf_counter() - t, usage.ru_maxrss * 1024]), flush=True)
+"""
+
+def _start_launcher(cwd: Optional[str] = None) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, "-c", _LAUNCHER], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+                            cwd=cwd)
+
+def _measure_command(launcher: subprocess.Popen, command, seed: int, repeat: int, budget: float) -> Dict:
+    rng = random.Random(seed)
+    samples = []
+    peak = 0
+    started = time.perf_counter()
+    while len(samples) < repeat and (not samples or time.perf_counter() - started < budget):
+        script, *args = command(rng)
+        launcher.stdin.write(json.dumps([sys.executable, os.path.join(SCRIPTS, script)] + args) + "\n")
+        launcher.stdin.flush()
+        seconds, rss = json.loads(launcher.stdout.readline())
+        samples.append(seconds)
+        peak = max(peak, rss)
+    return {"n": len(samples), "ms": summarize(samples), "peakRssBytes": peak}
+
+def benchmark_school(student_count: int, years: int = 1, seed: int = 1, repeat: int = 20, budget: float = 10.0,
+                     cli: bool = False, only: Optional[List[str]] = None) -> Dict:
+    """Generate a school in the working directory and run every case against it"""
+    launcher = _start_launcher() if cli else None
+    t = time.perf_counter()
+    db = generate_school(student_count, years, seed)
+    counts = record_counts(db)
+    write_school(db)
+    del db
+    result = {
+        "students": student_count,
+        "years": years,
+        "records": counts,
+        "generateSeconds": round(time.perf_counter() - t, 3),
+        "dataBytes": data_bytes(),
+        "results": []
+    }
+
+    for number, (name, call, command) in enumerate(_cases(student_count)):
+        if only and not any(name.startswith(prefix) for prefix in only):
+            continue
+        case_seed = seed * 1000 + number
+        result["results"].append({"name": name, "mode": "inprocess", **_measure_call(call, case_seed, repeat, budget)})
+        if cli and command is not None:
+            result["results"].append({"name": name, "mode": "cli",
+                                      **_measure_command(launcher, command, case_seed, repeat, budget)})
+    if launcher is not None:
+        launcher.stdin.close()
+        launcher.wait()
+    return result
+
+def _meta(seed: int, repeat: int) -> Dict:
+    return {
+        "engine": STORAGE_ENGINE,
+        "cache": jsonstore.cache_enabled(),
+        "seed": seed,
+        "repeat": repeat,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "startedAt": datetime.now().isoformat()
+    }
+
+def run(sizes: List[int], years: int = 1, seed: int = 1, repeat: int = 20, budget: float = 10.0,
+        cli: bool = False, only: Optional[List[str]] = None) -> Dict:
+    """Benchmark every school size, each in a fresh process and directory"""
+    report = {"meta": _meta(seed, repeat), "schools": []}
+    for size in sizes:
+        with tempfile.TemporaryDirectory(prefix="school-bench-") as directory:
+            args = [sys.executable, os.path.abspath(__file__), "school", str(size), str(years), str(seed),
+                    str(repeat), str(budget), "1" if cli else "0", ",".join(only or [])]
+            output = subprocess.run(args, cwd=directory, check=True, capture_output=True, text=True).stdout
+            report["schools"].append(json.loads(output))
+    return report
+
+def startup(repeat: int = 20, budget: float = 10.0, zipapp: bool = False) -> Dict:
+    """Start-up time of every module's command line, run without a command in an empty directory"""
+    report = {"meta": _meta(0, repeat), "startup": []}
+    with tempfile.TemporaryDirectory(prefix="school-startup-") as directory:
+        archive = schoolctl.build(os.path.join(directory, "schoolctl.pyz"))["target"] if zipapp else None
+        launcher = _start_launcher(cwd=directory)
+        cases = [("schoolctl", "schoolctl", lambda rng: ["schoolctl.py", "modules"])]
+        for module in schoolctl.MODULES:
+            cases.append((module, "script", lambda rng, module=module: [f"{module}.py"]))
+            cases.append((module, "schoolctl", lambda rng, module=module: ["schoolctl.py", module]))
+            if archive:
+                cases.append((module, "zipapp", lambda rng, module=module: [archive, module]))
+        for name, mode, command in cases:
+            report["startup"].append({"name": name, "mode": mode, **_measure_command(launcher, command, 0, repeat, budget)})
+        launcher.stdin.close()
+        launcher.wait()
+    return report
+
+def _results(report: Dict):
+    for school in report.get("schools", []):
+        for r in school["results"]:
+            yield school["students"], r
+    for r in report.get("startup", []):
+        yield None, r
+
+def compare(old: Dict, new: Dict) -> List[Dict]:
+    """p50 and p99 of every case in both reports, with the new/old ratio of the p50"""
+    before = {(students, r["name"], r["mode"]): r for students, r in _results(old)}
+    rows = []
+    for students, r in _results(new):
+        key = (students, r["name"], r["mode"])
+        if key not in before:
+            continue
+        old_ms, new_ms = before[key]["ms"], r["ms"]
+        rows.append({
+            "students": key[0], "name": key[1], "mode": key[2],
+            "p50": [old_ms["p50"], new_ms["p50"]], "p99": [old_ms["p99"], new_ms["p99"]],
+            "ratio": round(new_ms["p50"] / old_ms["p50"], 3) if old_ms["p50"] else None
+        })
+    return rows
+
+def _run_options(args: List[str]) -> Dict[str, Any]:
+    options = {"sizes": [1000], "years": 1, "seed": 1, "repeat": 20, "budget": 10.0, "cli": False, "only": None,
+               "zipapp": False, "output": None}
+    i = 0
+    while i < len(args):
+        if args[i] in ("--cli", "--zipapp"):
+            options[args[i][2:]] = True
+            i += 1
+            continue
+        if args[i] not in ("--students", "--years", "--seed", "--repeat", "--budget", "--only", "--output") \
+                or i + 1 >= len(args):
+            raise ValueError(f"Unexpected argument: {args[i]}")
+        name, value = args[i][2:], args[i + 1]
+        if name == "students":
+            options["sizes"] = [int(v) for v in value.split(",")]
+        elif name == "only":
+            options["only"] = [v for v in value.split(",") if v]
+        elif name == "budget":
+            options["budget"] = float(value)
+        elif name == "output":
+            options["output"] = value
+        else:
+            options[name] = int(value)
+        i += 2
+    return options
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == "school":
+        # Internal: one school size in the working directory, result on stdout
+        size, years, seed, repeat, budget, cli, only = sys.argv[2:9]
+        print(json.dumps(benchmark_school(int(size), int(years), int(seed), int(repeat), float(budget),
+                                          cli == "1", [p for p in only.split(",") if p])))
+    elif command in ("run", "startup"):
+        try:
+            options = _run_options(sys.argv[2:])
+        except ValueError as e:
+            print(json.dumps({"error": str(e)}))
+            sys.exit(1)
+        output = options.pop("output")
+        if command == "startup":
+            report = startup(options["repeat"], options["budget"], options["zipapp"])
+        else:
+            del options["zipapp"]
+            report = run(**options)
+        if output:
+            with open(output, "w") as f:
+                json.dump(report, f, indent=2)
+        else:
+            print(json.dumps(report, indent=2))
+    elif command == "generate" and len(sys.argv) > 2:
+        options = _run_options(sys.argv[3:])
+        os.makedirs(sys.argv[2], exist_ok=True)
+        os.chdir(sys.argv[2])
+        db = generate_school(options["sizes"][0], options["years"], options["seed"])
+        write_school(db)
+        print(json.dumps({"success": True, "records": record_counts(db), "dataBytes": data_bytes()}))
+    elif command == "compare" and len(sys.argv) > 3:
+        with open(sys.argv[2]) as f:
+            old = json.load(f)
+        with open(sys.argv[3]) as f:
+            new = json.load(f)
+        print(json.dumps(compare(old, new), indent=2))
+    else:
+        print(__doc__.strip().split("Usage:")[1].rstrip())
+        sys.exit(1)
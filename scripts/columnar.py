@@ -0,0 +1,415 @@
+"""
+Columnar binary storage for grade documents.
+
+A grade document ({student_id: {subject: [entries]}}, the students.py layout)
+stored at a path ending in ".col" is kept in a compact binary file instead of
+JSON: per subject, the grades, dates, teachers and comments of its entries are
+stored as separate columns, so repeated keys and teacher names are stored once
+and analytics can read a single column straight from a memory map.
+SCHOOL_GRADE_STORE=columnar switches students.py to data/grades.col.
+
+File layout (little-endian): an 8-byte header followed by blocks
+
+    b"BLCK" | uint32 meta length | uint32 body length | meta (JSON) | body
+
+meta holds the block's interned strings (student IDs and teachers), the
+changes to apply before its rows (creating or removing students, see
+jsonstore.change), an optional "roster" that replaces the whole document, and
+"subjects": {subject: [first row, row count, [student string ids]]}. The body
+holds, for all rows grouped by subject, the columns
+
+    grade       float32
+    date        uint32 seconds since the epoch (0xFFFFFFFF: no date)
+    student     uint32 string id
+    teacher     uint32 string id (0xFFFFFFFF: no teacher)
+    flags       uint8, bit 0 set when the entry has a comment
+    comment end uint32 end offset of the entry's comment in the blob
+    comment blob UTF-8
+
+Writes append one block per run of changes, so adding grades never rewrites
+the file; compact() folds all blocks into one. Grades are stored as float32
+and dates to the second, so they round-trip to four decimal places
+and sub-second parts of dates are dropped.
+
+Usage:
+    python3 scripts/columnar.py convert <grades.json> <grades.col>
+    python3 scripts/columnar.py export <grades.col>
+    python3 scripts/columnar.py compact <grades.col>
+    python3 scripts/columnar.py class_average <grades.col> <subject>
+"""
+
+import calendar
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import instrument
+from jsonstore import apply_change, cache_enabled, freeze, locked, replace_file, temp_file, thaw
+
+HEADER = b"SGCOL\x00\x01\x00"
+BLOCK = struct.Struct("<4sII")
+BLOCK_MAGIC = b"BLCK"
+NONE = 0xFFFFFFFF
+
+if sys.byteorder != "little":  # array buffers are written in native order
+    raise ImportError("columnar storage needs a little-endian platform")
+
+# Parsed documents per path, only kept when caching is enabled
+_cache: Dict[str, Tuple[Tuple[int, int, int], Any]] = {}
+
+# Encoding
+
+def _epoch(value: Optional[str]) -> int:
+    if not value:
+        return NONE
+    return calendar.timegm(datetime.fromisoformat(value).timetuple())
+
+def _iso(value: int) -> Optional[str]:
+    if value == NONE:
+        return None
+    return datetime.fromtimestamp(value, timezone.utc).replace(tzinfo=None).isoformat()
+
+def _encode_block(changes: List[Dict], rows: List[Tuple[str, str, Dict]], roster: Optional[Dict] = None) -> bytes:
+    """Encode the changes to apply first, then (student_id, subject, entry) rows"""
+    strings: List[str] = []
+    ids: Dict[str, int] = {}
+
+    def intern(value: Optional[str]) -> int:
+        if value is None:
+            return NONE
+        if value not in ids:
+            ids[value] = len(strings)
+            strings.append(value)
+        return ids[value]
+
+    by_subject: Dict[str, List[Tuple[str, Dict]]] = {}
+    for student_id, subject, entry in rows:
+        by_subject.setdefault(subject, []).append((student_id, entry))
+
+    grades = array("f")
+    dates = array("I")
+    students = array("I")
+    teachers = array("I")
+    flags = array("B")
+    comment_ends = array("I")
+    blob = bytearray()
+    subjects = {}
+
+    for subject, entries in by_subject.items():
+        first = len(grades)
+        for student_id, entry in entries:
+            grades.append(entry["grade"])
+            dates.append(_epoch(entry.get("date")))
+            students.append(intern(student_id))
+            teachers.append(intern(entry.get("teacher")))
+            flags.append(1 if "comment" in entry else 0)
+            blob += (entry.get("comment") or "").encode()
+            comment_ends.append(len(blob))
+        subjects[subject] = [first, len(entries), sorted({students[i] for i in range(first, len(grades))})]
+
+    meta = {"rows": len(grades), "strings": strings, "changes": changes, "subjects": subjects}
+    if roster is not None:
+        meta["roster"] = roster
+    meta_bytes = json.dumps(meta, separators=(",", ":")).encode()
+    body = b"".join(column.tobytes() for column in (grades, dates, students, teachers, flags, comment_ends)) + bytes(blob)
+    return BLOCK.pack(BLOCK_MAGIC, len(meta_bytes), len(body)) + meta_bytes + body
+
+def _encode_changes(changes: List[Dict]) -> bytes:
+    """Encode a list of changes as blocks: each run of grade appends becomes the rows of one block"""
+    out = []
+    pending: List[Dict] = []
+    rows: List[Tuple[str, str, Dict]] = []
+    for record in changes:
+        if record["op"] == "append" and len(record["path"]) == 2:
+            rows.append((record["path"][0], record["path"][1], record["value"]))
+            continue
+        if rows:
+            out.append(_encode_block(pending, rows))
+            pending, rows = [], []
+        pending.append(record)
+    if pending or rows:
+        out.append(_encode_block(pending, rows))
+    return b"".join(out)
+
+def _encode_document(grades: Dict) -> bytes:
+    roster = {student_id: list(student_grades) for student_id, student_grades in grades.items()}
+    rows = [
+        (student_id, subject, entry)
+        for student_id, student_grades in grades.items()
+        for subject, entries in student_grades.items()
+        for entry in entries
+    ]
+    return HEADER + _encode_block([], rows, roster)
+
+# Decoding
+
+class _Block:
+    """A block's metadata plus zero-copy views of its columns"""
+
+    def __init__(self, buffer: memoryview, offset: int, meta: Dict):
+        self.meta = meta
+        n = meta["rows"]
+        self.strings = meta["strings"]
+        position = offset
+        columns = {}
+        for name, code, size in (("grade", "f", 4), ("date", "I", 4), ("student", "I", 4),
+                                 ("teacher", "I", 4), ("flags", "B", 1), ("comment_end", "I", 4)):
+            columns[name] = buffer[position:position + n * size].cast(code)
+            position += n * size
+        self.columns = columns
+        self.comments = buffer[position:]
+
+    def release(self):
+        """Release the views so the underlying map can be closed"""
+        for column in self.columns.values():
+            column.release()
+        self.comments.release()
+
+    def rows(self) -> Iterator[Tuple[str, str, Dict]]:
+        """Decode the block's rows as (student_id, subject, entry)"""
+        c = self.columns
+        grades = c["grade"].tolist()
+        dates = c["date"].tolist()
+        students = c["student"].tolist()
+        teachers = c["teacher"].tolist()
+        flags = c["flags"].tolist()
+        comment_ends = c["comment_end"].tolist()
+        blob = bytes(self.comments)
+        strings = self.strings
+        # Entries of one import share their date
+        iso = {NONE: None}
+
+        for subject, (first, count, _) in self.meta["subjects"].items():
+            for i in range(first, first + count):
+                # Same key order as the JSON layouts
+                entry = {"grade": round(grades[i], 4)}
+                if teachers[i] != NONE:
+                    entry["teacher"] = strings[teachers[i]]
+                date = dates[i]
+                if date not in iso:
+                    iso[date] = _iso(date)
+                if iso[date] is not None:
+                    entry["date"] = iso[date]
+                if flags[i] & 1:
+                    entry["comment"] = blob[comment_ends[i - 1] if i > 0 else 0:comment_ends[i]].decode()
+                yield strings[students[i]], subject, entry
+
+def _blocks(buffer: memoryview) -> Iterator[Tuple[int, _Block]]:
+    """Yield (end offset, block) for every complete block; stops at a torn tail"""
+    if bytes(buffer[:len(HEADER)]) != HEADER:
+        raise ValueError("not a columnar grade file")
+    offset = len(HEADER)
+    while offset + BLOCK.size <= len(buffer):
+        magic, meta_length, body_length = BLOCK.unpack_from(buffer, offset)
+        end = offset + BLOCK.size + meta_length + body_length
+        if magic != BLOCK_MAGIC or end > len(buffer):
+            return
+        meta_start = offset + BLOCK.size
+        meta = json.loads(bytes(buffer[meta_start:meta_start + meta_length]))
+        yield end, _Block(buffer, meta_start + meta_length, meta)
+        offset = end
+
+class _Mapped:
+    """A read-only memory map of a file, usable as a context manager"""
+
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+
+    def __enter__(self) -> memoryview:
+        return self.view
+
+    def __exit__(self, *exc):
+        self.view.release()
+        self.map.close()
+        self.file.close()
+
+def _file_key(path: str) -> Tuple[int, int, int]:
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+def exists(path: str) -> bool:
+    """Whether a columnar document has been created"""
+    return os.path.exists(path)
+
+def load(path: str) -> Dict:
+    """Decode the whole document"""
+    key = _file_key(path) if cache_enabled() else None
+    cached = _cache.get(path)
+    if key is not None and cached is not None and cached[0] == key:
+        return cached[1]
+
+    grades: Dict = {}
+    instrument.add("filesRead")
+    instrument.add("bytesRead", os.path.getsize(path))
+    with _Mapped(path) as buffer, instrument.phase("parse"):
+        for _, block in _blocks(buffer):
+            if "roster" in block.meta:
+                grades = {student_id: {subject: [] for subject in subjects}
+                          for student_id, subjects in block.meta["roster"].items()}
+            for record in block.meta["changes"]:
+                apply_change(grades, record)
+            for student_id, subject, entry in block.rows():
+                grades.setdefault(student_id, {}).setdefault(subject, []).append(entry)
+            block.release()
+
+    if key is not None:
+        grades = freeze(grades)
+        _cache[path] = (key, grades)
+    return grades
+
+# Writing
+
+def _valid_end(path: str) -> int:
+    end = len(HEADER)
+    with _Mapped(path) as buffer:
+        for end, block in _blocks(buffer):
+            block.release()
+    return end
+
+def append(path: str, changes: List[Dict]):
+    """Append changes to a document (the caller holds its write lock)"""
+    if not changes:
+        return
+    with instrument.phase("serialize"):
+        encoded = _encode_changes([thaw(record) for record in changes])
+    end = _valid_end(path)
+    with open(path, "r+b") as f, instrument.phase("write"):
+        # Drop a block torn by a crash before writing after it
+        f.truncate(end)
+        f.seek(end)
+        f.write(encoded)
+        f.flush()
+        os.fsync(f.fileno())
+    instrument.add("bytesWritten", len(encoded))
+    instrument.add("filesWritten")
+
+def _write_atomic(path: str, content: bytes):
+    fd, tmp = temp_file(path)
+    try:
+        with os.fdopen(fd, "wb") as f, instrument.phase("write"):
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        replace_file(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    instrument.add("bytesWritten", len(content))
+    instrument.add("filesWritten")
+
+def reset(path: str, grades: Dict):
+    """Replace a document with a single compacted block"""
+    with instrument.phase("serialize"):
+        content = _encode_document(thaw(grades))
+    _write_atomic(path, content)
+
+def compact(path: str):
+    """Fold every block into one"""
+    with locked(path):
+        reset(path, load(path))
+
+# Analytics
+
+def subject_average(path: str, subject: str) -> Tuple[Optional[float], int]:
+    """(average, count) of every grade in a subject, reading only the grade column where possible.
+
+    Rows of students that a later block removes or replaces are skipped using
+    the student column of the affected blocks only.
+    """
+    with _Mapped(path) as buffer:
+        blocks = []
+        fallback = False
+        # Block index after which each student's / (student, subject)'s earlier rows are gone
+        replaced: Dict[Any, int] = {}
+        for index, (_, block) in enumerate(_blocks(buffer)):
+            if "roster" in block.meta:
+                for _, earlier in blocks:
+                    earlier.release()
+                blocks.clear()
+                replaced.clear()
+            for record in block.meta["changes"]:
+                target = record["path"]
+                if record["op"] in ("set", "delete") and len(target) <= 2:
+                    replaced[tuple(target)] = index
+                    if _has_entries(record.get("value"), len(target), subject, target):
+                        # Grades inside a change value: fall back to decoding
+                        fallback = True
+                elif target[1:2] == [subject] or len(target) < 2:
+                    fallback = True
+            blocks.append((index, block))
+
+        total = 0.0
+        count = 0
+        for index, block in blocks:
+            if fallback:
+                block.release()
+                continue
+            span = block.meta["subjects"].get(subject)
+            if span is not None:
+                first, n, student_ids = span
+                grades = block.columns["grade"][first:first + n]
+                stale = {
+                    i for i in student_ids
+                    if replaced.get((block.strings[i],), -1) > index
+                    or replaced.get((block.strings[i], subject), -1) > index
+                }
+                if not stale:
+                    total += sum(grades)
+                    count += n
+                else:
+                    students = block.columns["student"][first:first + n]
+                    for grade, student in zip(grades, students):
+                        if student not in stale:
+                            total += grade
+                            count += 1
+                    students.release()
+                grades.release()
+            block.release()
+
+    if fallback:
+        return _average_from(load(path), subject)
+    if count == 0:
+        return None, 0
+    return total / count, count
+
+def _has_entries(value: Any, depth: int, subject: str, path: List) -> bool:
+    # Whether a set value at [student] or [student, subject] carries grades of the subject
+    if value is None:
+        return False
+    if depth == 1:
+        return bool(value.get(subject)) if isinstance(value, dict) else False
+    return path[1] == subject and bool(value)
+
+def _average_from(grades: Dict, subject: str) -> Tuple[Optional[float], int]:
+    values = [e["grade"] for student_grades in grades.values() for e in student_grades.get(subject, [])]
+    if not values:
+        return None, 0
+    return sum(values) / len(values), len(values)
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ("convert", "export", "compact", "class_average"):
+        print(__doc__.strip().split("Usage:")[1].rstrip())
+        sys.exit(1)
+
+    command, target = sys.argv[1], sys.argv[2]
+    if command == "convert":
+        with open(target) as f:
+            source = json.load(f)
+        reset(sys.argv[3], source)
+        print(json.dumps({"success": True, "bytes": os.path.getsize(sys.argv[3]), "jsonBytes": os.path.getsize(target)}))
+    elif command == "export":
+        print(json.dumps(thaw(load(target)), indent=2))
+    elif command == "compact":
+        compact(target)
+        print(json.dumps({"success": True, "bytes": os.path.getsize(target)}))
+    else:
+        average, count = subject_average(target, sys.argv[3])
+        print(json.dumps({"average": round(average, 2) if count else 0.0, "count": count}))
@@ -1,236 +1,148 @@
-import json
 import os
-from datetime import datetime
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Callable, Tuple
+import aggregates
+import storage
 
 # Data file path
 DATA_FILE = "data/database.json"
+# Versions of its changes, for the change feed (see storage.ChangeLog)
+CHANGES_FILE = "data/database_changes.log"
 
 # Initialize database structure
 def init_db():
     """Initialize the database with teacher accounts and empty collections"""
-    
-    # Teacher accounts (10 subjects)
-    teachers = {
-        "EnglishTeacher": {
-            "username": "EnglishTeacher",
-            "password": "English",
-            "role": "teacher",
-            "subject": "English",
-            "name": "English Teacher"
-        },
-        "MathTeacher": {
-            "username": "MathTeacher",
-            "password": "Math",
-            "role": "teacher",
-            "subject": "Math",
-            "name": "Math Teacher"
-        },
-        "BiologyTeacher": {
-            "username": "BiologyTeacher",
-            "password": "Biology",
-            "role": "teacher",
-            "subject": "Biology",
-            "name": "Biology Teacher"
-        },
-        "ChemistryTeacher": {
-            "username": "ChemistryTeacher",
-            "password": "Chemistry",
-            "role": "teacher",
-            "subject": "Chemistry",
-            "name": "Chemistry Teacher"
-        },
-        "PhysicsTeacher": {
-            "username": "PhysicsTeacher",
-            "password": "Physics",
-            "role": "teacher",
-            "subject": "Physics",
-            "name": "Physics Teacher"
-        },
-        "HistoryTeacher": {
-            "username": "HistoryTeacher",
-            "password": "History",
-            "role": "teacher",
-            "subject": "History",
-            "name": "History Teacher"
-        },
-        "GeographyTeacher": {
-            "username": "GeographyTeacher",
-            "password": "Geography",
-            "role": "teacher",
-            "subject": "Geography",
-            "name": "Geography Teacher"
-        },
-        "ComputerScienceTeacher": {
-            "username": "ComputerScienceTeacher",
-            "password": "ComputerScience",
-            "role": "teacher",
-            "subject": "Computer Science",
-            "name": "Computer Science Teacher"
-        },
-        "ArtTeacher": {
-            "username": "ArtTeacher",
-            "password": "Art",
-            "role": "teacher",
-            "subject": "Art",
-            "name": "Art Teacher"
-        },
-        "PhysicalEducationTeacher": {
-            "username": "PhysicalEducationTeacher",
-            "password": "PhysicalEducation",
-            "role": "teacher",
-            "subject": "Physical Education",
-            "name": "Physical Education Teacher"
-        }
-    }
+    # Imported here, as the account functions below do it
+    from auth import teacher_accounts
     
     db_structure = {
-        "users": teachers,
+        "users": teacher_accounts(),
         "students": {},
-        "grades": {}
+        "grades": {},
+        "aggregates": aggregates.build({}),
+        "parents": {},
+        "search": {}
     }
     
     # Create data directory if it doesn't exist
     os.makedirs(os.path.dirname(DATA_FILE), exist_ok=True)
     
     # Write initial data
-    with open(DATA_FILE, 'w') as f:
-        json.dump(db_structure, f, indent=2)
+    STORE.reset_all(db_structure)
     
     print("Database initialized successfully!")
     return db_structure
 
-def load_db() -> Dict:
-    """Load database from file"""
-    if not os.path.exists(DATA_FILE):
-        return init_db()
-    
-    with open(DATA_FILE, 'r') as f:
-        return json.load(f)
+# Every collection in one document (see storage.py). The functions below are
+# those of students.py and auth.py run against it; like the accounts module,
+# students.py is imported where it is used, since assignments.py,
+# attendance.py and gpa.py import this module on every command.
+STORE = storage.select_engine(storage.DocumentEngine(DATA_FILE, init_db, CHANGES_FILE))
+
+def load_db(shard: Optional[str] = None) -> Dict:
+    """Load database from file.
+
+    A caller that only needs one student's grades and attendance names them
+    with shard, so a sharded database (see shards.py) reads just their file.
+    """
+    return STORE.export(shard)
 
 def save_db(db: Dict):
     """Save database to file"""
-    with open(DATA_FILE, 'w') as f:
-        json.dump(db, f, indent=2)
+    db = dict(db)
+    for name, (source, _, build) in storage.DERIVED.items():
+        db[name] = build(db.get(source, {}))
+    STORE.reset_all(db)
+
+def get_changes(since: Optional[int] = None) -> Dict:
+    """Students, grades, attendance, assignments and submissions changed after version since (see storage.Engine.changes)"""
+    return STORE.changes(since)
+
+def update_db(plan: Callable[[Dict], Tuple[Any, List[Dict]]], shard: Optional[str] = None) -> Any:
+    """Run plan(db) -> (result, changes) under the write lock and persist the changes.
+
+    shard names the student when the plan only touches their grades and
+    attendance (see load_db). The aggregates follow the grade changes by
+    themselves, as the parents and search indexes follow the student changes
+    and the assignment index the assignment changes.
+    """
+    return STORE.update(plan, None, shard)
 
 # User operations
 def authenticate_user(username: str, password: str) -> Optional[Dict]:
     """Authenticate a user"""
-    db = load_db()
-    user = db["users"].get(username)
-    
-    if user and user["password"] == password:
-        return {
-            "username": user["username"],
-            "role": user["role"],
-            "name": user["name"],
-            "subject": user.get("subject")
-        }
-    return None
+    # Imported here: only the account functions need hashlib, and assignments.py,
+    # attendance.py and gpa.py import this module on every command
+    from auth import authenticate
+
+    return authenticate(username, password, STORE)
 
 def register_parent(username: str, password: str, name: str) -> Optional[Dict]:
     """Register a new parent user"""
-    db = load_db()
-    
-    if username in db["users"]:
-        return None
-    
-    db["users"][username] = {
-        "username": username,
-        "password": password,
-        "role": "parent",
-        "name": name
-    }
-    
-    save_db(db)
-    
-    return {
-        "username": username,
-        "role": "parent",
-        "name": name
-    }
+    from auth import register_parent_user
+
+    return register_parent_user(username, password, name, STORE)
 
 # Student operations
-def add_student(name: str, surname: str, age: int) -> Dict:
-    """Add a new student"""
-    db = load_db()
-    
-    # Generate student ID
-    student_id = f"student_{len(db['students']) + 1}"
-    
-    student = {
-        "id": student_id,
-        "name": name,
-        "surname": surname,
-        "age": age,
-        "created_at": datetime.now().isoformat()
-    }
-    
-    db["students"][student_id] = student
-    
-    # Initialize grades for this student
-    db["grades"][student_id] = {
-        "English": [],
-        "Math": [],
-        "Biology": [],
-        "Chemistry": [],
-        "Physics": [],
-        "History": [],
-        "Geography": [],
-        "Computer Science": [],
-        "Art": [],
-        "Physical Education": []
-    }
-    
-    save_db(db)
-    return student
+def add_student(name: str, surname: str, age: int, parent_id: Optional[str] = None) -> Dict:
+    """Add a new student, linked to a parent account if parent_id is given"""
+    import students
+
+    return students.create_student(name, surname, age, parent_id, STORE)
+
+def new_student_grades() -> Dict[str, List]:
+    """Empty grade lists for every subject"""
+    import students
+
+    return students.new_student_grades()
 
 def get_all_students() -> List[Dict]:
     """Get all students"""
-    db = load_db()
-    return list(db["students"].values())
+    import students
+
+    return students.get_all_students(STORE)
 
 def get_student(student_id: str) -> Optional[Dict]:
     """Get a specific student"""
-    db = load_db()
-    return db["students"].get(student_id)
+    import students
+
+    return students.get_student(student_id, STORE)
+
+def list_for_parent(username: str) -> List[Dict]:
+    """Get the students linked to a parent"""
+    import students
+
+    return students.list_for_parent(username, STORE)
+
+def grades_for_parent(username: str) -> List[Dict]:
+    """Get a parent's children with their grades"""
+    import students
+
+    return students.grades_for_parent(username, STORE)
+
+def search_students(query: str, limit: int = 10) -> Dict:
+    """Find students by name, surname or ID"""
+    import students
+
+    return students.search_students(query, limit, STORE)
 
 def delete_student(student_id: str) -> bool:
     """Delete a student"""
-    db = load_db()
-    
-    if student_id in db["students"]:
-        del db["students"][student_id]
-        if student_id in db["grades"]:
-            del db["grades"][student_id]
-        save_db(db)
-        return True
-    return False
+    import students
+
+    return students.remove_student(student_id, STORE)
 
 # Grade operations
 def add_grade(student_id: str, subject: str, grade: float, teacher: str, comment: str = "") -> Dict:
     """Add a grade for a student in a subject"""
-    db = load_db()
-    
-    if student_id not in db["grades"]:
-        return None
-    
-    grade_entry = {
-        "grade": grade,
-        "teacher": teacher,
-        "date": datetime.now().isoformat(),
-        "comment": comment
-    }
-    
-    db["grades"][student_id][subject].append(grade_entry)
-    save_db(db)
-    
-    return grade_entry
+    import students
+
+    return students.add_student_grade(student_id, subject, grade, teacher, comment, STORE)
 
 def get_student_grades(student_id: str) -> Optional[Dict]:
     """Get all grades for a student"""
-    db = load_db()
-    return db["grades"].get(student_id)
+    import students
+
+    return students.get_student_grades(student_id, STORE)
 
 if __name__ == "__main__":
     # Initialize database when script is run
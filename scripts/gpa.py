@@ -1,26 +1,40 @@
+import instrument  # first, so the import phase covers the other imports
+import bisect
+import csv
+import io
 import json
 import sys
-from database import load_db
+from typing import Dict, List, Optional, Tuple
+import aggregates
+import database
+import storage
+from jsonstore import exists, load, locked, reset
+from subjects import SUBJECTS
+
+def _numpy():
+    # NumPy if installed, imported by the table alone so that the other
+    # commands start without it; the table falls back to plain Python
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
 
 def calculate_gpa(student_id: str):
     """Calculate GPA for a student based on all grades"""
-    db = load_db()
+    averages = database.STORE.subject_averages(student_id)
     
-    if student_id not in db.get("grades", {}):
+    if averages is None:
         return json.dumps({"gpa": 0.0, "subjects": {}})
     
-    grades = db["grades"][student_id]
-    
     subject_averages = {}
     total_points = 0
     total_subjects = 0
     
-    for subject, grade_list in grades.items():
-        if len(grade_list) > 0:
-            average = sum(g["grade"] for g in grade_list) / len(grade_list)
-            subject_averages[subject] = round(average, 2)
-            total_points += average
-            total_subjects += 1
+    for subject, average in averages.items():
+        subject_averages[subject] = round(average, 2)
+        total_points += average
+        total_subjects += 1
     
     gpa = round(total_points / total_subjects, 2) if total_subjects > 0 else 0.0
     
@@ -32,40 +46,199 @@ def calculate_gpa(student_id: str):
 
 def get_class_average(subject: str):
     """Calculate class average for a subject"""
-    db = load_db()
+    import students
+    return json.dumps(students.get_class_average(subject, database.STORE))
+
+def _percent_ranks(values: List[Optional[float]], np=None) -> Tuple[List[Optional[int]], List[Optional[float]]]:
+    """Competition rank (highest first) and percentile of each value; None values are not ranked.
+
+    np is the NumPy module to rank with, if any.
+    """
+    ranked = [v for v in values if v is not None]
+    n = len(ranked)
+    if np is not None:
+        present = np.array(ranked, dtype=np.float64)
+        ordered = np.sort(present)
+        below = np.searchsorted(ordered, present, side="left").tolist()
+        above = (n - np.searchsorted(ordered, present, side="right")).tolist()
+    else:
+        ordered = sorted(ranked)
+        below = [bisect.bisect_left(ordered, v) for v in ranked]
+        above = [n - bisect.bisect_right(ordered, v) for v in ranked]
+    
+    ranks = []
+    percentiles = []
+    i = 0
+    for v in values:
+        if v is None:
+            ranks.append(None)
+            percentiles.append(None)
+            continue
+        ranks.append(above[i] + 1)
+        percentiles.append(round(100 * below[i] / (n - 1), 2) if n > 1 else 100.0)
+        i += 1
+    return ranks, percentiles
+
+def gpa_table() -> List[Dict]:
+    """GPA, subject averages, ranks and percentiles for every student, best GPA first.
+
+    Works from the grade aggregates as a students x subjects matrix of counts
+    and sums, so the whole school takes one load instead of one calculate_gpa
+    call per student. Students without grades are listed last, unranked.
+    """
+    view = database.STORE.view(["students", "grades", "aggregates"])
+    all_students = list(view["students"].values())
+    stored = view.get("aggregates") or aggregates.build(view.get("grades", {}))
+    pairs = stored["students"]
     
-    all_grades = []
-    for student_id, grades in db.get("grades", {}).items():
-        if subject in grades:
-            for grade_entry in grades[subject]:
-                all_grades.append(grade_entry["grade"])
+    subjects = list(SUBJECTS)
+    for student_pairs in pairs.values():
+        subjects.extend(s for s in student_pairs if s not in subjects)
+    column = {subject: j for j, subject in enumerate(subjects)}
     
-    if len(all_grades) == 0:
-        return json.dumps({"average": 0.0, "count": 0})
+    np = _numpy()
+    # (row, column, count, sum) of every student and subject with grades
+    cells = [(i, column[subject], pair["count"], pair["sum"])
+             for i, student in enumerate(all_students)
+             for subject, pair in pairs.get(student["id"], {}).items()]
     
-    average = sum(all_grades) / len(all_grades)
+    if np is not None:
+        shape = (len(all_students), len(subjects))
+        count_matrix = np.zeros(shape)
+        sum_matrix = np.zeros(shape)
+        if cells:
+            rows, columns, cell_counts, cell_sums = zip(*cells)
+            count_matrix[rows, columns] = cell_counts
+            sum_matrix[rows, columns] = cell_sums
+        graded = count_matrix > 0
+        averages = np.divide(sum_matrix, count_matrix, out=np.zeros_like(sum_matrix), where=graded)
+        totals = graded.sum(axis=1)
+        gpas = np.divide(averages.sum(axis=1), totals, out=np.zeros(len(all_students)), where=totals > 0)
+        averages = averages.tolist()
+        graded = graded.tolist()
+        gpas = gpas.tolist()
+    else:
+        counts = [[0] * len(subjects) for _ in all_students]
+        sums = [[0.0] * len(subjects) for _ in all_students]
+        for i, j, count, total in cells:
+            counts[i][j] = count
+            sums[i][j] = total
+        graded = [[c > 0 for c in row] for row in counts]
+        averages = [[s / c if c else 0.0 for s, c in zip(srow, crow)] for srow, crow in zip(sums, counts)]
+        gpas = []
+        for row, has in zip(averages, graded):
+            taken = sum(has)
+            gpas.append(sum(row) / taken if taken else 0.0)
     
-    return json.dumps({
-        "average": round(average, 2),
-        "count": len(all_grades)
-    })
+    # Rank on the rounded values that are displayed, so equal GPAs share a rank
+    gpa_values = [round(g, 2) if any(has) else None for g, has in zip(gpas, graded)]
+    gpa_ranks, gpa_percentiles = _percent_ranks(gpa_values, np)
+    subject_ranks = []
+    for j in range(len(subjects)):
+        ranks, _ = _percent_ranks([round(row[j], 2) if has[j] else None for row, has in zip(averages, graded)], np)
+        subject_ranks.append(ranks)
+    
+    table = []
+    for i, student in enumerate(all_students):
+        table.append({
+            "studentId": student["id"],
+            "name": student.get("name"),
+            "surname": student.get("surname"),
+            "gpa": gpa_values[i] if gpa_values[i] is not None else 0.0,
+            "totalSubjects": sum(graded[i]),
+            "rank": gpa_ranks[i],
+            "percentile": gpa_percentiles[i],
+            "subjects": {
+                subject: {"average": round(averages[i][j], 2), "rank": subject_ranks[j][i]}
+                for j, subject in enumerate(subjects)
+                if graded[i][j]
+            }
+        })
+    
+    table.sort(key=lambda row: (row["rank"] is None, row["rank"] or 0))
+    return table
 
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print(json.dumps({"error": "No command provided"}))
-        sys.exit(1)
+def format_table_csv(table: List[Dict]) -> str:
+    """One CSV row per student, with an average and rank column per subject"""
+    subjects = list(SUBJECTS)
+    for row in table:
+        subjects.extend(s for s in row["subjects"] if s not in subjects)
+    
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    header = ["studentId", "name", "surname", "gpa", "totalSubjects", "rank", "percentile"]
+    for subject in subjects:
+        header += [subject, f"{subject} rank"]
+    writer.writerow(header)
+    for row in table:
+        values = [row[key] for key in header[:7]]
+        for subject in subjects:
+            entry = row["subjects"].get(subject)
+            values += [entry["average"], entry["rank"]] if entry else ["", ""]
+        writer.writerow(["" if v is None else v for v in values])
+    return out.getvalue().rstrip("\n")
+
+def check_aggregates(rebuild: bool = False) -> Dict:
+    """Recompute the grade aggregates from scratch and compare them with the stored ones.
+
+    With rebuild the stored aggregates are replaced by the recomputed ones.
+    Returns the mismatches found per store.
+    """
+    report = {}
+    
+    store = database.STORE
+    if not isinstance(store, storage.DocumentEngine):
+        # SCHOOL_STORAGE chose another engine, which holds the students.py layout's data too
+        report[getattr(store, "path", type(store).__name__)] = store.check_aggregates(rebuild)
+        return report
+    
+    if exists(database.DATA_FILE):
+        report[database.DATA_FILE] = store.check_aggregates(rebuild)
     
-    command = sys.argv[1]
+    import students
+    if exists(students.GRADES_FILE):
+        # Hold the grades lock so no grade lands between reading and replacing the totals
+        with locked(students.GRADES_FILE):
+            rebuilt = aggregates.build(students.load_grades())
+            stored = load(students.TOTALS_FILE) if exists(students.TOTALS_FILE) else None
+            mismatches = aggregates.compare(stored, rebuilt)
+            if rebuild and (mismatches or stored is None):
+                reset(students.TOTALS_FILE, rebuilt)
+        report[students.TOTALS_FILE] = mismatches
+    
+    return report
+
+def run_command(args: List[str]) -> Tuple[str, int]:
+    """Run a CLI command and return its output and exit code"""
+    if len(args) < 1:
+        return json.dumps({"error": "No command provided"}), 1
+    
+    command = args[0]
     
     try:
         if command == "calculate":
-            result = calculate_gpa(sys.argv[2])
+            result = calculate_gpa(args[1])
         elif command == "class_average":
-            result = get_class_average(sys.argv[2])
+            result = get_class_average(args[1])
+        elif command == "table":
+            table = gpa_table()
+            if len(args) > 1 and args[1] == "csv":
+                result = format_table_csv(table)
+            else:
+                result = json.dumps({"students": table, "count": len(table)})
+        elif command in ("verify_aggregates", "rebuild_aggregates"):
+            report = check_aggregates(rebuild=command == "rebuild_aggregates")
+            result = json.dumps({
+                "consistent": not any(report.values()),
+                "rebuilt": command == "rebuild_aggregates",
+                "mismatches": report
+            })
         else:
             result = json.dumps({"error": "Unknown command"})
         
-        print(result)
+        return result, 0
     except Exception as e:
-        print(json.dumps({"error": str(e)}))
-        sys.exit(1)
+        return json.dumps({"error": str(e)}), 1
+
+if __name__ == "__main__":
+    sys.exit(instrument.run_cli("gpa.py", run_command, sys.argv[1:]))
@@ -0,0 +1,176 @@
+"""
+Grade trends: a student's grades per subject as a series of weekly, monthly
+or term buckets, for charts that need tens of points rather than every
+grade entry.
+
+Each point covers the grades dated in one bucket, named by the date it
+starts on (weeks start on Monday, terms in the TERM_STARTS months):
+
+    {"bucket": "2025-09-01", "mean": 81.5, "min": 70.0, "max": 93.0, "count": 2, "rolling": 79.25}
+
+rolling is the average of every grade in the point's bucket and the
+window - 1 buckets with grades before it. Entries without a date are left
+out.
+
+Usage:
+    python3 scripts/grades.py trend <student_id> [--subject <subject>] [--bucket week|month|term] [--window <buckets>]
+"""
+
+import instrument  # first, so the import phase covers the other imports
+import json
+import operator
+import sys
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+import database
+import storage
+from jsonstore import cache_enabled
+
+BUCKETS = ["week", "month", "term"]
+# Months the school terms start in: spring, summer and autumn
+TERM_STARTS = [1, 4, 9]
+WINDOW = 3
+
+def bucket_start(timestamp: str, bucket: str) -> str:
+    """First day (YYYY-MM-DD) of the bucket holding a date or ISO timestamp"""
+    day = date.fromisoformat(timestamp[:10])
+    if bucket == "week":
+        return (day - timedelta(days=day.weekday())).isoformat()
+    if bucket == "month":
+        return day.replace(day=1).isoformat()
+    if bucket == "term":
+        months = [month for month in TERM_STARTS if month <= day.month]
+        # Before the first start of the year, the last term of the year before
+        start = date(day.year, months[-1], 1) if months else date(day.year - 1, TERM_STARTS[-1], 1)
+        return start.isoformat()
+    raise ValueError(f"Unknown bucket: {bucket}")
+
+# Bucket totals
+#
+# Per student and subject, [count, sum, min, max] of the grades in each
+# bucket of every kind. When the document cache is on (grade lists are then
+# read-only), the totals are kept for the lists they were computed from; a
+# new grade produces a new list sharing the old entries, and only the new
+# entries are added instead of counting the whole history again. At most
+# CACHED_TOTALS students' subjects are kept, the least recently used dropped
+# first.
+
+CACHED_TOTALS = 4096
+_totals: "OrderedDict[Tuple[str, str], Tuple[List[Dict], Dict[str, Dict[str, List]]]]" = OrderedDict()
+
+def _add(totals: Dict[str, Dict[str, List]], entries: List[Dict]):
+    # Bucket starts per day, as grades come in several a day
+    days: Dict[str, Dict[str, str]] = {}
+    for entry in entries:
+        try:
+            day = entry["date"][:10]
+            if day not in days:
+                days[day] = {bucket: bucket_start(day, bucket) for bucket in BUCKETS}
+        except (KeyError, TypeError, ValueError):
+            continue
+        starts = days[day]
+        grade = entry["grade"]
+        for bucket, start in starts.items():
+            pair = totals[bucket].get(start)
+            if pair is None:
+                totals[bucket][start] = [1, grade, grade, grade]
+            else:
+                pair[0] += 1
+                pair[1] += grade
+                pair[2] = min(pair[2], grade)
+                pair[3] = max(pair[3], grade)
+
+def bucket_totals(student_id: str, subject: str, entries: List[Dict]) -> Dict[str, Dict[str, List]]:
+    """{bucket kind: {bucket start: [count, sum, min, max]}} of a student's grade entries in a subject"""
+    key = (student_id, subject)
+    cached = _totals.get(key)
+    if cached is not None and cached[0] is entries:
+        _totals.move_to_end(key)
+        return cached[1]
+
+    old = cached[0] if cached is not None else []
+    if old and len(old) <= len(entries) and all(map(operator.is_, old, entries)):
+        totals = cached[1]
+        new = entries[len(old):]
+    else:
+        totals = {bucket: {} for bucket in BUCKETS}
+        new = entries
+    _add(totals, new)
+
+    if cache_enabled():
+        _totals[key] = (entries, totals)
+        _totals.move_to_end(key)
+        if len(_totals) > CACHED_TOTALS:
+            _totals.popitem(last=False)
+    return totals
+
+def series(totals: Dict[str, List], window: int = WINDOW) -> List[Dict]:
+    """The points of one kind of bucket totals, oldest first"""
+    points = []
+    recent: List[List] = []
+    for start in sorted(totals):
+        count, total, low, high = totals[start]
+        recent = (recent + [totals[start]])[-window:]
+        points.append({
+            "bucket": start,
+            "mean": round(total / count, 2),
+            "min": low,
+            "max": high,
+            "count": count,
+            "rolling": round(sum(pair[1] for pair in recent) / sum(pair[0] for pair in recent), 2)
+        })
+    return points
+
+def grade_trend(student_id: str, subject: Optional[str] = None, bucket: str = "month", window: int = WINDOW,
+                store: Optional[storage.Engine] = None) -> Optional[Dict]:
+    """A student's trend series per subject (or for one subject); None for an unknown student"""
+    if bucket not in BUCKETS:
+        raise ValueError(f"Unknown bucket: {bucket}")
+    if window < 1:
+        raise ValueError("window must be positive")
+    grades = (store or database.STORE).get("grades", student_id)
+    if grades is None:
+        return None
+
+    subjects = [subject] if subject is not None else list(grades)
+    return {
+        "studentId": student_id,
+        "bucket": bucket,
+        "window": window,
+        "subjects": {s: series(bucket_totals(student_id, s, grades[s])[bucket], window) if s in grades else []
+                     for s in subjects}
+    }
+
+# Options of `trend`: flag -> grade_trend keyword argument
+OPTIONS = {
+    "--subject": "subject",
+    "--bucket": "bucket",
+    "--window": "window"
+}
+
+def run_command(args: List[str]) -> Tuple[str, int]:
+    """Run a CLI command and return its output and exit code"""
+    if len(args) < 2 or args[0] != "trend":
+        return json.dumps({"success": False, "error": "Usage: python grades.py trend <student_id> [options]"}), 1
+
+    options = {}
+    i = 2
+    while i < len(args):
+        if args[i] not in OPTIONS or i + 1 >= len(args):
+            return json.dumps({"success": False, "error": f"Unexpected argument: {args[i]}"}), 1
+        options[OPTIONS[args[i]]] = args[i + 1]
+        i += 2
+
+    try:
+        if "window" in options:
+            options["window"] = int(options["window"])
+        result = grade_trend(args[1], **options)
+    except ValueError as e:
+        return json.dumps({"success": False, "error": str(e)}), 1
+    if result is None:
+        return json.dumps({"success": False, "error": "Student not found"}), 0
+    return json.dumps({"success": True, **result}), 0
+
+if __name__ == "__main__":
+    sys.exit(instrument.run_cli("grades.py", run_command, sys.argv[1:]))
@@ -0,0 +1,123 @@
+"""
+Opt-in timing and I/O instrumentation for the command-line scripts.
+
+With SCHOOL_PROFILE set, or --profile given to a command, every command
+invocation emits one JSON line describing where its time went:
+
+    {"script": "gpa.py", "command": "calculate", "exitCode": 0, "engine": "json",
+     "ms": {"import": 41.2, "read": 3.1, "parse": 18.4, "query": 0.0, "compute": 0.6,
+            "serialize": 0.0, "write": 0.0, "output": 0.1, "total": 63.4},
+     "bytesRead": 1843211, "bytesWritten": 0,
+     "records": {"filesRead": 1, "filesWritten": 0, "changesWritten": 0, "logRecordsReplayed": 0, "sqlStatements": 0}}
+
+Phases: import runs from the script's first import to the start of the
+command (interpreter startup itself is not measured); read and write are
+file I/O, including fsync and rename; parse and serialize are JSON (and
+columnar) decoding and encoding of data files; query is SQLite statement
+execution; output is printing the result; compute is the rest of the
+command. The line goes to stderr, or is appended to the file SCHOOL_PROFILE
+names (any value other than "1").
+
+Scripts import this module first so the import phase covers their imports.
+"""
+
+import json
+import os
+import sys
+import time
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, List, Tuple
+
+_T0 = time.perf_counter()
+
+PHASES = ["import", "read", "parse", "query", "compute", "serialize", "write", "output"]
+COUNTERS = ["filesRead", "filesWritten", "changesWritten", "logRecordsReplayed", "sqlStatements"]
+
+_setting = os.environ.get("SCHOOL_PROFILE", "")
+_enabled = _setting not in ("", "0")
+_times: Dict[str, float] = dict.fromkeys(PHASES, 0.0)
+_counts: Dict[str, int] = dict.fromkeys(COUNTERS + ["bytesRead", "bytesWritten"], 0)
+_null = nullcontext()
+
+def enabled() -> bool:
+    """Whether this process records metrics"""
+    return _enabled
+
+class _Phase:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        _times[self.name] += time.perf_counter() - self.start
+
+def phase(name: str):
+    """Context manager adding the time spent inside it to a phase (a no-op when disabled)"""
+    return _Phase(name) if _enabled else _null
+
+def add(counter: str, amount: int = 1):
+    """Add to a byte or record counter"""
+    if _enabled:
+        _counts[counter] += amount
+
+def load_json(path: str) -> Any:
+    """Read and parse a JSON file, timing both"""
+    with phase("read"):
+        with open(path, "rb") as f:
+            raw = f.read()
+    add("bytesRead", len(raw))
+    add("filesRead")
+    with phase("parse"):
+        return json.loads(raw)
+
+def dump_json(data: Any, **options) -> str:
+    """Serialize a document for a data file"""
+    with phase("serialize"):
+        return json.dumps(data, **options)
+
+def _emit(script: str, args: List[str], started: float, status: int):
+    end = time.perf_counter()
+    times = dict(_times)
+    times["import"] = started - _T0
+    measured = sum(v for k, v in times.items() if k != "import")
+    times["compute"] = max(0.0, end - started - measured)
+    times["total"] = end - _T0
+    line = json.dumps({
+        "script": script,
+        "command": args[0] if args else None,
+        "exitCode": status,
+        "engine": os.environ.get("SCHOOL_STORAGE", "json"),
+        "ms": {k: round(v * 1000, 3) for k, v in times.items()},
+        "bytesRead": _counts["bytesRead"],
+        "bytesWritten": _counts["bytesWritten"],
+        "records": {k: _counts[k] for k in COUNTERS}
+    })
+    if _setting in ("", "0", "1"):
+        sys.stderr.write(line + "\n")
+    else:
+        # One write per line, so lines from concurrent commands do not interleave
+        fd = os.open(_setting, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, (line + "\n").encode())
+        finally:
+            os.close(fd)
+
+def run_cli(script: str, run_command: Callable[[List[str]], Tuple[str, int]], args: List[str]) -> int:
+    """Run a script's command, print its output and emit metrics if enabled; returns the exit code"""
+    global _enabled
+    if "--profile" in args:
+        args = [a for a in args if a != "--profile"]
+        _enabled = True
+
+    started = time.perf_counter()
+    output, status = run_command(args)
+    if output:
+        with phase("output"):
+            print(output)
+    if _enabled:
+        _emit(script, args, started, status)
+    return status
@@ -0,0 +1,569 @@
+import fcntl
+import itertools
+import os
+import stat
+import threading
+from contextlib import ExitStack, contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import instrument
+
+# Storage engine for data files: "json" rewrites the whole file on every
+# change, "wal" appends changes to a write-ahead log (see wal.py). Documents
+# whose path ends in ".col" always use the columnar grade format (see columnar.py),
+# and sharded documents are split into per-student files (see shards.py).
+STORAGE_ENGINE = os.environ.get("SCHOOL_STORAGE", "json")
+COLUMNAR_SUFFIX = ".col"
+
+# Parsed file contents keyed by path: ((mtime_ns, size, inode), data).
+# Cached documents are shared between callers, so they are frozen (see
+# FrozenDict) and changes produce new documents instead of editing them.
+_cache: Dict[str, Tuple[Tuple[int, int, int], Any]] = {}
+_cache_enabled = os.environ.get("SCHOOL_CACHE") == "1"
+
+def enable_cache():
+    """Keep parsed files in memory between loads (used by long-running hosts)"""
+    global _cache_enabled
+    _cache_enabled = True
+
+def cache_enabled() -> bool:
+    """Whether parsed files are kept in memory between loads"""
+    return _cache_enabled
+
+def clear_cache():
+    """Drop every cached file"""
+    _cache.clear()
+
+def _file_key(path: str) -> Tuple[int, int, int]:
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+def read_json(path: str) -> Any:
+    """Load a JSON file, reusing the parsed copy if the file is unchanged"""
+    if not _cache_enabled:
+        return instrument.load_json(path)
+
+    key = _file_key(path)
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    data = freeze(instrument.load_json(path))
+    _cache[path] = (key, data)
+    return data
+
+_temp_names = itertools.count()
+
+def temp_file(path: str) -> Tuple[int, str]:
+    """Create a new file next to path for writing and renaming over it: (fd, name).
+
+    Does the job of tempfile.mkstemp without importing tempfile (and with it
+    shutil and random), which would add to the start-up time of every command.
+    The file gets the mode of path if it exists, else the umask default, so
+    that renaming it over path keeps the permissions a plain write would.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    try:
+        mode: Optional[int] = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        mode = None
+    while True:
+        tmp = os.path.join(directory, f"{os.path.basename(path)}.{os.getpid()}.{next(_temp_names)}.tmp")
+        try:
+            # Private until its mode is set, where path's is narrower than the umask's
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600 if mode is not None else 0o666)
+        except FileExistsError:
+            continue
+        if mode is not None:
+            os.fchmod(fd, mode)
+        return fd, tmp
+
+def replace_file(tmp: str, path: str):
+    """Rename tmp over path and sync the directory, so the rename survives a crash too"""
+    os.replace(tmp, path)
+    fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def write_json(path: str, data: Any):
+    """Atomically replace a JSON file and refresh its cached copy.
+
+    The data is written to a temporary file in the same directory, synced
+    and renamed over the target, so readers and crashes never see a
+    truncated file.
+    """
+    text = instrument.dump_json(data, indent=2)
+    fd, tmp = temp_file(path)
+    try:
+        with instrument.phase("write"):
+            with os.fdopen(fd, 'w') as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+            replace_file(tmp, path)
+        instrument.add("bytesWritten", len(text))
+        instrument.add("filesWritten")
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+    if _cache_enabled:
+        _cache[path] = (_file_key(path), freeze(data))
+
+# Read-only views
+
+def _read_only(self, *args, **kwargs):
+    raise TypeError("cached data is read-only; describe the modification with change() instead")
+
+class FrozenDict(dict):
+    """A dict from the cache that refuses modification; copying thaws it"""
+    __slots__ = ()
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return thaw(self)
+
+    def __reduce__(self):
+        return (dict, (thaw(self),))
+
+class FrozenList(list):
+    """A list from the cache that refuses modification; copying thaws it"""
+    __slots__ = ()
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    append = extend = insert = pop = remove = clear = sort = reverse = _read_only
+
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return thaw(self)
+
+    def __reduce__(self):
+        return (list, (thaw(self),))
+
+def freeze(value: Any) -> Any:
+    """Return a read-only copy of a parsed JSON value"""
+    kind = type(value)
+    if kind is dict:
+        return FrozenDict({k: freeze(v) for k, v in value.items()})
+    if kind is list:
+        return FrozenList([freeze(v) for v in value])
+    return value
+
+def thaw(value: Any) -> Any:
+    """Return a plain, modifiable deep copy of a (possibly frozen) JSON value"""
+    if isinstance(value, dict):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [thaw(v) for v in value]
+    return value
+
+# Changes
+#
+# Writers describe what they modify as a list of changes instead of
+# rewriting whole documents, so engines can persist just the difference:
+#   {"op": "set", "path": ["students", "student_1"], "value": {...}}
+#   {"op": "append", "path": ["grades", "student_1", "Math"], "value": {...}}
+#   {"op": "delete", "path": ["students", "student_1"]}
+# Missing dictionaries along the path are created by "set" and "append",
+# and "append" creates the target list if needed.
+
+def change(op: str, path: List, value: Any = None) -> Dict:
+    """Build a change record"""
+    if op == "delete":
+        return {"op": op, "path": path}
+    return {"op": op, "path": path, "value": value}
+
+def apply_change(data: Any, record: Dict):
+    """Apply one change record to a plain document in place"""
+    op = record["op"]
+    path = record["path"]
+
+    parent = data
+    for key in path[:-1]:
+        if isinstance(parent, list):
+            parent = parent[key]
+        else:
+            parent = parent.setdefault(key, {})
+
+    key = path[-1]
+    if op == "set":
+        parent[key] = record["value"]
+    elif op == "append":
+        if isinstance(parent, list):
+            parent[key].append(record["value"])
+        else:
+            parent.setdefault(key, []).append(record["value"])
+    elif op == "delete":
+        if isinstance(parent, list) or key in parent:
+            del parent[key]
+    else:
+        raise ValueError(f"Unknown change op: {op}")
+
+def _copy(container: Any, fresh: set) -> Any:
+    # Containers copied earlier in the same batch are private already
+    if id(container) in fresh:
+        return container
+    if type(container) is FrozenDict:
+        copied = FrozenDict()
+        dict.update(copied, container)
+    elif type(container) is FrozenList:
+        copied = FrozenList()
+        list.extend(copied, container)
+    else:
+        copied = type(container)(container)
+    fresh.add(id(copied))
+    return copied
+
+def _set(container: Any, key: Any, value: Any):
+    if type(container) is FrozenDict:
+        dict.__setitem__(container, key, freeze(value))
+    elif type(container) is FrozenList:
+        list.__setitem__(container, key, freeze(value))
+    else:
+        container[key] = value
+
+def _updated(data: Any, record: Dict, fresh: set) -> Any:
+    op = record["op"]
+    path = record["path"]
+    root = _copy(data, fresh)
+
+    parent = root
+    for key in path[:-1]:
+        if isinstance(parent, list) or key in parent:
+            child = _copy(parent[key], fresh)
+        else:
+            child = {}
+        _set(parent, key, child)
+        parent = parent[key]
+        fresh.add(id(parent))
+
+    key = path[-1]
+    if op == "set":
+        _set(parent, key, record["value"])
+    elif op == "append":
+        if isinstance(parent, list) or key in parent:
+            items = _copy(parent[key], fresh)
+        else:
+            items = []
+        if type(items) is FrozenList:
+            list.append(items, freeze(record["value"]))
+        else:
+            items.append(record["value"])
+        _set(parent, key, items)
+        fresh.add(id(parent[key]))
+    elif op == "delete":
+        if isinstance(parent, list) or key in parent:
+            if type(parent) is FrozenDict:
+                dict.__delitem__(parent, key)
+            elif type(parent) is FrozenList:
+                list.__delitem__(parent, key)
+            else:
+                del parent[key]
+    else:
+        raise ValueError(f"Unknown change op: {op}")
+
+    return root
+
+def updated(data: Any, record: Dict) -> Any:
+    """Return a copy of a document with one change applied.
+
+    Only the containers along the change's path are copied; everything
+    else is shared with the original, which is left untouched. Frozen
+    documents stay frozen.
+    """
+    return _updated(data, record, set())
+
+def updated_all(data: Any, records: List[Dict]) -> Any:
+    """Return a copy of a document with every change applied, copying each container once"""
+    fresh = set()
+    for record in records:
+        data = _updated(data, record, fresh)
+    return data
+
+# Engine dispatch
+
+def _sharded(path: str) -> bool:
+    import shards
+    return shards.is_sharded(path)
+
+def exists(path: str) -> bool:
+    """Whether a document has been created"""
+    if path.endswith(COLUMNAR_SUFFIX):
+        import columnar
+        return columnar.exists(path)
+    if STORAGE_ENGINE == "wal":
+        import wal
+        return wal.exists(path)
+    return os.path.exists(path)
+
+def load(path: str, shard: Optional[str] = None) -> Any:
+    """Load a document with the configured storage engine.
+
+    For a sharded document, shard names the one student whose data the
+    caller needs: only that student's file is read. Unsharded documents
+    ignore it and load whole.
+    """
+    if _sharded(path):
+        import shards
+        return shards.load(path, shard)
+    return load_file(path)
+
+def load_file(path: str) -> Any:
+    """Load a single data file, never composing shards"""
+    if path.endswith(COLUMNAR_SUFFIX):
+        import columnar
+        return columnar.load(path)
+    if STORAGE_ENGINE == "wal":
+        import wal
+        return wal.load(path)
+    return read_json(path)
+
+# Writers
+#
+# Every read-modify-write cycle runs under an exclusive fcntl lock on
+# <path>.lock, against a freshly loaded document. Threads of one process that
+# update the same document at the same time are group-committed: the first
+# becomes the leader, takes the lock once, runs every queued plan in order
+# and persists all of their changes with a single write.
+#
+# A thread can also batch its own updates with transaction(): each document
+# it updates is locked and loaded once, every plan runs against the changed
+# version in memory, and the changes are persisted when the transaction ends,
+# a single write per document.
+
+_held = threading.local()
+_transaction = threading.local()
+_queue_lock = threading.Lock()
+_pending: Dict[str, List[Dict]] = {}
+_leading = set()
+
+@contextmanager
+def locked(path: str):
+    """Hold the exclusive write lock of a document (reentrant per thread)"""
+    held = getattr(_held, "paths", None)
+    if held is None:
+        held = _held.paths = set()
+    if path in held:
+        yield
+        return
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        held.add(path)
+        try:
+            yield
+        finally:
+            held.discard(path)
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def _persist(path: str, data: Any, changes: List[Dict]):
+    if _sharded(path):
+        import shards
+        shards.persist(path, changes)
+    else:
+        write_file(path, data, changes)
+
+def write_file(path: str, data: Any, changes: List[Dict]):
+    """Persist changes to a single data file (the caller holds its lock); data is the changed document"""
+    if path.endswith(COLUMNAR_SUFFIX):
+        import columnar
+        columnar.append(path, changes)
+    elif STORAGE_ENGINE == "wal":
+        import wal
+        wal.append(path, changes)
+    else:
+        write_json(path, data)
+
+def _run_batch(path: str, batch: List[Dict], loader: Callable[[], Any]):
+    with locked(path):
+        data = loader()
+        changes = []
+        # Versions built during the batch are private to it, so containers
+        # copied for one plan can take the next plan's changes in place
+        fresh = set()
+        for request in batch:
+            try:
+                result, planned = request["plan"](data)
+                for record in planned:
+                    data = _updated(data, record, fresh)
+            except Exception as e:
+                request["error"] = e
+                continue
+            request["result"] = result
+            changes.extend(planned)
+
+        if changes:
+            instrument.add("changesWritten", len(changes))
+            try:
+                _persist(path, data, changes)
+            except Exception as e:
+                for request in batch:
+                    if request["error"] is None:
+                        request["error"] = e
+
+    for request in batch:
+        request["done"].set()
+
+def update(path: str, plan: Callable[[Any], Tuple[Any, List[Dict]]], loader: Callable[[], Any],
+           shard: Optional[str] = None) -> Any:
+    """Run plan(document) -> (result, changes) under the write lock and persist the changes.
+
+    loader returns the current document; plan must not modify it and is
+    given the changes of plans queued before it already applied. Returns
+    the plan's result, or raises what the plan (or the write) raised.
+
+    When the plan only touches one student's data, shard names that student:
+    a sharded document then runs it against (and locks) that student's file
+    alone, see shards.update.
+    """
+    if shard is not None and _sharded(path):
+        import shards
+        return shards.update(path, shard, plan)
+
+    documents = getattr(_transaction, "documents", None)
+    if documents is not None:
+        return _update_in_transaction(documents, path, plan, loader)
+
+    request = {"plan": plan, "done": threading.Event(), "result": None, "error": None}
+
+    with _queue_lock:
+        _pending.setdefault(path, []).append(request)
+        lead = path not in _leading
+        if lead:
+            _leading.add(path)
+
+    if lead:
+        while True:
+            with _queue_lock:
+                batch = _pending.pop(path, [])
+                if not batch:
+                    _leading.discard(path)
+                    break
+            try:
+                _run_batch(path, batch, loader)
+            except BaseException as e:
+                for queued in batch:
+                    if not queued["done"].is_set():
+                        queued["error"] = e
+                        queued["done"].set()
+                if not isinstance(e, Exception):
+                    with _queue_lock:
+                        _leading.discard(path)
+                    raise
+    else:
+        request["done"].wait()
+
+    if request["error"] is not None:
+        raise request["error"]
+    return request["result"]
+
+def _update_in_transaction(documents: Dict[str, Dict], path: str, plan: Callable[[Any], Tuple[Any, List[Dict]]],
+                           loader: Callable[[], Any]) -> Any:
+    document = documents.get(path)
+    if document is None:
+        _transaction.locks.enter_context(locked(path))
+        document = documents[path] = {"data": loader(), "changes": [], "fresh": set()}
+
+    result, planned = plan(document["data"])
+    data = document["data"]
+    for record in planned:
+        data = _updated(data, record, document["fresh"])
+    document["data"] = data
+    document["changes"].extend(planned)
+    return result
+
+def _commit(path: str, document: Dict):
+    if document["changes"]:
+        instrument.add("changesWritten", len(document["changes"]))
+        _persist(path, document["data"], document["changes"])
+
+@contextmanager
+def transaction():
+    """Batch this thread's updates: each document is written once, when the block ends.
+
+    Documents stay locked from their first update to the end of the block,
+    which should therefore be short. If the block raises, nothing is
+    written. Until then plain loads see the documents as last written.
+    Updates of sharded documents naming a student are not batched.
+    """
+    if getattr(_transaction, "documents", None) is not None:
+        yield
+        return
+
+    documents: Dict[str, Dict] = {}
+    preparing: List[Callable[[], Any]] = []
+    callbacks: List[Callable[[], Any]] = []
+    with ExitStack() as locks:
+        _transaction.documents = documents
+        _transaction.locks = locks
+        _transaction.preparing = preparing
+        _transaction.callbacks = callbacks
+        _transaction.scope = {}
+        try:
+            yield
+        finally:
+            _transaction.documents = None
+            _transaction.preparing = None
+            _transaction.callbacks = None
+            _transaction.scope = None
+        for callback in preparing:
+            callback()
+        for path, document in documents.items():
+            _commit(path, document)
+    for callback in callbacks:
+        callback()
+
+def before_commit(callback: Callable[[], Any]):
+    """Run callback before this thread's updates are persisted: now, or when its transaction ends without raising"""
+    preparing = getattr(_transaction, "preparing", None)
+    if preparing is None:
+        callback()
+    else:
+        preparing.append(callback)
+
+def after_commit(callback: Callable[[], Any]):
+    """Run callback once this thread's updates are persisted: now, or at the end of its transaction"""
+    callbacks = getattr(_transaction, "callbacks", None)
+    if callbacks is None:
+        callback()
+    else:
+        callbacks.append(callback)
+
+def transaction_scope() -> Optional[Dict]:
+    """A dictionary that lives as long as this thread's transaction; None outside one"""
+    return getattr(_transaction, "scope", None)
+
+def reset(path: str, data: Any):
+    """Replace a document entirely"""
+    documents = getattr(_transaction, "documents", None)
+    if documents is not None and path in documents:
+        # Changes batched before the reset are written first
+        _commit(path, documents.pop(path))
+    with locked(path):
+        if _sharded(path):
+            import shards
+            shards.reset(path, data)
+        else:
+            reset_file(path, data)
+
+def reset_file(path: str, data: Any):
+    """Replace a single data file (the caller holds its lock)"""
+    if path.endswith(COLUMNAR_SUFFIX):
+        import columnar
+        columnar.reset(path, data)
+        return
+    if STORAGE_ENGINE == "wal":
+        import wal
+        wal.reset(path, data)
+        return
+    write_json(path, data)
@@ -0,0 +1,49 @@
+"""
+Salted password hashes.
+
+Passwords are stored as "pbkdf2_sha256$<iterations>$<salt hex>$<hash hex>".
+Accounts created before hashing (including the default teacher accounts,
+whose passwords are the documented defaults) still hold the plain password;
+verify_password accepts those and needs_rehash tells the caller to replace
+them with a hash after the next successful login.
+"""
+
+import hashlib
+import hmac
+import os
+
+SCHEME = "pbkdf2_sha256"
+ITERATIONS = 200_000
+
+def hash_password(password: str, iterations: int = ITERATIONS) -> str:
+    """Hash a password with a fresh random salt"""
+    salt = os.urandom(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+    return f"{SCHEME}${iterations}${salt.hex()}${digest.hex()}"
+
+def verify_password(password: str, stored: str) -> bool:
+    """Check a password against a stored hash (or legacy plain password)"""
+    if not stored:
+        return False
+    parts = stored.split("$")
+    if len(parts) != 4 or parts[0] != SCHEME:
+        return hmac.compare_digest(password.encode(), stored.encode())
+
+    try:
+        iterations = int(parts[1])
+        salt = bytes.fromhex(parts[2])
+        expected = bytes.fromhex(parts[3])
+    except ValueError:
+        return False
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+    return hmac.compare_digest(digest, expected)
+
+def needs_rehash(stored: str) -> bool:
+    """Whether a stored password is plain or hashed with fewer iterations than ITERATIONS"""
+    parts = stored.split("$")
+    if len(parts) != 4 or parts[0] != SCHEME:
+        return True
+    try:
+        return int(parts[1]) < ITERATIONS
+    except ValueError:
+        return True
@@ -0,0 +1,249 @@
+"""
+End-of-term report cards for every student.
+
+A report card holds a student's per-subject grade averages and trends, their
+GPA (as gpa.py calculate), attendance percentages (as attendance.py stats)
+and assignment completion. The whole school is read once; the students are
+then split into batches computed by a pool of worker processes, and each
+finished batch is written out while the rest are still being computed, so
+memory holds only the batches in flight.
+
+Output is a file per student (data/reports/<student ID>.json, or .csv) or
+one combined file: a JSON array, or a CSV table with a row per student.
+
+Usage:
+    python3 scripts/reports.py generate [--format json|csv] [--output <dir>]
+    python3 scripts/reports.py generate --combined <file> [--format json|csv]
+    options: --jobs <processes> (default: one per CPU; 1 computes in this process)
+             --batch <students per batch> (default 200)
+"""
+
+import instrument  # first, so the import phase covers the other imports
+import csv
+import io
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+import database
+from subjects import SUBJECTS
+
+OUTPUT_DIR = "data/reports"
+FORMATS = ["json", "csv"]
+STATUSES = ["present", "absent", "late"]
+# Submission statuses that count an assignment as done
+COMPLETED = ["submitted", "late", "graded"]
+
+def _trend(grades: List[float]) -> Optional[float]:
+    """Least-squares change in grade per entry, oldest first; None below two grades"""
+    n = len(grades)
+    if n < 2:
+        return None
+    mean_x = (n - 1) / 2
+    mean_y = sum(grades) / n
+    numerator = sum((x - mean_x) * (y - mean_y) for x, y in enumerate(grades))
+    denominator = sum((x - mean_x) ** 2 for x in range(n))
+    return round(numerator / denominator, 2)
+
+def report_card(student: Dict, grades: Dict, attendance: List[Dict], submissions: List[Dict],
+                assignments: Dict[str, List[str]]) -> Dict:
+    """One student's report card.
+
+    grades, attendance and submissions are the student's entries in the
+    database.json layout; assignments maps each subject to its assignment IDs.
+    """
+    subjects = {}
+    for subject, entries in grades.items():
+        values = [entry["grade"] for entry in entries]
+        if values:
+            subjects[subject] = {
+                "average": round(sum(values) / len(values), 2),
+                "count": len(values),
+                "trend": _trend(values)
+            }
+    averages = [sum(e["grade"] for e in entries) / len(entries) for entries in grades.values() if entries]
+
+    counts = {status: 0 for status in STATUSES}
+    for record in attendance:
+        if record.get("status") in counts:
+            counts[record["status"]] += 1
+    total = len(attendance)
+
+    due = {a for subject in grades for a in assignments.get(subject, [])}
+    done = {s["assignmentId"] for s in submissions if s.get("status") in COMPLETED and s["assignmentId"] in due}
+
+    return {
+        "studentId": student["id"],
+        "name": student.get("name"),
+        "surname": student.get("surname"),
+        "gpa": round(sum(averages) / len(averages), 2) if averages else 0.0,
+        "subjects": subjects,
+        "attendance": {
+            **counts,
+            "total": total,
+            "percentage": round(counts["present"] / total * 100, 2) if total else 0
+        },
+        "assignments": {
+            "assigned": len(due),
+            "completed": len(done),
+            "percentage": round(len(done) / len(due) * 100, 2) if due else 0
+        }
+    }
+
+# Worker processes get the assignments once, when they start, and then only
+# their batches' students
+_assignments: Dict[str, List[str]] = {}
+
+def _start_worker(assignments: Dict[str, List[str]]):
+    global _assignments
+    _assignments = assignments
+
+def _report_batch(batch: List[Tuple]) -> List[Dict]:
+    return [report_card(*entry, _assignments) for entry in batch]
+
+def _batches(db: Dict, size: int) -> Iterator[List[Tuple]]:
+    """The students of a database.json-layout dictionary with their entries, size at a time"""
+    batch = []
+    for student_id, student in db.get("students", {}).items():
+        batch.append((student, db.get("grades", {}).get(student_id, {}), db.get("attendance", {}).get(student_id, []),
+                      db.get("submissions", {}).get(student_id, [])))
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def assignments_by_subject(assignments: Dict) -> Dict[str, List[str]]:
+    """Assignment IDs per subject"""
+    result: Dict[str, List[str]] = {}
+    for assignment_id, assignment in assignments.items():
+        result.setdefault(assignment.get("subject"), []).append(assignment_id)
+    return result
+
+def generate(db: Dict, jobs: Optional[int] = None, batch_size: int = 200) -> Iterator[Dict]:
+    """Yield every student's report card, in student order.
+
+    With more than one job the batches are computed by a process pool; at
+    most two batches per process are in flight at a time.
+    """
+    assignments = assignments_by_subject(db.get("assignments", {}))
+    batches = _batches(db, batch_size)
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1:
+        _start_worker(assignments)
+        for batch in batches:
+            yield from _report_batch(batch)
+        return
+
+    with ProcessPoolExecutor(jobs, initializer=_start_worker, initargs=(assignments,)) as pool:
+        pending = []
+        for batch in batches:
+            pending.append(pool.submit(_report_batch, batch))
+            if len(pending) >= 2 * jobs:
+                yield from pending.pop(0).result()
+        for future in pending:
+            yield from future.result()
+
+def _subjects(db: Dict) -> List[str]:
+    subjects = list(SUBJECTS)
+    for student_grades in db.get("grades", {}).values():
+        subjects.extend(s for s in student_grades if s not in subjects)
+    return subjects
+
+def csv_header(subjects: List[str]) -> List[str]:
+    """Columns of the CSV reports: one row per student, three columns per subject"""
+    header = ["studentId", "name", "surname", "gpa", "attendancePercentage", "present", "absent", "late",
+              "assignmentsAssigned", "assignmentsCompleted", "completionPercentage"]
+    for subject in subjects:
+        header += [f"{subject} average", f"{subject} count", f"{subject} trend"]
+    return header
+
+def csv_row(card: Dict, subjects: List[str]) -> List:
+    """A report card as a row under csv_header(subjects)"""
+    attendance = card["attendance"]
+    row = [card["studentId"], card["name"], card["surname"], card["gpa"], attendance["percentage"],
+           attendance["present"], attendance["absent"], attendance["late"], card["assignments"]["assigned"],
+           card["assignments"]["completed"], card["assignments"]["percentage"]]
+    for subject in subjects:
+        entry = card["subjects"].get(subject)
+        row += [entry["average"], entry["count"], entry["trend"]] if entry else ["", "", ""]
+    return ["" if value is None else value for value in row]
+
+def _csv_line(values: List) -> str:
+    out = io.StringIO()
+    csv.writer(out, lineterminator="\n").writerow(values)
+    return out.getvalue()
+
+def write_reports(db: Dict, fmt: str = "json", output: str = OUTPUT_DIR, combined: Optional[str] = None,
+                  jobs: Optional[int] = None, batch_size: int = 200) -> Dict:
+    """Generate every report card and write it out as it is produced; returns what was written"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt}")
+    subjects = _subjects(db)
+    cards = generate(db, jobs, batch_size)
+    count = 0
+
+    if combined is not None:
+        os.makedirs(os.path.dirname(combined) or ".", exist_ok=True)
+        with open(combined, "w", encoding="utf-8", newline="") as f:
+            if fmt == "csv":
+                f.write(_csv_line(csv_header(subjects)))
+            else:
+                f.write("[")
+            for card in cards:
+                if fmt == "csv":
+                    f.write(_csv_line(csv_row(card, subjects)))
+                else:
+                    f.write(("," if count else "") + "\n" + json.dumps(card))
+                count += 1
+            if fmt == "json":
+                f.write("\n]\n")
+        return {"students": count, "file": combined}
+
+    os.makedirs(output, exist_ok=True)
+    header = _csv_line(csv_header(subjects))
+    for card in cards:
+        with open(os.path.join(output, f"{card['studentId']}.{fmt}"), "w", encoding="utf-8", newline="") as f:
+            if fmt == "csv":
+                f.write(header + _csv_line(csv_row(card, subjects)))
+            else:
+                json.dump(card, f, indent=2)
+        count += 1
+    return {"students": count, "directory": output}
+
+# Options of `generate`: flag -> write_reports keyword argument
+OPTIONS = {
+    "--format": "fmt",
+    "--output": "output",
+    "--combined": "combined",
+    "--jobs": "jobs",
+    "--batch": "batch_size"
+}
+
+def run_command(args: List[str]) -> Tuple[str, int]:
+    """Run a CLI command and return its output and exit code"""
+    if len(args) < 1 or args[0] != "generate":
+        return json.dumps({"success": False, "error": "Usage: python reports.py generate [options]"}), 1
+
+    options = {}
+    i = 1
+    while i < len(args):
+        if args[i] not in OPTIONS or i + 1 >= len(args):
+            return json.dumps({"success": False, "error": f"Unexpected argument: {args[i]}"}), 1
+        options[OPTIONS[args[i]]] = args[i + 1]
+        i += 2
+
+    try:
+        for name in ("jobs", "batch_size"):
+            if name in options:
+                options[name] = int(options[name])
+                if options[name] < 1:
+                    raise ValueError(f"{name} must be positive")
+        result = write_reports(database.load_db(), **options)
+    except ValueError as e:
+        return json.dumps({"success": False, "error": str(e)}), 1
+    return json.dumps({"success": True, **result}), 0
+
+if __name__ == "__main__":
+    sys.exit(instrument.run_cli("reports.py", run_command, sys.argv[1:]))
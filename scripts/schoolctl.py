@@ -0,0 +1,85 @@
+"""
+Single entry point for the command-line scripts.
+
+    python3 scripts/schoolctl.py <module> <command> [args]
+
+runs a command exactly as `python3 scripts/<module>.py <command> [args]`
+would (same output, exit code and --profile support). Only the named module
+and what it imports are loaded, so no command pays the start-up cost of the
+other modules.
+
+The scripts can be packaged as a single executable zip archive (zipapp).
+The archive holds compiled bytecode next to the sources, so nothing is
+compiled when it starts (under another Python version the sources are used):
+
+    python3 scripts/schoolctl.py build dist/schoolctl.pyz
+    python3 dist/schoolctl.pyz students list
+
+Start-up times are measured by `python3 scripts/benchmark.py startup`.
+
+Usage:
+    python3 scripts/schoolctl.py <module> <command> [args]
+    python3 scripts/schoolctl.py modules
+    python3 scripts/schoolctl.py build <target.pyz>
+"""
+
+import instrument  # first, so the import phase covers the other imports
+import importlib
+import json
+import os
+import sys
+from typing import Dict, List, Optional
+
+# Module: name of its command function (args -> (output, exit code))
+MODULES = {
+    "students": "run_streaming_command",
+    "auth": "run_command",
+    "assignments": "run_command",
+    "attendance": "run_command",
+    "gpa": "run_command",
+    "reports": "run_command",
+    "sync": "run_command",
+    "grades": "run_command",
+}
+
+def run(args: List[str]) -> int:
+    """Run a module's command, printing its output; returns the exit code"""
+    module = importlib.import_module(args[0])
+    return instrument.run_cli(f"{args[0]}.py", getattr(module, MODULES[args[0]]), args[1:])
+
+def build(target: str) -> Dict:
+    """Package the scripts and their bytecode into an executable zip archive"""
+    import py_compile
+    import shutil
+    import tempfile
+    import zipapp
+
+    scripts = os.path.dirname(os.path.abspath(__file__))
+    sources = sorted(name for name in os.listdir(scripts)
+                     if name.endswith(".py") and not name.startswith("test_") and name != "benchmark.py")
+    with tempfile.TemporaryDirectory() as staging:
+        for name in sources:
+            shutil.copy2(os.path.join(scripts, name), staging)
+            # zipimport loads name.pyc stored next to name.py; the archive never
+            # changes, so the bytecode need not be checked against the source
+            py_compile.compile(os.path.join(staging, name), cfile=os.path.join(staging, name + "c"), doraise=True,
+                               invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+        os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+        zipapp.create_archive(staging, target, interpreter="/usr/bin/env python3", main="schoolctl:main")
+    return {"target": target, "modules": len(sources), "bytes": os.path.getsize(target)}
+
+def main(argv: Optional[List[str]] = None):
+    args = sys.argv[1:] if argv is None else argv
+    if args[:1] == ["modules"]:
+        print(json.dumps({"modules": list(MODULES)}))
+        sys.exit(0)
+    if args[:1] == ["build"] and len(args) == 2:
+        print(json.dumps({"success": True, **build(args[1])}))
+        sys.exit(0)
+    if not args or args[0] not in MODULES:
+        print(__doc__.strip().split("Usage:")[1].rstrip())
+        sys.exit(1)
+    sys.exit(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Student search by name, surname and ID: prefix, case-insensitive and
+typo-tolerant.
+
+The storage engines keep an inverted index of the students, the "search"
+collection (see storage.DERIVED):
+
+    {"emma": ["student_1", "student_7"], "johnson": ["student_1"], "student_1": ["student_1"], ...}
+
+mapping each lower-cased word of a student's name and surname, and their
+lower-cased ID, to the IDs of the students having it, in creation order.
+Creating or removing a student only changes the entries of their own words.
+
+An Index answers queries over that collection: its terms are kept sorted,
+so the terms starting with a query word are found by binary search, and the
+terms within a couple of typos of it are found through the three-letter
+sequences they share with it. Every word of a query has to match; students
+rank by how closely their words match:
+
+    0  the whole word            ("emma" -> Emma)
+    1  a prefix                  ("joh" -> Johnson)
+    2+ within typos of the word  ("emam" -> Emma: one typo, 2)
+    3+ within typos of a prefix  ("jhon" -> Johnson: one typo, 3)
+"""
+
+import bisect
+import heapq
+import itertools
+import re
+from typing import Dict, List, Mapping, Optional, Tuple
+
+def words(text: str) -> List[str]:
+    """The lower-cased words of text"""
+    return re.findall(r"\w+", text.lower())
+
+def terms(student_id: str, student: Dict) -> List[str]:
+    """The index terms of a student: the words of their name and surname, and their ID"""
+    found = words(f"{student.get('name') or ''} {student.get('surname') or ''}") + [student_id.lower()]
+    return list(dict.fromkeys(found))
+
+def max_typos(word: str) -> int:
+    """Typos tolerated in a query word: none below three letters, two from six"""
+    return 0 if len(word) < 3 else 1 if len(word) < 6 else 2
+
+def distance(a: str, b: str, limit: int) -> int:
+    """Edit distance between a and b counting a swap of neighbours as one edit; limit + 1 once above limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        before, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+def _grams(word: str) -> List[str]:
+    # The three-letter sequences of a word, the first ones padded so that
+    # its first letters count too; a prefix shares its grams with the word
+    padded = "  " + word
+    return [padded[i:i + 3] for i in range(len(word))]
+
+class Index:
+    """Queries over a search collection, which is not copied"""
+
+    def __init__(self, postings: Mapping[str, List[str]]):
+        self.postings = postings
+        self.terms = sorted(postings)
+        # gram -> positions in terms of the words having it, built when a
+        # query first needs it; IDs, which contain digits, are left out as
+        # nobody mistypes their way to another student's ID
+        self._grams: Optional[Dict[str, List[int]]] = None
+
+    def _gram_index(self) -> Dict[str, List[int]]:
+        if self._grams is None:
+            self._grams = {}
+            for position, term in enumerate(self.terms):
+                if not any(c.isdigit() for c in term):
+                    for gram in set(_grams(term)):
+                        self._grams.setdefault(gram, []).append(position)
+        return self._grams
+
+    def prefixed(self, word: str) -> List[str]:
+        """The terms starting with word, in order"""
+        start = bisect.bisect_left(self.terms, word)
+        return self.terms[start:bisect.bisect_left(self.terms, word[:-1] + chr(ord(word[-1]) + 1), start)]
+
+    def similar(self, word: str) -> Dict[str, int]:
+        """Terms within max_typos(word) of word or of a prefix of theirs -> rank (see the module docstring)"""
+        limit = max_typos(word)
+        if not limit:
+            return {}
+        grams = _grams(word)
+        shared: Dict[int, int] = {}
+        for gram in set(grams):
+            for position in self._gram_index().get(gram, []):
+                shared[position] = shared.get(position, 0) + 1
+
+        # Each typo changes at most three grams of the word
+        needed = max(1, len(grams) - 3 * limit)
+        found = {}
+        for position, count in shared.items():
+            term = self.terms[position]
+            if count < needed or term.startswith(word):
+                continue
+            whole = distance(word, term, limit)
+            if whole <= limit:
+                found[term] = 1 + whole
+                continue
+            start = min((distance(word, term[:length], limit)
+                         for length in range(len(word) - limit, len(word) + limit + 1) if 0 < length < len(term)),
+                        default=limit + 1)
+            if start <= limit:
+                found[term] = 2 + start
+        return found
+
+    def ranked(self, word: str) -> List[Tuple[int, List[str]]]:
+        """(rank, terms) of the terms word matches, best rank first and terms in order"""
+        prefixed = self.prefixed(word)
+        tiers = []
+        if prefixed and prefixed[0] == word:
+            tiers.append((0, [word]))
+            prefixed = prefixed[1:]
+        if prefixed:
+            tiers.append((1, prefixed))
+        similar = self.similar(word)
+        for rank in sorted(set(similar.values())):
+            tiers.append((rank, sorted(term for term, r in similar.items() if r == rank)))
+        return tiers
+
+    def matches(self, word: str) -> Dict[str, Tuple[int, str]]:
+        """Student ID -> (rank, term) of the closest term word matches for each student"""
+        students: Dict[str, Tuple[int, str]] = {}
+        # Worst first, so that each student ends up with their best term
+        for rank, terms in reversed(self.ranked(word)):
+            for term in reversed(terms):
+                students.update(dict.fromkeys(self.postings[term], (rank, term)))
+        return students
+
+    def search(self, query: str, limit: int = 10) -> Tuple[List[str], int]:
+        """(IDs of the best limit students matching every word of query, number of students matching)
+
+        Students rank by the sum of their words' ranks, then by the term
+        their first word matched and their ID.
+        """
+        query_words = list(dict.fromkeys(words(query)))
+        if not query_words:
+            return [], 0
+        if len(query_words) == 1:
+            return self._search_word(query_words[0], limit)
+
+        found = [self.matches(word) for word in query_words]
+        smallest = min(found, key=len)
+        candidates = {student_id: (sum(matches[student_id][0] for matches in found), found[0][student_id][1])
+                      for student_id in smallest if all(student_id in matches for matches in found)}
+        best = heapq.nsmallest(limit, candidates, key=lambda student_id: (*candidates[student_id], student_id))
+        return best, len(candidates)
+
+    def _search_word(self, word: str, limit: int) -> Tuple[List[str], int]:
+        # The order of search, reading the terms best first only until limit
+        # students are found (the first letters typed into a search box
+        # match most of the school); the count takes a set union
+        tiers = self.ranked(word)
+        best: List[str] = []
+        seen = set()
+        for _, terms in tiers:
+            for term in terms:
+                if len(best) >= limit:
+                    break
+                for student_id in sorted(self.postings[term]):
+                    if student_id not in seen:
+                        seen.add(student_id)
+                        best.append(student_id)
+        postings = map(self.postings.__getitem__, itertools.chain.from_iterable(terms for _, terms in tiers))
+        return best[:limit], len(set(itertools.chain.from_iterable(postings)))
@@ -0,0 +1,410 @@
+"""
+Persistent backend server speaking a JSON-lines protocol.
+
+Instead of spawning one python3 process per API call, start the server once
+and send it one JSON object per line:
+
+    {"id": 1, "module": "students", "args": ["get", "student_1"]}
+
+Every request gets a single-line response:
+
+    {"id": 1, "status": 0, "result": {"success": true, "student": {...}}}
+
+`module` is one of students, auth, assignments, attendance, gpa, sync or grades and `args`
+are exactly the arguments the matching CLI script takes; `result` is the
+payload that script would print and `status` its exit code. A command that
+reads stdin (`students add_grades_bulk -`) reads the request's `input`
+string instead, never the protocol stream. Parsed data files
+are cached in memory (read-only, see jsonstore) between requests and reloaded
+only when they change on disk.
+
+With --async the socket is served by an asyncio front end built for bursts
+of traffic (see AsyncBackend): identical reads in flight at the same time
+share one computation, writes are collected for a few milliseconds and
+committed together, a client is not read from while too many requests are
+in flight, and latency is counted per command. Its responses can come out
+of order, so clients match them by id. {"module": "server", "args":
+["stats"]} returns the counters.
+
+Usage:
+    python3 scripts/server.py                         # stdin/stdout
+    python3 scripts/server.py --socket data/backend.sock
+    python3 scripts/server.py --async --socket data/backend.sock
+"""
+
+import asyncio
+import io
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import assignments
+import attendance
+import auth
+import gpa
+import grades
+import storage
+import students
+import sync
+from jsonstore import enable_cache
+
+MODULES = {
+    "students": students,
+    "auth": auth,
+    "assignments": assignments,
+    "attendance": attendance,
+    "gpa": gpa,
+    "sync": sync,
+    "grades": grades,
+}
+
+# The backend functions are not thread-safe, so requests run one at a time
+_dispatch_lock = threading.Lock()
+
+class _NoInput(io.TextIOBase):
+    """stdin of a request without input: the server's own stdin may be the protocol stream"""
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: Optional[int] = -1) -> str:
+        raise OSError("stdin is not available in the server; send the rows as the request's input string")
+
+    readline = read
+
+def handle_request(request: Dict) -> Dict:
+    """Run one request and build its response"""
+    response = {"id": request.get("id")}
+    module = MODULES.get(request.get("module"))
+    args = request.get("args", [])
+
+    if module is None:
+        response.update({"status": 1, "error": "Unknown module"})
+        return response
+
+    if not isinstance(args, list) or not all(isinstance(a, str) for a in args):
+        response.update({"status": 1, "error": "args must be a list of strings"})
+        return response
+
+    text = request.get("input")
+    if text is not None and not isinstance(text, str):
+        response.update({"status": 1, "error": "input must be a string"})
+        return response
+
+    try:
+        with _dispatch_lock:
+            stdin = sys.stdin
+            sys.stdin = io.StringIO(text) if text is not None else _NoInput()
+            try:
+                output, status = module.run_command(args)
+            finally:
+                sys.stdin = stdin
+    except Exception as e:
+        response.update({"status": 1, "error": str(e)})
+        return response
+
+    try:
+        result = json.loads(output) if output else None
+    except ValueError:
+        result = output
+
+    response.update({"status": status, "result": result})
+    return response
+
+def handle_line(line: str) -> str:
+    """Decode a request line and encode its response line"""
+    try:
+        request = json.loads(line)
+    except ValueError:
+        return json.dumps({"id": None, "status": 1, "error": "Invalid JSON"})
+
+    if not isinstance(request, dict):
+        return json.dumps({"id": None, "status": 1, "error": "Request must be an object"})
+
+    return json.dumps(handle_request(request))
+
+def serve_stdio():
+    """Serve requests from stdin until EOF"""
+    # Keep stray prints from the backend modules out of the protocol stream
+    out = sys.stdout
+    sys.stdout = sys.stderr
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        out.write(handle_line(line) + "\n")
+        out.flush()
+
+class _LineHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for raw in self.rfile:
+            line = raw.decode("utf-8")
+            if not line.strip():
+                continue
+            self.wfile.write((handle_line(line) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def serve_socket(path: str):
+    """Serve requests on a Unix socket until interrupted"""
+    if os.path.exists(path):
+        os.unlink(path)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    with _UnixServer(path, _LineHandler) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(path)
+
+# Asyncio front end
+
+# Commands that only read, by module: identical ones in flight together are
+# computed once
+READS = {
+    "students": {"list", "get", "get_grades", "class_average", "list_for_parent", "grades_for_parent",
+                 "changes", "search"},
+    "gpa": {"calculate", "class_average", "table"},
+    "attendance": {"get", "stats"},
+    "assignments": {"get_by_subject", "get_all", "get_submissions", "get_assignment_submissions"},
+    "sync": {"version", "changes"},
+    "grades": {"trend"},
+}
+
+# Commands that write one record, by module: they are committed in batches
+WRITES = {
+    "students": {"add_grade"},
+    "attendance": {"add"},
+    "assignments": {"update_submission"},
+}
+
+class AsyncBackend:
+    """Runs requests for an asyncio server.
+
+    The backend functions run one at a time on a single worker thread, as
+    in the other servers. Around them:
+
+    - read coalescing: a READS request identical (same module and args) to
+      one already in flight waits for that one's result instead of running
+    - write batching: WRITES requests wait up to flush_interval seconds (or
+      until max_batch are waiting) and then run together in one storage
+      transaction, so each data file is written once per batch; they are
+      answered once the batch is committed
+    - backpressure: at most max_inflight requests are admitted at a time;
+      connections are not read from while the limit is reached
+    - latency counters per command (see stats)
+    """
+
+    def __init__(self, flush_interval: float = 0.005, max_batch: int = 256, max_inflight: int = 1024,
+                 samples: int = 1000):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_inflight = max_inflight
+        self.samples = samples
+        self.worker = ThreadPoolExecutor(1)
+        self.slots: Optional[asyncio.Semaphore] = None
+        self.reads: Dict[Tuple, asyncio.Future] = {}
+        self.writes: List[Tuple[Dict, asyncio.Future]] = []
+        self.flush_handle: Optional[asyncio.TimerHandle] = None
+        self.counters: Dict[str, Dict[str, Any]] = {}
+        self.totals = {"requests": 0, "inflight": 0, "coalesced": 0, "flushes": 0, "batchedWrites": 0}
+
+    async def admit(self):
+        """Wait for room for one more request"""
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.max_inflight)
+        await self.slots.acquire()
+        self.totals["inflight"] += 1
+
+    def release(self):
+        """Give back the room of a request that has been answered"""
+        self.totals["inflight"] -= 1
+        self.slots.release()
+
+    async def handle(self, request: Dict) -> Dict:
+        """Answer one request"""
+        module = request.get("module")
+        args = request.get("args", [])
+        if module == "server":
+            return {"id": request.get("id"), "status": 0, "result": self.stats()}
+
+        started = time.perf_counter()
+        valid = isinstance(args, list) and all(isinstance(a, str) for a in args)
+        command = args[0] if valid and args else ""
+        if command in READS.get(module, ()):
+            response, coalesced = await self._read(request)
+        elif command in WRITES.get(module, ()):
+            response, coalesced = await self._write(request), False
+        else:
+            # Anything else may write too: later reads must not join earlier ones
+            self.reads.clear()
+            response, coalesced = await self._run(handle_request, request), False
+        self._count(f"{module} {command}".strip(), started, response, coalesced)
+        return response
+
+    async def _run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.worker, function, *args)
+
+    async def _read(self, request: Dict) -> Tuple[Dict, bool]:
+        key = (request["module"], tuple(request["args"]))
+        shared = self.reads.get(key)
+        if shared is not None:
+            response = await asyncio.shield(shared)
+            return {**response, "id": request.get("id")}, True
+
+        shared = asyncio.ensure_future(self._run(handle_request, {"module": request["module"], "args": request["args"]}))
+        self.reads[key] = shared
+        try:
+            response = await asyncio.shield(shared)
+        finally:
+            if self.reads.get(key) is shared:
+                del self.reads[key]
+        return {**response, "id": request.get("id")}, False
+
+    async def _write(self, request: Dict) -> Dict:
+        answered = asyncio.get_running_loop().create_future()
+        self.writes.append((request, answered))
+        if len(self.writes) >= self.max_batch:
+            self._flush()
+        elif self.flush_handle is None:
+            self.flush_handle = asyncio.get_running_loop().call_later(self.flush_interval, self._flush)
+        return await answered
+
+    def _flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        batch, self.writes = self.writes[:self.max_batch], self.writes[self.max_batch:]
+        if not batch:
+            return
+        # Reads started from now on run after the batch and must see it
+        self.reads.clear()
+        self.totals["flushes"] += 1
+        self.totals["batchedWrites"] += len(batch)
+        asyncio.ensure_future(self._commit(batch))
+        if self.writes:
+            self.flush_handle = asyncio.get_running_loop().call_later(self.flush_interval, self._flush)
+
+    async def _commit(self, batch: List[Tuple[Dict, asyncio.Future]]):
+        responses = await self._run(run_batch, [request for request, _ in batch])
+        for (_, answered), response in zip(batch, responses):
+            answered.set_result(response)
+
+    def _count(self, command: str, started: float, response: Dict, coalesced: bool):
+        counter = self.counters.get(command)
+        if counter is None:
+            counter = self.counters[command] = {"requests": 0, "errors": 0, "coalesced": 0, "totalMs": 0.0,
+                                                "maxMs": 0.0, "recent": deque(maxlen=self.samples)}
+        elapsed = (time.perf_counter() - started) * 1000
+        counter["requests"] += 1
+        counter["errors"] += response.get("status") != 0
+        counter["coalesced"] += coalesced
+        counter["totalMs"] += elapsed
+        counter["maxMs"] = max(counter["maxMs"], elapsed)
+        counter["recent"].append(elapsed)
+        self.totals["requests"] += 1
+        self.totals["coalesced"] += coalesced
+
+    def stats(self) -> Dict:
+        """Totals, and per command: requests, errors, coalesced reads, mean and max latency,
+        and percentiles over the most recent samples (milliseconds)"""
+        commands = {}
+        for command, counter in self.counters.items():
+            recent: Deque[float] = counter["recent"]
+            ordered = sorted(recent)
+            commands[command] = {
+                "requests": counter["requests"],
+                "errors": counter["errors"],
+                "coalesced": counter["coalesced"],
+                "meanMs": round(counter["totalMs"] / counter["requests"], 3),
+                "maxMs": round(counter["maxMs"], 3),
+                **{f"p{q}Ms": round(ordered[min(len(ordered) - 1, len(ordered) * q // 100)], 3) for q in (50, 95, 99)}
+            }
+        return {**self.totals, "pendingWrites": len(self.writes), "commands": commands}
+
+def run_batch(requests: List[Dict]) -> List[Dict]:
+    """Run write requests in one storage transaction; if it cannot be committed, they all fail"""
+    try:
+        with storage.transaction():
+            responses = [handle_request(request) for request in requests]
+    except Exception as e:
+        return [{"id": request.get("id"), "status": 1, "error": str(e)} for request in requests]
+    return responses
+
+async def _serve_connection(backend: AsyncBackend, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    async def respond(line: bytes):
+        try:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                request = None
+            if isinstance(request, dict) and (request.get("module") == "server" or request.get("module") in MODULES):
+                response = await backend.handle(request)
+            else:
+                # Malformed and unknown requests are answered as by the other servers
+                response = json.loads(handle_line(line.decode("utf-8", "replace")))
+            writer.write((json.dumps(response) + "\n").encode("utf-8"))
+            await writer.drain()
+        finally:
+            backend.release()
+
+    tasks = set()
+    try:
+        while True:
+            await backend.admit()
+            line = await reader.readline()
+            if not line.strip():
+                backend.release()
+                if not line:
+                    break
+                continue
+            task = asyncio.ensure_future(respond(line))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        writer.close()
+
+async def serve_async(path: str, backend: Optional[AsyncBackend] = None):
+    """Serve requests on a Unix socket with the asyncio front end until cancelled"""
+    backend = backend or AsyncBackend()
+    if os.path.exists(path):
+        os.unlink(path)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    server = await asyncio.start_unix_server(lambda r, w: _serve_connection(backend, r, w), path,
+                                             limit=16 * 1024 * 1024)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        os.unlink(path)
+
+if __name__ == "__main__":
+    enable_cache()
+
+    if len(sys.argv) > 3 and sys.argv[1:3] == ["--async", "--socket"]:
+        # Keep stray prints from the backend modules out of the responses
+        sys.stdout = sys.stderr
+        try:
+            asyncio.run(serve_async(sys.argv[3]))
+        except KeyboardInterrupt:
+            pass
+    elif len(sys.argv) > 2 and sys.argv[1] == "--socket":
+        serve_socket(sys.argv[2])
+    elif len(sys.argv) > 1:
+        print("Usage: python server.py [[--async] --socket <path>]")
+        sys.exit(1)
+    else:
+        serve_stdio()
@@ -0,0 +1,166 @@
+"""
+Login sessions.
+
+A successful login issues an opaque token; verify_token resolves it to the
+user record without reading the users file or re-checking the password. Tokens
+live in a bounded store that expires them after SESSION_TTL seconds and drops
+the least recently used ones beyond MAX_SESSIONS. The store is mirrored to
+data/sessions.json so sessions survive restarts and are shared between
+processes; the file holds SHA-256 digests of the tokens, never the tokens
+themselves.
+
+Each session keeps the time it was last used, written back at most once per
+SESSION_TOUCH seconds so that token checks rarely write; other processes
+evict by that time, so their eviction order is least recently used to
+within SESSION_TOUCH. The user record is a copy taken at login, which
+auth.py refreshes when accounts change (see refresh_users).
+"""
+
+import hashlib
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+import instrument
+from jsonstore import locked, write_json
+
+SESSIONS_FILE = "data/sessions.json"
+SESSION_TTL = int(os.environ.get("SCHOOL_SESSION_TTL", 8 * 60 * 60))
+MAX_SESSIONS = int(os.environ.get("SCHOOL_MAX_SESSIONS", 10000))
+SESSION_TOUCH = int(os.environ.get("SCHOOL_SESSION_TOUCH", 60))
+
+def _digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+class SessionStore:
+    """Bounded TTL/LRU map of token digests to users, mirrored to a side file"""
+
+    def __init__(self, path: str, ttl: int, capacity: int, touch: int = SESSION_TOUCH):
+        self.path = path
+        self.ttl = ttl
+        self.capacity = capacity
+        # Seconds between writes of a session's last use
+        self.touch = touch
+        self._sessions: "OrderedDict[str, Dict]" = OrderedDict()
+        self._file_key = None
+        self._lock = threading.RLock()
+
+    def _sync(self):
+        # Reload when another process has rewritten the file; a stat per call
+        # keeps logouts elsewhere visible without re-reading unchanged files
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self._sessions.clear()
+            self._file_key = None
+            return
+        key = (st.st_mtime_ns, st.st_size, st.st_ino)
+        if key == self._file_key:
+            return
+
+        stored = instrument.load_json(self.path)
+        now = time.time()
+        # Least recently used first
+        self._sessions = OrderedDict(sorted(
+            ((digest, session) for digest, session in stored.items() if session["expires"] > now),
+            key=lambda item: item[1].get("used", 0)
+        ))
+        self._file_key = key
+
+    def _save(self):
+        write_json(self.path, dict(self._sessions))
+        st = os.stat(self.path)
+        self._file_key = (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def create(self, user: Dict) -> Tuple[str, float]:
+        """Start a session for a user; returns (token, expiry timestamp)"""
+        token = secrets.token_urlsafe(32)
+        expires = time.time() + self.ttl
+        with self._lock, locked(self.path):
+            self._sync()
+            now = time.time()
+            for digest in [d for d, s in self._sessions.items() if s["expires"] <= now]:
+                del self._sessions[digest]
+            self._sessions[_digest(token)] = {"user": user, "expires": expires, "used": now}
+            while len(self._sessions) > self.capacity:
+                self._sessions.popitem(last=False)
+            self._save()
+        return token, expires
+
+    def get(self, token: str) -> Optional[Dict]:
+        """The user a token belongs to, or None if it is unknown or expired"""
+        digest = _digest(token)
+        with self._lock:
+            self._sync()
+            session = self._sessions.get(digest)
+            if session is None:
+                return None
+            if session["expires"] <= time.time():
+                del self._sessions[digest]
+                return None
+            self._sessions.move_to_end(digest)
+            if time.time() - session.get("used", 0) >= self.touch:
+                self._used(digest)
+            return session["user"]
+
+    def _used(self, digest: str):
+        # Persist the last use of a session
+        with locked(self.path):
+            self._sync()
+            session = self._sessions.get(digest)
+            if session is None:
+                return
+            self._sessions[digest] = {**session, "used": time.time()}
+            self._sessions.move_to_end(digest)
+            self._save()
+
+    def revoke(self, token: str) -> bool:
+        """End a session; returns False if it did not exist"""
+        digest = _digest(token)
+        with self._lock, locked(self.path):
+            self._sync()
+            if self._sessions.pop(digest, None) is None:
+                return False
+            self._save()
+        return True
+
+    def refresh_users(self, user: Callable[[str], Optional[Dict]]):
+        """Replace the user record of every session with user(username); end the session where it is None"""
+        with self._lock, locked(self.path):
+            self._sync()
+            changed = False
+            users: Dict[str, Optional[Dict]] = {}
+            for digest, session in list(self._sessions.items()):
+                username = session["user"]["username"]
+                if username not in users:
+                    users[username] = user(username)
+                if users[username] is None:
+                    del self._sessions[digest]
+                elif users[username] != session["user"]:
+                    self._sessions[digest] = {**session, "user": users[username]}
+                else:
+                    continue
+                changed = True
+            if changed:
+                self._save()
+
+_store = SessionStore(SESSIONS_FILE, SESSION_TTL, MAX_SESSIONS)
+
+def create_session(user: Dict) -> Tuple[str, float]:
+    """Issue a token for an authenticated user"""
+    return _store.create(user)
+
+def verify_token(token: str) -> Optional[Dict]:
+    """Resolve a token to its user record"""
+    return _store.get(token)
+
+def end_session(token: str) -> bool:
+    """Revoke a token"""
+    return _store.revoke(token)
+
+def refresh_users(user: Callable[[str], Optional[Dict]]):
+    """Bring the user records of open sessions up to date after accounts change"""
+    _store.refresh_users(user)
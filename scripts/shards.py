@@ -0,0 +1,297 @@
+"""
+Per-student sharding of the JSON data files.
+
+A sharded document keeps each student's data in a file of its own, so adding
+or reading one student's grades or attendance touches only that student's
+file, and teachers writing different students never wait on the same lock.
+Callers name the student with the shard argument of jsonstore.load and
+jsonstore.update; loads without it compose the whole document from the
+top-level file and every shard.
+
+Files for a document stored at data/database.json:
+    data/database.json                   everything not split per student (users,
+                                         the student roster, assignments, ...)
+    data/database.shards/manifest.json   the list of shards
+    data/database.shards/<student>.json  one student's entries, in the same
+                                         shape as the full document
+
+Which collections are split per student is fixed per data file (LAYOUTS).
+School-wide per-subject grade totals are not stored in a sharded document,
+since every grade would rewrite them; loading the whole document sums them
+from the per-student totals.
+
+Convert while nothing else is writing the document.
+
+Usage:
+    python3 scripts/shards.py shard <data file>
+    python3 scripts/shards.py unshard <data file>
+    python3 scripts/shards.py list <data file>
+"""
+
+import json
+import os
+import shutil
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import aggregates
+from jsonstore import (apply_change, change, exists, load_file, locked, read_json, reset_file,
+                       thaw, update as update_document, updated_all, write_file, write_json)
+
+# Per data file: "split" lists the collections whose keys are student IDs,
+# "totals" the aggregates (see aggregates.py) whose "subjects" are derived
+LAYOUTS = {
+    "database.json": {"split": [["grades"], ["attendance"], ["attendanceIndex"], ["aggregates", "students"]], "totals": [["aggregates"]]},
+    "grades.json": {"split": [[]], "totals": []},
+    "grade_totals.json": {"split": [["students"]], "totals": [[]]},
+}
+
+def shard_dir(path: str) -> str:
+    return os.path.splitext(path)[0] + ".shards"
+
+def manifest_path(path: str) -> str:
+    return os.path.join(shard_dir(path), "manifest.json")
+
+def shard_path(path: str, key: str) -> str:
+    return os.path.join(shard_dir(path), quote(key, safe="") + ".json")
+
+def is_sharded(path: str) -> bool:
+    """Whether a document has been split into shards"""
+    return os.path.basename(path) in LAYOUTS and os.path.exists(manifest_path(path))
+
+def _layout(path: str) -> Dict:
+    layout = LAYOUTS.get(os.path.basename(path))
+    if layout is None:
+        raise ValueError(f"{path} has no shard layout")
+    return layout
+
+def _get(data: Any, keys: List) -> Any:
+    for key in keys:
+        if not isinstance(data, dict) or key not in data:
+            return None
+        data = data[key]
+    return data
+
+def _load_shard(path: str, key: str) -> Dict:
+    file = shard_path(path, key)
+    return load_file(file) if exists(file) else {}
+
+def _edit_manifest(path: str, add: List[str] = (), remove: List[str] = ()):
+    with locked(manifest_path(path)):
+        manifest = thaw(read_json(manifest_path(path)))
+        if all(key in manifest["shards"] for key in add) and not any(key in manifest["shards"] for key in remove):
+            return
+        for key in add:
+            manifest["shards"][key] = os.path.basename(shard_path(path, key))
+        for key in remove:
+            manifest["shards"].pop(key, None)
+        write_json(manifest_path(path), manifest)
+
+# Routing changes
+
+def _route(layout: Dict, record: Dict, keys: List[str]) -> List[Tuple[Optional[str], Dict]]:
+    """Where a change of the whole document goes: [(student ID, or None for the top-level file, change)].
+
+    keys are the existing shards, needed when a change replaces a whole
+    collection of per-student entries.
+    """
+    target = record["path"]
+    for prefix in layout["totals"]:
+        if target[:len(prefix) + 1] == prefix + ["subjects"]:
+            return []
+    for prefix in layout["split"]:
+        if len(target) > len(prefix) and target[:len(prefix)] == prefix:
+            return [(target[len(prefix)], record)]
+
+    covered = [prefix for prefix in layout["split"] if prefix[:len(target)] == target]
+    if not covered:
+        return [(None, record)]
+
+    # The change replaces a container of per-student entries: spread it over the shards
+    value = thaw(record["value"]) if record["op"] == "set" else None
+    routed = []
+    for prefix in covered:
+        rest = prefix[len(target):]
+        entries = (_get(value, rest) or {}) if value is not None else {}
+        routed += [(key, change("delete", prefix + [key])) for key in keys if key not in entries]
+        routed += [(key, change("set", prefix + [key], entry)) for key, entry in entries.items()]
+        if value is not None and not rest:
+            value = {}
+        elif isinstance(_get(value, rest[:-1]), dict):
+            _get(value, rest[:-1])[rest[-1]] = {}
+    if value is None:
+        return routed + [(None, record)]
+
+    for prefix in layout["totals"]:
+        node = _get(value, prefix[len(target):]) if prefix[:len(target)] == target else None
+        if isinstance(node, dict):
+            node.pop("subjects", None)
+    return routed + [(None, change("set", target, value))]
+
+def _split(layout: Dict, data: Any) -> Tuple[Dict, Dict[str, Dict]]:
+    """Split a whole document into (top-level document, {student ID: shard})"""
+    data = thaw(data)
+    parts: Dict[str, Dict] = {}
+    for prefix in layout["split"]:
+        container = _get(data, prefix)
+        if not isinstance(container, dict):
+            continue
+        for key, value in container.items():
+            apply_change(parts.setdefault(key, {}), change("set", prefix + [key], value))
+        container.clear()
+    for prefix in layout["totals"]:
+        node = _get(data, prefix)
+        if isinstance(node, dict):
+            node.pop("subjects", None)
+    return data, parts
+
+def _has_entries(layout: Dict, shard: Any, key: str) -> bool:
+    return any(_get(shard, prefix + [key]) is not None for prefix in layout["split"])
+
+def _view(layout: Dict, shard: Any) -> Any:
+    # Collections the student has no entries in yet still exist, as in the whole document
+    return updated_all(shard, [change("set", prefix, {}) for prefix in layout["split"]
+                               if prefix and _get(shard, prefix) is None])
+
+# Engine interface (see jsonstore)
+
+def load(path: str, key: Optional[str] = None) -> Any:
+    """The whole document, or only the entries of student key"""
+    layout = _layout(path)
+    if key is not None:
+        return _view(layout, _load_shard(path, key))
+
+    records = []
+    for key in read_json(manifest_path(path))["shards"]:
+        shard = _load_shard(path, key)
+        for prefix in layout["split"]:
+            value = _get(shard, prefix + [key])
+            if value is not None:
+                records.append(change("set", prefix + [key], value))
+    data = updated_all(load_file(path), records)
+
+    totals = []
+    for prefix in layout["totals"]:
+        node = _get(data, prefix)
+        if isinstance(node, dict):
+            totals.append(change("set", prefix + ["subjects"], aggregates.subject_totals(node.get("students", {}))))
+    return updated_all(data, totals)
+
+def update(path: str, key: str, plan) -> Any:
+    """Run a plan that only touches student key against that student's shard, under its lock"""
+    layout = _layout(path)
+    # Whether the shard had entries before and after the plan, to keep the manifest in step
+    state = {}
+
+    def shard_plan(shard):
+        result, changes = plan(_view(layout, shard))
+        routed = []
+        for record in changes:
+            for target, routed_record in _route(layout, record, [key]):
+                if target != key:
+                    raise ValueError(f"Change outside the shard of {key}: {record['path']}")
+                routed.append(routed_record)
+        state["before"] = _has_entries(layout, shard, key)
+        state["after"] = _has_entries(layout, updated_all(shard, routed), key)
+        return result, routed
+
+    result = update_document(shard_path(path, key), shard_plan, lambda: _load_shard(path, key))
+    if state and state["before"] != state["after"]:
+        _edit_manifest(path, add=[key] if state["after"] else [], remove=[] if state["after"] else [key])
+    return result
+
+def persist(path: str, changes: List[Dict]):
+    """Write changes of the whole document to the files they belong to (the caller holds the top-level lock)"""
+    layout = _layout(path)
+    routed: Dict[Optional[str], List[Dict]] = {}
+    keys = list(read_json(manifest_path(path))["shards"])
+    for record in changes:
+        for key, routed_record in _route(layout, record, keys):
+            routed.setdefault(key, []).append(routed_record)
+
+    top = routed.pop(None, [])
+    if top:
+        write_file(path, updated_all(load_file(path), top), top)
+
+    added, emptied = [], []
+    for key, records in routed.items():
+        file = shard_path(path, key)
+        with locked(file):
+            shard = updated_all(_load_shard(path, key), records)
+            write_file(file, shard, records)
+        (added if _has_entries(layout, shard, key) else emptied).append(key)
+    _edit_manifest(path, add=added, remove=emptied)
+
+def reset(path: str, data: Any):
+    """Replace the whole document (the caller holds the top-level lock)"""
+    top, parts = _split(_layout(path), data)
+    for key in read_json(manifest_path(path))["shards"]:
+        if key not in parts:
+            with locked(shard_path(path, key)):
+                reset_file(shard_path(path, key), {})
+    for key, part in parts.items():
+        with locked(shard_path(path, key)):
+            reset_file(shard_path(path, key), part)
+    write_json(manifest_path(path), {"shards": {key: os.path.basename(shard_path(path, key)) for key in parts}})
+    reset_file(path, top)
+
+# Conversion
+
+def shard(path: str) -> Dict:
+    """Split a document into per-student shards"""
+    layout = _layout(path)
+    with locked(path):
+        if is_sharded(path):
+            raise ValueError(f"{path} is already sharded")
+        if not exists(path):
+            raise ValueError(f"{path} does not exist")
+        top, parts = _split(layout, load_file(path))
+        for key, part in parts.items():
+            with locked(shard_path(path, key)):
+                reset_file(shard_path(path, key), part)
+        # The manifest switches readers over; until the top-level file is
+        # replaced it still holds the same entries as the shards
+        write_json(manifest_path(path), {"shards": {key: os.path.basename(shard_path(path, key)) for key in parts}})
+        reset_file(path, top)
+    return {"shards": len(parts)}
+
+def unshard(path: str) -> Dict:
+    """Fold the shards back into a single document"""
+    with locked(path):
+        if not is_sharded(path):
+            raise ValueError(f"{path} is not sharded")
+        data = thaw(load(path))
+        count = len(read_json(manifest_path(path))["shards"])
+        reset_file(path, data)
+        os.remove(manifest_path(path))
+        shutil.rmtree(shard_dir(path))
+    return {"shards": count}
+
+def list_shards(path: str) -> List[Dict]:
+    """The manifest's shards with their file sizes"""
+    listing = []
+    for key, name in read_json(manifest_path(path))["shards"].items():
+        file = os.path.join(shard_dir(path), name)
+        listing.append({"student": key, "file": file, "bytes": os.path.getsize(file) if os.path.exists(file) else 0})
+    return listing
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ("shard", "unshard", "list"):
+        print(__doc__.strip().split("Usage:")[1].rstrip())
+        sys.exit(1)
+
+    command, target = sys.argv[1], sys.argv[2]
+    try:
+        if command == "shard":
+            print(json.dumps({"success": True, **shard(target)}))
+        elif command == "unshard":
+            print(json.dumps({"success": True, **unshard(target)}))
+        else:
+            if not is_sharded(target):
+                raise ValueError(f"{target} is not sharded")
+            shards = list_shards(target)
+            print(json.dumps({"success": True, "count": len(shards), "shards": shards}))
+    except ValueError as e:
+        print(json.dumps({"success": False, "error": str(e)}))
+        sys.exit(1)
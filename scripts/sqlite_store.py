@@ -0,0 +1,1119 @@
+"""
+SQLite storage engine.
+
+With SCHOOL_STORAGE=sqlite the public functions of database.py, students.py,
+auth.py, assignments.py, attendance.py and gpa.py run indexed queries against
+data/school.db instead of loading and scanning the JSON files: the students,
+grades and accounts through storage.SqliteEngine (see the engine interface
+below), assignments and attendance queries directly. Outputs are the same
+dictionaries the JSON layouts produce.
+
+Usage:
+    python3 scripts/sqlite_store.py migrate     # one-shot import of data/*.json
+"""
+
+import json
+import os
+import sqlite3
+import sys
+from contextlib import contextmanager
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import instrument
+import search
+from subjects import SUBJECTS
+
+# Database file path
+DB_FILE = "data/school.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL,
+    role TEXT NOT NULL,
+    name TEXT NOT NULL,
+    subject TEXT
+);
+
+CREATE TABLE IF NOT EXISTS students (
+    seq INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    name TEXT,
+    surname TEXT,
+    age INTEGER,
+    created_at TEXT,
+    parent_id TEXT
+);
+
+CREATE TABLE IF NOT EXISTS student_subjects (
+    student_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    subject TEXT NOT NULL,
+    PRIMARY KEY (student_id, subject)
+);
+
+CREATE TABLE IF NOT EXISTS grades (
+    seq INTEGER PRIMARY KEY,
+    student_id TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    grade REAL NOT NULL,
+    teacher TEXT,
+    date TEXT,
+    comment TEXT
+);
+CREATE INDEX IF NOT EXISTS grades_by_student ON grades (student_id, subject);
+CREATE INDEX IF NOT EXISTS grades_by_subject ON grades (subject, grade);
+
+-- Running count and sum of grades per student and subject and per subject,
+-- kept up to date by triggers so averages never scan the grades table
+CREATE TABLE IF NOT EXISTS grade_totals (
+    student_id TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    total REAL NOT NULL,
+    PRIMARY KEY (student_id, subject)
+);
+
+CREATE TABLE IF NOT EXISTS subject_totals (
+    subject TEXT PRIMARY KEY,
+    count INTEGER NOT NULL,
+    total REAL NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS grades_count_insert AFTER INSERT ON grades BEGIN
+    INSERT INTO grade_totals (student_id, subject, count, total) VALUES (NEW.student_id, NEW.subject, 1, NEW.grade)
+        ON CONFLICT (student_id, subject) DO UPDATE SET count = count + 1, total = total + NEW.grade;
+    INSERT INTO subject_totals (subject, count, total) VALUES (NEW.subject, 1, NEW.grade)
+        ON CONFLICT (subject) DO UPDATE SET count = count + 1, total = total + NEW.grade;
+END;
+
+CREATE TRIGGER IF NOT EXISTS grades_count_delete AFTER DELETE ON grades BEGIN
+    UPDATE grade_totals SET count = count - 1, total = total - OLD.grade
+        WHERE student_id = OLD.student_id AND subject = OLD.subject;
+    DELETE FROM grade_totals WHERE student_id = OLD.student_id AND subject = OLD.subject AND count <= 0;
+    UPDATE subject_totals SET count = count - 1, total = total - OLD.grade WHERE subject = OLD.subject;
+    DELETE FROM subject_totals WHERE subject = OLD.subject AND count <= 0;
+END;
+
+CREATE TABLE IF NOT EXISTS attendance (
+    seq INTEGER PRIMARY KEY,
+    student_id TEXT NOT NULL,
+    date TEXT,
+    status TEXT,
+    subject TEXT,
+    teacher TEXT,
+    notes TEXT
+);
+CREATE INDEX IF NOT EXISTS attendance_by_student ON attendance (student_id, subject, status);
+CREATE INDEX IF NOT EXISTS attendance_by_date ON attendance (student_id, subject, date);
+CREATE INDEX IF NOT EXISTS attendance_by_student_date ON attendance (student_id, date);
+
+CREATE TABLE IF NOT EXISTS assignments (
+    seq INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    title TEXT,
+    description TEXT,
+    subject TEXT,
+    due_date TEXT,
+    created_by TEXT,
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS assignments_by_subject ON assignments (subject);
+CREATE INDEX IF NOT EXISTS assignments_by_creator ON assignments (created_by);
+CREATE INDEX IF NOT EXISTS assignments_by_due_date ON assignments (due_date, seq);
+
+CREATE TABLE IF NOT EXISTS submissions (
+    seq INTEGER PRIMARY KEY,
+    student_id TEXT NOT NULL,
+    assignment_id TEXT NOT NULL,
+    status TEXT,
+    submitted_at TEXT,
+    grade REAL,
+    feedback TEXT,
+    UNIQUE (student_id, assignment_id)
+);
+CREATE INDEX IF NOT EXISTS submissions_by_assignment ON submissions (assignment_id);
+
+-- The search index (see search.py): a row per term of each student
+CREATE TABLE IF NOT EXISTS student_terms (
+    term TEXT NOT NULL,
+    student_id TEXT NOT NULL,
+    PRIMARY KEY (term, student_id)
+);
+CREATE INDEX IF NOT EXISTS student_terms_by_student ON student_terms (student_id);
+
+-- The change feed: the version of each record's last change, with a new row
+-- (and so a higher version) every time it changes again, written by the
+-- triggers below. The ('*', '*') row marks the last reset (see import_db).
+CREATE TABLE IF NOT EXISTS changes (
+    version INTEGER PRIMARY KEY AUTOINCREMENT,
+    collection TEXT NOT NULL,
+    key TEXT NOT NULL,
+    UNIQUE (collection, key)
+);
+CREATE INDEX IF NOT EXISTS changes_by_collection ON changes (collection, version);
+"""
+
+# Tables whose rows belong to a record of the change feed: (table, collection, key column)
+CHANGE_SOURCES = [
+    ("students", "students", "id"),
+    ("grades", "grades", "student_id"),
+    ("student_subjects", "grades", "student_id"),
+    ("attendance", "attendance", "student_id"),
+    ("assignments", "assignments", "id"),
+    ("submissions", "submissions", "student_id"),
+]
+
+# A delete and a plain insert rather than INSERT OR REPLACE, which would turn
+# into INSERT OR IGNORE under statements such as _add_subject's
+SCHEMA += "".join(f"""
+CREATE TRIGGER IF NOT EXISTS {table}_changes_{event} AFTER {event.upper()} ON {table} BEGIN
+    DELETE FROM changes WHERE collection = '{collection}' AND key = {row}.{column};
+    INSERT INTO changes (collection, key) VALUES ('{collection}', {row}.{column});
+END;
+""" for table, collection, column in CHANGE_SOURCES
+    for event, row in (("insert", "NEW"), ("update", "NEW"), ("delete", "OLD")))
+
+
+_conn: Optional[sqlite3.Connection] = None
+
+class _ProfiledConnection(sqlite3.Connection):
+    """Counts and times statements for instrument (fetching rows counts as compute)"""
+
+    def execute(self, *args):
+        instrument.add("sqlStatements")
+        with instrument.phase("query"):
+            return super().execute(*args)
+
+    def executemany(self, *args):
+        instrument.add("sqlStatements")
+        with instrument.phase("query"):
+            return super().executemany(*args)
+
+    def executescript(self, *args):
+        instrument.add("sqlStatements")
+        with instrument.phase("query"):
+            return super().executescript(*args)
+
+def connect() -> sqlite3.Connection:
+    """Open (once per process) the database, creating the schema if needed"""
+    global _conn
+    if _conn is not None:
+        return _conn
+
+    os.makedirs(os.path.dirname(DB_FILE) or ".", exist_ok=True)
+    # Transactions are managed explicitly by _write
+    factory = _ProfiledConnection if instrument.enabled() else sqlite3.Connection
+    conn = sqlite3.connect(DB_FILE, check_same_thread=False, isolation_level=None, timeout=30, factory=factory)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    counted = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'grade_totals'").fetchone() is not None
+    indexed = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'student_terms'").fetchone() is not None
+    conn.executescript(SCHEMA)
+    if not any(row[1] == "parent_id" for row in conn.execute("PRAGMA table_info(students)")):
+        # Databases created before students had parents
+        conn.execute("ALTER TABLE students ADD COLUMN parent_id TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS students_by_parent ON students (parent_id, seq)")
+    if not counted:
+        # Databases created before the totals tables existed
+        with _write(conn):
+            _rebuild_totals(conn)
+    if not indexed:
+        # Databases created before students could be searched
+        with _write(conn):
+            for (student_id,) in conn.execute("SELECT id FROM students").fetchall():
+                _index_student(conn, student_id)
+
+    if conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0:
+        from auth import teacher_accounts
+        with _write(conn):
+            _insert_users(conn, teacher_accounts())
+
+    _conn = conn
+    return conn
+
+@contextmanager
+def _write(conn: sqlite3.Connection):
+    """Run a write transaction that holds the write lock from its first read.
+
+    Inside transaction() it is a savepoint instead, so a failed write is
+    undone without undoing the others.
+    """
+    if conn.in_transaction:
+        conn.execute("SAVEPOINT write")
+        try:
+            yield
+        except BaseException:
+            conn.execute("ROLLBACK TO write")
+            conn.execute("RELEASE write")
+            raise
+        conn.execute("RELEASE write")
+        return
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+@contextmanager
+def transaction():
+    """Run several writes as one transaction, committed once at the end of the block"""
+    conn = connect()
+    if conn.in_transaction:
+        yield
+        return
+    with _write(conn):
+        yield
+
+def close():
+    """Close the process-wide connection"""
+    global _conn
+    if _conn is not None:
+        _conn.close()
+        _conn = None
+
+# Row conversion
+
+def _user(row) -> Dict:
+    user = {"username": row[0], "password": row[1], "role": row[2], "name": row[3]}
+    if row[4] is not None:
+        user["subject"] = row[4]
+    return user
+
+def _student(row) -> Dict:
+    student = {"id": row[0], "name": row[1], "surname": row[2], "age": row[3], "created_at": row[4]}
+    if row[5] is not None:
+        student["parentId"] = row[5]
+    return student
+
+def _grade(row) -> Dict:
+    entry = {"grade": row[0], "teacher": row[1], "date": row[2]}
+    if row[3] is not None:
+        entry["comment"] = row[3]
+    return entry
+
+def _attendance(row) -> Dict:
+    return {"date": row[0], "status": row[1], "subject": row[2], "teacher": row[3], "notes": row[4]}
+
+def _assignment(row) -> Dict:
+    return {
+        "id": row[0],
+        "title": row[1],
+        "description": row[2],
+        "subject": row[3],
+        "dueDate": row[4],
+        "createdBy": row[5],
+        "createdAt": row[6]
+    }
+
+def _submission(row) -> Dict:
+    return {
+        "assignmentId": row[0],
+        "studentId": row[1],
+        "status": row[2],
+        "submittedAt": row[3],
+        "grade": row[4],
+        "feedback": row[5]
+    }
+
+STUDENT_COLUMNS = "id, name, surname, age, created_at, parent_id"
+GRADE_COLUMNS = "grade, teacher, date, comment"
+ATTENDANCE_COLUMNS = "date, status, subject, teacher, notes"
+ASSIGNMENT_COLUMNS = "id, title, description, subject, due_date, created_by, created_at"
+SUBMISSION_COLUMNS = "assignment_id, student_id, status, submitted_at, grade, feedback"
+
+def _insert_users(conn: sqlite3.Connection, users: Dict):
+    conn.executemany(
+        "INSERT OR REPLACE INTO users (username, password, role, name, subject) VALUES (?, ?, ?, ?, ?)",
+        [(u["username"], u["password"], u["role"], u["name"], u.get("subject")) for u in users.values()]
+    )
+
+# Students
+
+def _put_student(conn: sqlite3.Connection, student: Dict, subjects: List[str]):
+    # Reusing an ID replaces the student and starts their grades over,
+    # as assigning into the JSON dictionaries does
+    _upsert_student(conn, student)
+    conn.execute("DELETE FROM grades WHERE student_id = ?", (student["id"],))
+    _set_subjects(conn, student["id"], subjects)
+
+def _upsert_student(conn: sqlite3.Connection, student: Dict):
+    conn.execute(
+        "INSERT INTO students (id, name, surname, age, created_at, parent_id) VALUES (?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT (id) DO UPDATE SET name = excluded.name, surname = excluded.surname, "
+        "age = excluded.age, created_at = excluded.created_at, parent_id = excluded.parent_id",
+        (student["id"], student["name"], student["surname"], student["age"], student["created_at"],
+         student.get("parentId"))
+    )
+    _index_student(conn, student["id"])
+
+def _index_student(conn: sqlite3.Connection, student_id: str):
+    # Replace the student's rows of student_terms, or remove them with the student
+    conn.execute("DELETE FROM student_terms WHERE student_id = ?", (student_id,))
+    row = conn.execute("SELECT name, surname FROM students WHERE id = ?", (student_id,)).fetchone()
+    if row:
+        conn.executemany("INSERT INTO student_terms (term, student_id) VALUES (?, ?)", [
+            (term, student_id) for term in search.terms(student_id, {"name": row[0], "surname": row[1]})
+        ])
+
+def _set_subjects(conn: sqlite3.Connection, student_id: str, subjects: List[str]):
+    conn.execute("DELETE FROM student_subjects WHERE student_id = ?", (student_id,))
+    conn.executemany(
+        "INSERT INTO student_subjects (student_id, position, subject) VALUES (?, ?, ?)",
+        [(student_id, i, subject) for i, subject in enumerate(subjects)]
+    )
+
+def get_all_students() -> List[Dict]:
+    """Get all students in creation order"""
+    rows = connect().execute(f"SELECT {STUDENT_COLUMNS} FROM students ORDER BY seq")
+    return [_student(row) for row in rows]
+
+def iter_students(sort: Optional[str] = None, after: Optional[List] = None, limit: Optional[int] = None) -> Iterator[Dict]:
+    """Stream students in creation order, or by the sort column then ID.
+
+    after is the [sort value, ID] of the last student already seen; the
+    sort column must be one of STUDENT_COLUMNS (checked by the caller).
+    """
+    conn = connect()
+    where = ""
+    params: List[Any] = []
+    if after is not None:
+        if sort is None:
+            where = " WHERE seq > (SELECT seq FROM students WHERE id = ?)"
+            params.append(after[1])
+        else:
+            where = f" WHERE ({sort}, id) > (?, ?)"
+            params.extend(after)
+    order = f"{sort}, id" if sort else "seq"
+    query = f"SELECT {STUDENT_COLUMNS} FROM students{where} ORDER BY {order}"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    for row in conn.execute(query, params):
+        yield _student(row)
+
+# Grades
+
+def get_student_grades(student_id: str) -> Optional[Dict]:
+    """Get every grade of a student keyed by subject"""
+    conn = connect()
+    subjects = conn.execute(
+        "SELECT subject FROM student_subjects WHERE student_id = ? ORDER BY position", (student_id,)
+    ).fetchall()
+    if not subjects:
+        return None
+
+    grades = {row[0]: [] for row in subjects}
+    rows = conn.execute(
+        f"SELECT subject, {GRADE_COLUMNS} FROM grades WHERE student_id = ? ORDER BY seq", (student_id,)
+    )
+    for row in rows:
+        grades.setdefault(row[0], []).append(_grade(row[1:]))
+    return grades
+
+def _rebuild_totals(conn: sqlite3.Connection):
+    conn.execute("DELETE FROM grade_totals")
+    conn.execute("DELETE FROM subject_totals")
+    conn.execute(
+        "INSERT INTO grade_totals (student_id, subject, count, total) "
+        "SELECT student_id, subject, COUNT(*), SUM(grade) FROM grades GROUP BY student_id, subject"
+    )
+    conn.execute(
+        "INSERT INTO subject_totals (subject, count, total) "
+        "SELECT subject, COUNT(*), SUM(grade) FROM grades GROUP BY subject"
+    )
+
+def export_totals() -> Dict:
+    """The totals tables in the aggregates.py layout"""
+    conn = connect()
+    students = {}
+    for student_id, subject, count, total in conn.execute("SELECT student_id, subject, count, total FROM grade_totals"):
+        students.setdefault(student_id, {})[subject] = {"count": count, "sum": total}
+    subjects = {subject: {"count": count, "sum": total}
+                for subject, count, total in conn.execute("SELECT subject, count, total FROM subject_totals")}
+    return {"students": students, "subjects": subjects}
+
+def rebuild_totals():
+    """Recompute the totals tables from the grades table"""
+    conn = connect()
+    with _write(conn):
+        _rebuild_totals(conn)
+
+def subject_averages(student_id: str) -> Optional[Dict[str, float]]:
+    """Average grade per subject for a student, None if the student is unknown"""
+    conn = connect()
+    if conn.execute("SELECT 1 FROM student_subjects WHERE student_id = ? LIMIT 1", (student_id,)).fetchone() is None:
+        return None
+
+    rows = conn.execute(
+        "SELECT t.subject, t.total / t.count FROM grade_totals t "
+        "LEFT JOIN student_subjects s ON s.student_id = t.student_id AND s.subject = t.subject "
+        "WHERE t.student_id = ? ORDER BY s.position",
+        (student_id,)
+    )
+    return {subject: average for subject, average in rows}
+
+def class_average(subject: str) -> Dict:
+    """Average and count of every grade in a subject"""
+    row = connect().execute("SELECT total / count, count FROM subject_totals WHERE subject = ?", (subject,)).fetchone()
+    if row is None:
+        return {"average": None, "count": 0}
+    return {"average": row[0], "count": row[1]}
+
+# Attendance
+
+def _attendance_filter(student_id: str, subject: Optional[str], start: Optional[str], end: Optional[str]):
+    where = "student_id = ?"
+    params = [student_id]
+    if subject:
+        where += " AND subject = ?"
+        params.append(subject)
+    if start:
+        where += " AND date >= ?"
+        params.append(start)
+    if end:
+        where += " AND date < ?"
+        params.append(end)
+    return where, params
+
+def get_attendance(student_id: str, subject: Optional[str] = None,
+                   start: Optional[str] = None, end: Optional[str] = None) -> List[Dict]:
+    """Get a student's attendance records, optionally for one subject and dates in [start, end)"""
+    where, params = _attendance_filter(student_id, subject, start, end)
+    order = "date, seq" if start or end or subject else "seq"
+    rows = connect().execute(f"SELECT {ATTENDANCE_COLUMNS} FROM attendance WHERE {where} ORDER BY {order}", params)
+    return [_attendance(row) for row in rows]
+
+def attendance_counts(student_id: str, subject: Optional[str] = None,
+                      start: Optional[str] = None, end: Optional[str] = None) -> Dict[str, int]:
+    """Count attendance records per status, optionally for one subject and dates in [start, end)"""
+    where, params = _attendance_filter(student_id, subject, start, end)
+    rows = connect().execute(f"SELECT status, COUNT(*) FROM attendance WHERE {where} GROUP BY status", params)
+    return {status: count for status, count in rows}
+
+# Assignments and submissions
+
+def _put_assignment(conn: sqlite3.Connection, assignment: Dict):
+    # Replacing an assignment keeps its place in creation order
+    conn.execute(
+        f"INSERT INTO assignments ({ASSIGNMENT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT (id) DO UPDATE SET title = excluded.title, description = excluded.description, "
+        "subject = excluded.subject, due_date = excluded.due_date, created_by = excluded.created_by, "
+        "created_at = excluded.created_at",
+        (
+            assignment["id"], assignment["title"], assignment["description"], assignment["subject"],
+            assignment["dueDate"], assignment["createdBy"], assignment["createdAt"]
+        )
+    )
+
+def get_assignments(subject: Optional[str] = None) -> List[Dict]:
+    """Get assignments in creation order, optionally for one subject"""
+    if subject is None:
+        rows = connect().execute(f"SELECT {ASSIGNMENT_COLUMNS} FROM assignments ORDER BY seq")
+    else:
+        rows = connect().execute(
+            f"SELECT {ASSIGNMENT_COLUMNS} FROM assignments WHERE subject = ? ORDER BY seq", (subject,)
+        )
+    return [_assignment(row) for row in rows]
+
+def query_assignments(subject: Optional[str] = None, created_by: Optional[str] = None,
+                      due_from: Optional[str] = None, due_to: Optional[str] = None, by_due_date: bool = False,
+                      limit: Optional[int] = None, after: Optional[str] = None) -> List[Dict]:
+    """Filtered assignments in creation (or due date) order, starting after the assignment with ID after"""
+    conn = connect()
+    where = []
+    params = []
+    for condition, value in (("subject = ?", subject), ("created_by = ?", created_by),
+                             ("due_date >= ?", due_from), ("due_date <= ?", due_to)):
+        if value is not None:
+            where.append(condition)
+            params.append(value)
+
+    if after is not None:
+        cursor = conn.execute("SELECT due_date, seq FROM assignments WHERE id = ?", (after,)).fetchone()
+        if cursor is None:
+            raise ValueError(f"Unknown cursor: {after}")
+        if by_due_date:
+            where.append("(due_date, seq) > (?, ?)")
+            params.extend(cursor)
+        else:
+            where.append("seq > ?")
+            params.append(cursor[1])
+
+    query = f"SELECT {ASSIGNMENT_COLUMNS} FROM assignments"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    query += " ORDER BY due_date, seq" if by_due_date else " ORDER BY seq"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    return [_assignment(row) for row in conn.execute(query, params)]
+
+def _put_submission(conn: sqlite3.Connection, student_id: str, submission: Dict):
+    # Updating a submission keeps its original position
+    conn.execute(
+        f"INSERT INTO submissions ({SUBMISSION_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT (student_id, assignment_id) DO UPDATE SET status = excluded.status, "
+        "submitted_at = excluded.submitted_at, grade = excluded.grade, feedback = excluded.feedback",
+        (
+            submission["assignmentId"], student_id, submission.get("status"), submission.get("submittedAt"),
+            submission.get("grade"), submission.get("feedback", "")
+        )
+    )
+
+def get_assignment_submissions(assignment_id: str) -> List[Dict]:
+    """Get every submission for an assignment"""
+    rows = connect().execute(
+        f"SELECT {SUBMISSION_COLUMNS} FROM submissions WHERE assignment_id = ? ORDER BY seq", (assignment_id,)
+    )
+    return [_submission(row) for row in rows]
+
+def get_assignment(assignment_id: str) -> Optional[Dict]:
+    """Get one assignment"""
+    row = connect().execute(f"SELECT {ASSIGNMENT_COLUMNS} FROM assignments WHERE id = ?", (assignment_id,)).fetchone()
+    return _assignment(row) if row else None
+
+# Engine interface (see storage.SqliteEngine)
+#
+# collections() gives update plans the same read-only view of the store that
+# the JSON engines give them, answering each lookup with an indexed query,
+# and apply_changes() turns the change records the plans return into
+# statements. The grade totals follow from the grades through the triggers.
+
+class _Collection(Mapping):
+    """A read-only collection; records are fetched one query at a time and kept for the view's lifetime"""
+
+    def __init__(self, fetch_one: Callable[[str], Any], fetch_all: Callable[[], Dict], count: Callable[[], int]):
+        self._fetch_one = fetch_one
+        self._fetch_all = fetch_all
+        self._count = count
+        self._records: Dict[str, Any] = {}
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._records:
+            self._records[key] = self._fetch_one(key)
+        if self._records[key] is None:
+            raise KeyError(key)
+        return self._records[key]
+
+    def __contains__(self, key: object) -> bool:
+        return self.get(key) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._fetch_all())
+
+    def __len__(self) -> int:
+        return self._count()
+
+    def keys(self):
+        return self._fetch_all().keys()
+
+    def values(self):
+        return self._fetch_all().values()
+
+    def items(self):
+        return self._fetch_all().items()
+
+class _StudentGrades(Mapping):
+    """One student's grades keyed by subject; a subject's entries are read when first used"""
+
+    def __init__(self, conn: sqlite3.Connection, student_id: str, subjects: List[str]):
+        self._conn = conn
+        self._student_id = student_id
+        self._subjects = subjects
+        self._known = set(subjects)
+        self._entries: Dict[str, List[Dict]] = {}
+
+    def __getitem__(self, subject: str) -> List[Dict]:
+        if subject not in self._known:
+            raise KeyError(subject)
+        if subject not in self._entries:
+            rows = self._conn.execute(
+                f"SELECT {GRADE_COLUMNS} FROM grades WHERE student_id = ? AND subject = ? ORDER BY seq",
+                (self._student_id, subject)
+            )
+            self._entries[subject] = [_grade(row) for row in rows]
+        return self._entries[subject]
+
+    def __contains__(self, subject: object) -> bool:
+        return subject in self._known
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._subjects)
+
+    def __len__(self) -> int:
+        return len(self._subjects)
+
+def _count(conn: sqlite3.Connection, query: str) -> Callable[[], int]:
+    return lambda: conn.execute(query).fetchone()[0]
+
+def _fetch_user(conn: sqlite3.Connection, username: str) -> Optional[Dict]:
+    row = conn.execute(
+        "SELECT username, password, role, name, subject FROM users WHERE username = ?", (username,)
+    ).fetchone()
+    return _user(row) if row else None
+
+def _fetch_student(conn: sqlite3.Connection, student_id: str) -> Optional[Dict]:
+    row = conn.execute(f"SELECT {STUDENT_COLUMNS} FROM students WHERE id = ?", (student_id,)).fetchone()
+    return _student(row) if row else None
+
+def _fetch_grades(conn: sqlite3.Connection, student_id: str) -> Optional[_StudentGrades]:
+    subjects = [row[0] for row in conn.execute(
+        "SELECT subject FROM student_subjects WHERE student_id = ? ORDER BY position", (student_id,)
+    )]
+    return _StudentGrades(conn, student_id, subjects) if subjects else None
+
+def _fetch_children(conn: sqlite3.Connection, parent: str) -> Optional[List[str]]:
+    rows = conn.execute("SELECT id FROM students WHERE parent_id = ? ORDER BY seq", (parent,))
+    return [row[0] for row in rows] or None
+
+def _fetch_term(conn: sqlite3.Connection, term: str) -> Optional[List[str]]:
+    rows = conn.execute("SELECT t.student_id FROM student_terms t JOIN students s ON s.id = t.student_id "
+                        "WHERE t.term = ? ORDER BY s.seq", (term,))
+    return [row[0] for row in rows] or None
+
+def _fetch_attendance(conn: sqlite3.Connection, student_id: str) -> Optional[List[Dict]]:
+    rows = conn.execute(f"SELECT {ATTENDANCE_COLUMNS} FROM attendance WHERE student_id = ? ORDER BY seq", (student_id,))
+    return [_attendance(row) for row in rows] or None
+
+def _fetch_assignment(conn: sqlite3.Connection, assignment_id: str) -> Optional[Dict]:
+    row = conn.execute(f"SELECT {ASSIGNMENT_COLUMNS} FROM assignments WHERE id = ?", (assignment_id,)).fetchone()
+    return _assignment(row) if row else None
+
+def _fetch_submissions(conn: sqlite3.Connection, student_id: str) -> Optional[List[Dict]]:
+    rows = conn.execute(f"SELECT {SUBMISSION_COLUMNS} FROM submissions WHERE student_id = ? ORDER BY seq", (student_id,))
+    return [_submission(row) for row in rows] or None
+
+def collections(conn: sqlite3.Connection) -> Dict[str, Mapping]:
+    """Read-only views of the collections in the database.json layout, read through conn"""
+    return {
+        "users": _Collection(lambda key: _fetch_user(conn, key), export_users,
+                             _count(conn, "SELECT COUNT(*) FROM users")),
+        "students": _Collection(lambda key: _fetch_student(conn, key), export_students,
+                                _count(conn, "SELECT COUNT(*) FROM students")),
+        "grades": _Collection(lambda key: _fetch_grades(conn, key), export_grades,
+                              _count(conn, "SELECT COUNT(DISTINCT s.student_id) FROM student_subjects s "
+                                           "JOIN students st ON st.id = s.student_id")),
+        "attendance": _Collection(lambda key: _fetch_attendance(conn, key), export_attendance,
+                                  _count(conn, "SELECT COUNT(DISTINCT student_id) FROM attendance")),
+        "aggregates": _Collection(lambda key: export_totals().get(key), export_totals, lambda: 2),
+        "parents": _Collection(lambda key: _fetch_children(conn, key), export_parents,
+                               _count(conn, "SELECT COUNT(DISTINCT parent_id) FROM students")),
+        "search": _Collection(lambda key: _fetch_term(conn, key), export_search,
+                              _count(conn, "SELECT COUNT(DISTINCT term) FROM student_terms")),
+        "assignments": _Collection(lambda key: _fetch_assignment(conn, key), export_assignments,
+                                   _count(conn, "SELECT COUNT(*) FROM assignments")),
+        "submissions": _Collection(lambda key: _fetch_submissions(conn, key), export_submissions,
+                                   _count(conn, "SELECT COUNT(DISTINCT student_id) FROM submissions"))
+    }
+
+def _insert_grades(conn: sqlite3.Connection, rows: List[Tuple[str, str, Dict]]):
+    # rows are (student ID, subject, entry); subjects new to a student are added after their others
+    for student_id, subject in dict.fromkeys((student_id, subject) for student_id, subject, _ in rows):
+        _add_subject(conn, student_id, subject)
+    conn.executemany(
+        "INSERT INTO grades (student_id, subject, grade, teacher, date, comment) VALUES (?, ?, ?, ?, ?, ?)",
+        [(student_id, subject, e["grade"], e.get("teacher"), e.get("date"), e.get("comment"))
+         for student_id, subject, e in rows]
+    )
+
+def _add_subject(conn: sqlite3.Connection, student_id: str, subject: str):
+    conn.execute(
+        "INSERT OR IGNORE INTO student_subjects (student_id, position, subject) "
+        "SELECT ?, COALESCE(MAX(position) + 1, 0), ? FROM student_subjects WHERE student_id = ?",
+        (student_id, subject, student_id)
+    )
+
+def _change_user(conn: sqlite3.Connection, op: str, path: List, value: Any) -> bool:
+    if len(path) == 1 and op == "set":
+        _insert_users(conn, {path[0]: value})
+    elif len(path) == 1 and op == "delete":
+        conn.execute("DELETE FROM users WHERE username = ?", (path[0],))
+    elif len(path) == 2 and op == "set" and path[1] in ("password", "role", "name", "subject"):
+        conn.execute(f"UPDATE users SET {path[1]} = ? WHERE username = ?", (value, path[0]))
+    else:
+        return False
+    return True
+
+def _change_student(conn: sqlite3.Connection, op: str, path: List, value: Any) -> bool:
+    if len(path) == 1 and op == "set":
+        _upsert_student(conn, value)
+    elif len(path) == 1 and op == "delete":
+        conn.execute("DELETE FROM students WHERE id = ?", (path[0],))
+        _index_student(conn, path[0])
+    elif len(path) == 2 and op == "set" and path[1] in ("name", "surname", "age", "created_at", "parentId"):
+        column = "parent_id" if path[1] == "parentId" else path[1]
+        conn.execute(f"UPDATE students SET {column} = ? WHERE id = ?", (value, path[0]))
+        if path[1] in ("name", "surname"):
+            _index_student(conn, path[0])
+    else:
+        return False
+    return True
+
+def _change_grades(conn: sqlite3.Connection, op: str, path: List, value: Any) -> bool:
+    if len(path) == 1 and op in ("set", "delete"):
+        conn.execute("DELETE FROM grades WHERE student_id = ?", (path[0],))
+        _set_subjects(conn, path[0], list(value) if op == "set" else [])
+        if op == "set":
+            _insert_grades(conn, [(path[0], subject, e) for subject, entries in value.items() for e in entries])
+    elif len(path) == 2 and op in ("set", "delete"):
+        conn.execute("DELETE FROM grades WHERE student_id = ? AND subject = ?", tuple(path))
+        if op == "set":
+            _add_subject(conn, *path)
+            _insert_grades(conn, [(path[0], path[1], e) for e in value])
+        else:
+            conn.execute("DELETE FROM student_subjects WHERE student_id = ? AND subject = ?", tuple(path))
+    else:
+        return False
+    return True
+
+def _change_attendance(conn: sqlite3.Connection, op: str, path: List, value: Any) -> bool:
+    if len(path) != 1:
+        return False
+    if op in ("set", "delete"):
+        conn.execute("DELETE FROM attendance WHERE student_id = ?", (path[0],))
+    records = value if op == "set" else [value] if op == "append" else []
+    conn.executemany(
+        "INSERT INTO attendance (student_id, date, status, subject, teacher, notes) VALUES (?, ?, ?, ?, ?, ?)",
+        [(path[0], r.get("date"), r.get("status"), r.get("subject"), r.get("teacher"), r.get("notes", ""))
+         for r in records]
+    )
+    return True
+
+def _change_assignment(conn: sqlite3.Connection, op: str, path: List, value: Any) -> bool:
+    if len(path) == 1 and op == "set":
+        _put_assignment(conn, value)
+    elif len(path) == 1 and op == "delete":
+        conn.execute("DELETE FROM assignments WHERE id = ?", (path[0],))
+    else:
+        return False
+    return True
+
+def _change_submissions(conn: sqlite3.Connection, op: str, path: List, value: Any) -> bool:
+    # Rows are keyed by student and assignment rather than by position, so
+    # setting the submission at a position updates the one for its assignment
+    if len(path) == 1 and op in ("set", "delete"):
+        conn.execute("DELETE FROM submissions WHERE student_id = ?", (path[0],))
+        submissions = value if op == "set" else []
+    elif (len(path) == 1 and op == "append") or (len(path) == 2 and op == "set"):
+        submissions = [value]
+    else:
+        return False
+    for submission in submissions:
+        _put_submission(conn, path[0], submission)
+    return True
+
+_CHANGES = {
+    "users": _change_user,
+    "students": _change_student,
+    "grades": _change_grades,
+    "attendance": _change_attendance,
+    "assignments": _change_assignment,
+    "submissions": _change_submissions
+}
+
+def apply_changes(conn: sqlite3.Connection, records: List[Dict]):
+    """Carry out storage change records (paths start with the collection); the caller holds a write transaction"""
+    appends = []
+    for record in records + [None]:
+        # Runs of grade appends (a bulk import) go in with one executemany
+        if record is not None and record["op"] == "append" and record["path"][0] == "grades" \
+                and len(record["path"]) == 3:
+            appends.append((record["path"][1], record["path"][2], record["value"]))
+            continue
+        if appends:
+            _insert_grades(conn, appends)
+            appends = []
+        if record is None or record["path"][0] in ("aggregates", "parents", "search"):
+            # Kept by the triggers, the students_by_parent index and _index_student
+            continue
+        handler = _CHANGES.get(record["path"][0])
+        if handler is None or not handler(conn, record["op"], record["path"][1:], record.get("value")):
+            raise ValueError(f"Unsupported change for {DB_FILE}: {record['op']} {record['path']}")
+
+def run_plan(plan: Callable[[Dict], Tuple[Any, List[Dict]]]) -> Any:
+    """Run plan(collections) -> (result, changes) and apply the changes, in one write transaction"""
+    conn = connect()
+    with _write(conn):
+        result, changes = plan(collections(conn))
+        apply_changes(conn, list(changes))
+    return result
+
+# Whole-document views, for callers that still work on the JSON layouts
+
+def export_users() -> Dict:
+    """Users keyed by username, as in users.json"""
+    rows = connect().execute("SELECT username, password, role, name, subject FROM users ORDER BY rowid")
+    return {row[0]: _user(row) for row in rows}
+
+def export_students() -> Dict:
+    """Students keyed by ID, as in students.json"""
+    return {student["id"]: student for student in get_all_students()}
+
+def export_grades() -> Dict:
+    """Grades keyed by student and subject, as in grades.json"""
+    conn = connect()
+    grades = {}
+    for student_id, subject in conn.execute(
+        "SELECT s.student_id, s.subject FROM student_subjects s "
+        "JOIN students st ON st.id = s.student_id ORDER BY st.seq, s.position"
+    ):
+        grades.setdefault(student_id, {})[subject] = []
+    for row in conn.execute(f"SELECT student_id, subject, {GRADE_COLUMNS} FROM grades ORDER BY seq"):
+        grades.setdefault(row[0], {}).setdefault(row[1], []).append(_grade(row[2:]))
+    return grades
+
+def export_attendance() -> Dict:
+    """Attendance records keyed by student, as in database.json"""
+    attendance = {}
+    for row in connect().execute(f"SELECT student_id, {ATTENDANCE_COLUMNS} FROM attendance ORDER BY seq"):
+        attendance.setdefault(row[0], []).append(_attendance(row[1:]))
+    return attendance
+
+def changed_since(version: Optional[int]) -> Tuple[int, Optional[List[Tuple[str, str]]]]:
+    """(current version, [(collection, key)] changed after version, oldest first); see storage.Engine.changed_since"""
+    conn = connect()
+    current = conn.execute("SELECT COALESCE(MAX(version), 0) FROM changes").fetchone()[0]
+    base = conn.execute("SELECT version FROM changes WHERE collection = '*'").fetchone()
+    if version is None or not (base[0] if base else 0) <= version <= current:
+        return current, None
+    rows = conn.execute(
+        "SELECT collection, key FROM changes WHERE version > ? AND collection != '*' ORDER BY version", (version,)
+    )
+    return current, [(collection, key) for collection, key in rows]
+
+def export_assignments() -> Dict:
+    """Assignments keyed by ID, as in database.json"""
+    return {a["id"]: a for a in get_assignments()}
+
+def export_submissions() -> Dict:
+    """Submissions keyed by student, as in database.json"""
+    submissions = {}
+    for row in connect().execute(f"SELECT {SUBMISSION_COLUMNS} FROM submissions ORDER BY seq"):
+        submissions.setdefault(row[1], []).append(_submission(row))
+    return submissions
+
+def export_parents() -> Dict:
+    """Student IDs keyed by parent username (see storage.build_parents)"""
+    parents = {}
+    for parent, student_id in connect().execute(
+        "SELECT parent_id, id FROM students WHERE parent_id IS NOT NULL ORDER BY seq"
+    ):
+        parents.setdefault(parent, []).append(student_id)
+    return parents
+
+def export_search() -> Dict:
+    """Student IDs keyed by search term (see storage.build_search)"""
+    index = {}
+    for term, student_id in connect().execute(
+        "SELECT t.term, t.student_id FROM student_terms t JOIN students s ON s.id = t.student_id ORDER BY t.term, s.seq"
+    ):
+        index.setdefault(term, []).append(student_id)
+    return index
+
+def students_version() -> int:
+    """Version (see changed_since) of the last change to the students, or of the last reset"""
+    return connect().execute(
+        "SELECT MAX(COALESCE((SELECT MAX(version) FROM changes WHERE collection = 'students'), 0), "
+        "COALESCE((SELECT MAX(version) FROM changes WHERE collection = '*'), 0))"
+    ).fetchone()[0]
+
+def export_collection(collection: str) -> Dict:
+    """One collection of the database.json layout (see storage.py)"""
+    exports = {
+        "users": export_users,
+        "students": export_students,
+        "grades": export_grades,
+        "attendance": export_attendance,
+        "aggregates": export_totals,
+        "parents": export_parents,
+        "search": export_search,
+        "assignments": export_assignments,
+        "submissions": export_submissions
+    }
+    if collection not in exports:
+        raise ValueError(f"Unknown collection: {collection}")
+    return exports[collection]()
+
+def export_db() -> Dict:
+    """The whole store in the database.json layout"""
+    return {
+        "users": export_users(),
+        "students": export_students(),
+        "grades": export_grades(),
+        "attendance": export_attendance(),
+        "assignments": export_assignments(),
+        "submissions": export_submissions()
+    }
+
+def import_db(db: Dict):
+    """Replace the whole store with a database.json-layout dictionary, in one transaction"""
+    conn = connect()
+    with _write(conn):
+        for table in ("users", "students", "student_terms", "student_subjects", "grades", "grade_totals",
+                      "subject_totals", "attendance", "assignments", "submissions", "changes"):
+            conn.execute(f"DELETE FROM {table}")
+        # Clients synced before now need everything (see changed_since)
+        conn.execute("INSERT INTO changes (collection, key) VALUES ('*', '*')")
+        _import(conn, db)
+
+def _reset_students(conn: sqlite3.Connection, students: Dict):
+    conn.execute("DELETE FROM student_terms")
+    conn.execute("DELETE FROM students")
+    for student in students.values():
+        _upsert_student(conn, student)
+        if not conn.execute("SELECT 1 FROM student_subjects WHERE student_id = ?", (student["id"],)).fetchone():
+            _set_subjects(conn, student["id"], SUBJECTS)
+    # The grades of the students no longer there go with them
+    conn.execute("DELETE FROM grades WHERE student_id NOT IN (SELECT id FROM students)")
+    conn.execute("DELETE FROM student_subjects WHERE student_id NOT IN (SELECT id FROM students)")
+
+def _reset_grades(conn: sqlite3.Connection, grades: Dict):
+    # Only the students' grades are kept, as export_grades lists no others
+    conn.execute("DELETE FROM grades")
+    conn.execute("DELETE FROM student_subjects")
+    for (student_id,) in conn.execute("SELECT id FROM students ORDER BY seq").fetchall():
+        student_grades = grades.get(student_id, {})
+        _set_subjects(conn, student_id, list(student_grades) or SUBJECTS)
+        _insert_grades(conn, [(student_id, subject, e) for subject, entries in student_grades.items() for e in entries])
+
+def _reset_table(table: str) -> Callable[[sqlite3.Connection, Dict], None]:
+    def reset(conn: sqlite3.Connection, data: Dict):
+        conn.execute(f"DELETE FROM {table}")
+        _import(conn, {table: data})
+    return reset
+
+_RESETS = {
+    "users": _reset_table("users"),
+    "students": _reset_students,
+    "grades": _reset_grades,
+    "attendance": _reset_table("attendance"),
+    "assignments": _reset_table("assignments"),
+    "submissions": _reset_table("submissions")
+}
+
+def reset_collection(collection: str, data: Dict):
+    """Replace one collection of the database.json layout, leaving the others, in one transaction"""
+    if collection not in _RESETS:
+        raise ValueError(f"Unknown collection: {collection}")
+    conn = connect()
+    with _write(conn):
+        _RESETS[collection](conn, data)
+        if collection != "users":
+            # As for import_db: the feed's clients start over
+            conn.execute("DELETE FROM changes")
+            conn.execute("INSERT INTO changes (collection, key) VALUES ('*', '*')")
+
+def _import(conn: sqlite3.Connection, db: Dict) -> Dict[str, int]:
+    """Insert a database.json-layout dictionary, skipping rows that already exist.
+
+    Runs as a savepoint of the caller's transaction if there is one.
+    """
+    counts = {"users": 0, "students": 0, "grades": 0, "attendance": 0, "assignments": 0, "submissions": 0}
+
+    with _write(conn):
+        for user in db.get("users", {}).values():
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO users (username, password, role, name, subject) VALUES (?, ?, ?, ?, ?)",
+                (user["username"], user["password"], user["role"], user["name"], user.get("subject"))
+            )
+            counts["users"] += cursor.rowcount
+
+        grades = db.get("grades", {})
+        for student in db.get("students", {}).values():
+            if conn.execute("SELECT 1 FROM students WHERE id = ?", (student["id"],)).fetchone():
+                continue
+            student_grades = grades.get(student["id"], {})
+            _put_student(conn, student, list(student_grades) or SUBJECTS)
+            counts["students"] += 1
+
+            for subject, entries in student_grades.items():
+                conn.executemany(
+                    "INSERT INTO grades (student_id, subject, grade, teacher, date, comment) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(student["id"], subject, e["grade"], e.get("teacher"), e.get("date"), e.get("comment")) for e in entries]
+                )
+                counts["grades"] += len(entries)
+
+        for student_id, records in db.get("attendance", {}).items():
+            conn.executemany(
+                "INSERT INTO attendance (student_id, date, status, subject, teacher, notes) VALUES (?, ?, ?, ?, ?, ?)",
+                [(student_id, r.get("date"), r.get("status"), r.get("subject"), r.get("teacher"), r.get("notes", "")) for r in records]
+            )
+            counts["attendance"] += len(records)
+
+        for a in db.get("assignments", {}).values():
+            cursor = conn.execute(
+                f"INSERT OR IGNORE INTO assignments ({ASSIGNMENT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (a["id"], a.get("title"), a.get("description"), a.get("subject"), a.get("dueDate"), a.get("createdBy"), a.get("createdAt"))
+            )
+            counts["assignments"] += cursor.rowcount
+
+        for student_id, entries in db.get("submissions", {}).items():
+            for s in entries:
+                cursor = conn.execute(
+                    f"INSERT OR IGNORE INTO submissions ({SUBMISSION_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)",
+                    (s["assignmentId"], student_id, s.get("status"), s.get("submittedAt"), s.get("grade"), s.get("feedback", ""))
+                )
+                counts["submissions"] += cursor.rowcount
+
+    return counts
+
+def migrate(data_dir: str = "data") -> Dict:
+    """Import database.json and the students.json/grades.json/users.json layout.
+
+    Meant to run once against a new database. database.json is imported
+    first; students from the split layout whose ID is already taken are
+    skipped along with their grades, and their IDs reported.
+    """
+    conn = connect()
+    if conn.execute("SELECT COUNT(*) FROM students").fetchone()[0] > 0:
+        raise ValueError(f"{DB_FILE} already contains students")
+
+    # Start from the migrated accounts rather than the seeded defaults
+    with _write(conn):
+        conn.execute("DELETE FROM users")
+
+    def read(name: str) -> Dict:
+        path = os.path.join(data_dir, name)
+        if not os.path.exists(path):
+            return {}
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    combined = read("database.json")
+    imported = _import(conn, combined)
+
+    split = {
+        "users": read("users.json"),
+        "students": read("students.json"),
+        "grades": read("grades.json")
+    }
+    skipped = [student["id"] for student in split["students"].values()
+               if conn.execute("SELECT 1 FROM students WHERE id = ?", (student["id"],)).fetchone()]
+    split_counts = _import(conn, split)
+
+    for key, value in split_counts.items():
+        imported[key] += value
+
+    if conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0:
+        from auth import teacher_accounts
+        with _write(conn):
+            _insert_users(conn, teacher_accounts())
+
+    return {"imported": imported, "skippedStudents": skipped}
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        print("Usage: python sqlite_store.py migrate [data dir]")
+        sys.exit(1)
+
+    try:
+        result = migrate(sys.argv[2] if len(sys.argv) > 2 else "data")
+        print(json.dumps({"success": True, **result}))
+    except Exception as e:
+        print(json.dumps({"success": False, "error": str(e)}))
+        sys.exit(1)
@@ -0,0 +1,1277 @@
+"""
+Storage engines: the school's data as collections of keyed records.
+
+The business logic in students.py, auth.py, database.py, assignments.py,
+attendance.py and gpa.py reads and writes through an Engine instead of touching data files, so one implementation of
+"create a student" or "add a grade" serves every layout, and a new way of
+storing the data only has to implement the few methods below. The
+collections are those of database.json:
+
+    users       username -> account
+    students    student ID -> student
+    grades      student ID -> {subject: [grade entries]}
+    attendance  student ID -> [attendance records]
+    assignments assignment ID -> assignment
+    submissions student ID -> [submissions]
+    aggregates  running grade totals (see aggregates.py)
+    parents     parent username -> [IDs of the students whose parentId it is]
+    search      word of a student's name or ID -> [IDs of the students having it]
+    attendanceIndex  student ID -> their attendance records in date order
+    assignmentIndex  assignment IDs per subject, creator and due date
+    submissionIndex  assignment ID -> {student ID: position of the submission}
+
+The last six are indexes (DERIVED) the engines maintain from the changes to
+the other collections; they are read-only to callers.
+
+Reads:
+    engine.get("students", "student_1")           one record, or None
+    engine.changes(since=41)                      records changed after version 41
+    engine.scan("students", sort="age", limit=20) (key, record) pairs
+    engine.view(["students", "grades"])           several collections, read together
+Writes:
+    engine.put("users", "ann", user)
+    engine.append("attendance", ["student_1"], record)
+    engine.update(plan, ["students"])
+
+update runs plan(view) -> (result, changes) atomically and returns result.
+The view maps collection names to their (read-only) contents and the changes
+are jsonstore change records whose path starts with the collection:
+
+    change("set", ["students", "student_1"], student)
+
+Engines:
+    DocumentEngine  every collection in one JSON document (data/database.json)
+    FilesEngine     a JSON document per collection (data/students.json, ...)
+    SqliteEngine    tables in data/school.db (see sqlite_store.py)
+
+The JSON engines run on any jsonstore storage (plain JSON, write-ahead log,
+per-student shards, columnar grades). SCHOOL_STORAGE=sqlite replaces them
+with SqliteEngine, and SCHOOL_STORAGE=<module>:<class> with any other Engine
+subclass, constructed without arguments.
+"""
+
+import bisect
+import fcntl
+import importlib
+import itertools
+import heapq
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import aggregates
+import jsonstore
+import search
+from jsonstore import (COLUMNAR_SUFFIX, STORAGE_ENGINE, after_commit, before_commit, change, exists, load,
+                       replace_file, reset, temp_file, transaction_scope, update, updated_all)
+
+# Collections keyed by student whose records can be read and written one
+# student at a time (see the shard arguments below)
+PER_STUDENT = ("grades", "attendance")
+
+# Collections reported by the change feed (see Engine.changes)
+FEED = ("students", "grades", "attendance", "assignments", "submissions")
+
+Plan = Callable[[Dict[str, Any]], Tuple[Any, List[Dict]]]
+
+class Engine:
+    """Interface of a storage engine.
+
+    Subclasses implement view, update, reset and export; the rest have
+    generic implementations in terms of those, which engines with indexes
+    of their own can replace.
+    """
+
+    def view(self, collections: List[str], shard: Optional[str] = None) -> Dict[str, Any]:
+        """Read-only contents of the collections, read together.
+
+        shard names a student when only their records of the PER_STUDENT
+        collections are needed; engines may then leave the others out.
+        """
+        raise NotImplementedError
+
+    def update(self, plan: Plan, collections: Optional[List[str]] = None, shard: Optional[str] = None) -> Any:
+        """Run plan(view) -> (result, changes) atomically and apply the changes; returns the result.
+
+        collections are those the plan reads (None: all of them). It may
+        also change others without reading them; engines keeping
+        collections apart may apply those changes after the rest. shard
+        names the student when the plan only touches their records of the
+        PER_STUDENT collections.
+        """
+        raise NotImplementedError
+
+    def reset(self, collection: str, data: Dict):
+        """Replace a whole collection"""
+        raise NotImplementedError
+
+    def export(self, shard: Optional[str] = None) -> Dict:
+        """Every collection, in the database.json layout"""
+        raise NotImplementedError
+
+    def reset_all(self, data: Dict):
+        """Replace every collection given in data"""
+        for collection, contents in data.items():
+            self.reset(collection, contents)
+
+    def load(self, collection: str, shard: Optional[str] = None) -> Dict:
+        """A whole collection (read-only)"""
+        return self.view([collection], shard).get(collection, {})
+
+    def get(self, collection: str, key: str) -> Any:
+        """One record, or None"""
+        return self.load(collection, _shard(collection, key)).get(key)
+
+    def count(self, collection: str) -> int:
+        """Number of records in a collection"""
+        return len(self.load(collection))
+
+    def scan(self, collection: str, sort: Optional[str] = None, after: Optional[List] = None,
+             limit: Optional[int] = None) -> Iterator[Tuple[str, Any]]:
+        """Yield (key, record) pairs in insertion order, or by the record field sort, then key.
+
+        after is the [sort value, key] of the last record already seen
+        (KeyError if it names an unknown key in insertion order). Only the
+        yielded records are materialised: insertion order walks the
+        collection, and a sorted page keeps just the smallest limit
+        candidates.
+        """
+        records = self.load(collection)
+
+        if sort is None:
+            rows = iter(records.items())
+            if after is not None:
+                if after[1] not in records:
+                    raise KeyError(after[1])
+                for key, _ in rows:
+                    if key == after[1]:
+                        break
+            yield from itertools.islice(rows, limit)
+            return
+
+        def order(item: Tuple[str, Any]) -> Tuple:
+            return (item[1].get(sort), item[0])
+
+        rows = iter(records.items())
+        if after is not None:
+            rows = (item for item in rows if order(item) > tuple(after))
+        if limit is None:
+            yield from sorted(rows, key=order)
+        else:
+            yield from heapq.nsmallest(limit, rows, key=order)
+
+    def get_many(self, collection: str, keys: List[str]) -> Dict[str, Any]:
+        """Records of several keys, leaving out missing ones"""
+        records = {}
+        for key in keys:
+            record = self.get(collection, key)
+            if record is not None:
+                records[key] = record
+        return records
+
+    def put(self, collection: str, key: str, value: Any):
+        """Insert or replace a record"""
+        self.update(lambda view: (None, [change("set", [collection, key], value)]), [], _shard(collection, key))
+
+    def delete(self, collection: str, key: str) -> bool:
+        """Remove a record; False if there was none"""
+        def plan(view):
+            if key not in view[collection]:
+                return False, []
+            return True, [change("delete", [collection, key])]
+
+        return self.update(plan, [collection], _shard(collection, key))
+
+    def append(self, collection: str, path: List, value: Any):
+        """Append to the list at path within a collection, creating it if needed"""
+        self.update(lambda view: (None, [change("append", [collection] + path, value)]), [],
+                    _shard(collection, path[0]))
+
+    def subject_average(self, subject: str) -> Tuple[Optional[float], int]:
+        """(average, count) of every grade in a subject"""
+        return aggregates.average(self.load("aggregates").get("subjects", {}).get(subject))
+
+    def feed(self) -> List[str]:
+        """The FEED collections the engine holds"""
+        return list(FEED)
+
+    def changed_since(self, version: Optional[int]) -> Tuple[int, Optional[List[Tuple[str, str]]]]:
+        """(current version, [(collection, key)] of the FEED records changed after version, oldest first).
+
+        The list is None when version is None or the log does not cover it
+        (it predates the last reset, or is not a version of this store).
+        """
+        raise NotImplementedError
+
+    def changes(self, since: Optional[int] = None) -> Dict:
+        """The FEED records changed after version since, for clients syncing incrementally.
+
+        Returns {"version": ..., "full": False, "changes": {collection: {key:
+        record, or None if deleted}}}. When the changes since cannot be told
+        (see changed_since), "full" is True and "changes" holds the FEED
+        collections whole. Records are read after the version, so they may
+        already include later changes; those are listed again next time.
+        """
+        version, changed = self.changed_since(since)
+        if changed is None:
+            return {"version": version, "full": True, "changes": {c: self.load(c) for c in self.feed()}}
+
+        keys: Dict[str, List[str]] = {}
+        for collection, key in changed:
+            keys.setdefault(collection, []).append(key)
+        result = {}
+        for collection, collection_keys in keys.items():
+            records = self.get_many(collection, collection_keys)
+            result[collection] = {key: records.get(key) for key in collection_keys}
+        return {"version": version, "full": False, "changes": result}
+
+    def subject_averages(self, student_id: str) -> Optional[Dict[str, float]]:
+        """Average grade per subject of a student, leaving out subjects without grades; None if unknown"""
+        view = self.view(["grades", "aggregates"], student_id)
+        student_grades = view["grades"].get(student_id)
+        if student_grades is None:
+            return None
+        pairs = view["aggregates"].get("students", {}).get(student_id, {})
+        return {subject: aggregates.average(pairs[subject])[0] for subject in student_grades if subject in pairs}
+
+    def attendance(self, student_id: str, subject: Optional[str] = None, start: Optional[str] = None,
+                   end: Optional[str] = None) -> List[Dict]:
+        """A student's attendance records, optionally for one subject and dates in [start, end).
+
+        Filtered records come in date order, found through the date index.
+        """
+        view = self.view(["attendance"], student_id)
+        records = view.get("attendance", {}).get(student_id, [])
+        if not (subject or start or end):
+            return list(records)
+        entry = _student_dates(view, student_id, records).get(subject or "*")
+        if entry is None:
+            return []
+        lo, hi = _date_slice(entry, records, start, end)
+        return [records[position] for position in entry["positions"][lo:hi]]
+
+    def attendance_counts(self, student_id: str, subject: Optional[str] = None, start: Optional[str] = None,
+                          end: Optional[str] = None) -> Dict[str, int]:
+        """A student's number of attendance records per status, optionally for one subject and dates in [start, end)"""
+        view = self.view(["attendance"], student_id)
+        records = view.get("attendance", {}).get(student_id)
+        entry = None if records is None else _student_dates(view, student_id, records).get(subject or "*")
+        if entry is None:
+            return {}
+        lo, hi = _date_slice(entry, records, start, end)
+        return {status: counts[hi] - counts[lo] for status, counts in entry["counts"].items()}
+
+    def query_assignments(self, subject: Optional[str] = None, created_by: Optional[str] = None,
+                          due_from: Optional[str] = None, due_to: Optional[str] = None, by_due_date: bool = False,
+                          limit: Optional[int] = None, after: Optional[str] = None) -> List[Dict]:
+        """Up to limit filtered assignments in creation (or due date) order, starting after the assignment with ID after.
+
+        ValueError if after is not an assignment. The assignment index keeps
+        filtered listings to the assignments they return.
+        """
+        view = self.view(["assignments", "assignmentIndex"])
+        assignments = view.get("assignments", {})
+        index = view.get("assignmentIndex")
+        if index is None or "position" not in index:
+            # Written before the index (or its creation order) existed
+            index = build_assignment_index(assignments)
+        position = index["position"]
+
+        # Start from the smallest index list that applies
+        candidates = None
+        for field, value in (("subject", subject), ("createdBy", created_by)):
+            if value is not None:
+                ids = index[field].get(value, [])
+                if candidates is None or len(ids) < len(candidates):
+                    candidates = ids
+
+        if by_due_date and candidates is None:
+            dates = sorted(index["dueDate"])
+            lo = bisect.bisect_left(dates, due_from) if due_from is not None else 0
+            hi = bisect.bisect_right(dates, due_to) if due_to is not None else len(dates)
+            candidates = [i for date in dates[lo:hi] for i in index["dueDate"][date]]
+        elif by_due_date:
+            candidates = sorted(candidates, key=lambda i: assignments[i]["dueDate"])
+
+        if candidates is None:
+            candidates = list(assignments)
+
+        def wanted(a: Dict) -> bool:
+            return ((subject is None or a["subject"] == subject)
+                    and (created_by is None or a["createdBy"] == created_by)
+                    and (due_from is None or a["dueDate"] >= due_from)
+                    and (due_to is None or a["dueDate"] <= due_to))
+
+        # The candidates are in creation or (due date, creation) order, so
+        # the page after the cursor starts where its key would go
+        if by_due_date:
+            def key(assignment_id: str) -> Tuple:
+                return assignments[assignment_id]["dueDate"], position[assignment_id]
+        else:
+            key = position.__getitem__
+
+        start = 0
+        if after is not None:
+            if after not in position:
+                raise ValueError(f"Unknown cursor: {after}")
+            start = bisect_after(candidates, key(after), key)
+
+        page = []
+        for assignment_id in candidates[start:]:
+            if limit is not None and len(page) >= limit:
+                break
+            if wanted(assignments[assignment_id]):
+                page.append(assignments[assignment_id])
+        return page
+
+    def assignment_submissions(self, assignment_id: str) -> Tuple[Optional[Dict], List[Dict]]:
+        """An assignment (None if unknown) and every submission for it, found through the submission index"""
+        view = self.view(["assignments", "submissions", "submissionIndex"])
+        index = view.get("submissionIndex")
+        if index is None:
+            index = build_submission_index(view.get("submissions", {}))
+        submissions = [view["submissions"][student_id][position]
+                       for student_id, position in index.get(assignment_id, {}).items()]
+        return view.get("assignments", {}).get(assignment_id), submissions
+
+    def check_aggregates(self, rebuild: bool = False) -> List:
+        """Mismatches (see aggregates.compare) between the stored grade aggregates and ones built from the grades.
+
+        With rebuild the stored aggregates are replaced by the built ones.
+        """
+        def plan(view):
+            rebuilt = aggregates.build(view["grades"])
+            mismatches = aggregates.compare(view.get("aggregates"), rebuilt)
+            if rebuild and (mismatches or view.get("aggregates") is None):
+                return mismatches, [change("set", ["aggregates"], rebuilt)]
+            return mismatches, []
+
+        return self.update(plan, ["grades", "aggregates"])
+
+    # (the search collection, the Index over it) of the last search_index call
+    _search: Optional[Tuple[Any, search.Index]] = None
+
+    def search_index(self) -> search.Index:
+        """An Index over the search collection, reused while the collection loads as the same object.
+
+        With jsonstore's cache (the backend server) an unchanged document
+        does, so the terms are only sorted again after the students change.
+        """
+        postings = self.load("search")
+        if self._search is None or self._search[0] is not postings:
+            self._search = (postings, search.Index(postings))
+        return self._search[1]
+
+def _shard(collection: str, key: str) -> Optional[str]:
+    return key if collection in PER_STUDENT else None
+
+def _relative(records: List[Dict]) -> List[Dict]:
+    """Change records with the collection dropped from their paths"""
+    return [{**record, "path": record["path"][1:]} for record in records]
+
+def aggregate_changes(view: Dict[str, Any], changes: List[Dict]) -> List[Dict]:
+    """Changes that keep the aggregates in line with the grade changes among changes.
+
+    view holds the grades and aggregates the changes were planned against;
+    without stored aggregates (files written before they existed) they are
+    built from the changed grades.
+    """
+    records = _relative([record for record in changes if record["path"][0] == "grades"])
+    if not records:
+        return []
+
+    grades = view.get("grades", {})
+    stored = view.get("aggregates")
+    if stored is None or any(not record["path"] for record in records):
+        for record in records:
+            grades = (record.get("value") or {}) if not record["path"] else updated_all(grades, [record])
+        return [change("set", ["aggregates"], aggregates.build(grades))]
+
+    students = list(dict.fromkeys(record["path"][0] for record in records))
+    touched = updated_all({s: grades[s] for s in students if s in grades}, records)
+
+    # Appends only add to a pair's totals, which refresh() handles. Anything
+    # else may shrink them, so those students' totals are removed and counted
+    # again from their changed grades.
+    result = []
+    recount = list(dict.fromkeys(record["path"][0] for record in records if record["op"] != "append"))
+    for student_id in recount:
+        removal = aggregates.remove(stored, student_id, [])
+        stored = updated_all(stored, removal)
+        result += removal
+
+    lists = {}
+    for record in records:
+        student_id = record["path"][0]
+        subjects = touched.get(student_id, {})
+        for subject in subjects if student_id in recount else record["path"][1:2]:
+            if subject in subjects:
+                lists[(student_id, subject)] = subjects[subject]
+    result += aggregates.refresh(stored, lists, [])
+    return [{**record, "path": ["aggregates"] + record["path"]} for record in result]
+
+def _inverted(students: Dict, keys: Callable[[str, Dict], List[str]]) -> Dict[str, List[str]]:
+    # key -> IDs of the students keys(student ID, student) gives it for, in creation order
+    index: Dict[str, List[str]] = {}
+    for student_id, student in students.items():
+        for key in keys(student_id, student):
+            index.setdefault(key, []).append(student_id)
+    return index
+
+def _inverted_changes(name: str, keys: Callable[[str, Dict], List[str]], view: Dict[str, Any],
+                      changes: List[Dict]) -> List[Dict]:
+    # Changes that keep the _inverted(students, keys) index called name in
+    # line with the student changes among changes, touching only the keys
+    # of the students that changed
+    records = _relative([record for record in changes if record["path"][0] == "students"])
+    if not records:
+        return []
+
+    students = view.get("students", {})
+    stored = view.get(name)
+    if stored is None or any(not record["path"] for record in records):
+        for record in records:
+            students = (record.get("value") or {}) if not record["path"] else updated_all(students, [record])
+        return [change("set", [name], _inverted(students, keys))]
+
+    ids = list(dict.fromkeys(record["path"][0] for record in records))
+    after = updated_all({s: students[s] for s in ids if s in students}, records)
+    lists: Dict[str, List[str]] = {}
+    for student_id in ids:
+        old = keys(student_id, students[student_id]) if student_id in students else []
+        new = keys(student_id, after[student_id]) if student_id in after else []
+        for key in old:
+            if key not in new:
+                lists[key] = [s for s in lists.get(key, stored.get(key, [])) if s != student_id]
+        for key in new:
+            if key not in old:
+                lists[key] = list(lists.get(key, stored.get(key, []))) + [student_id]
+    return [change("set", [name, key], student_ids) if student_ids else change("delete", [name, key])
+            for key, student_ids in lists.items()]
+
+def _parent(student_id: str, student: Dict) -> List[str]:
+    return [] if student.get("parentId") is None else [student["parentId"]]
+
+def build_parents(students: Dict) -> Dict[str, List[str]]:
+    """The parent -> children index of a students collection, children in creation order"""
+    return _inverted(students, _parent)
+
+def parent_changes(view: Dict[str, Any], changes: List[Dict]) -> List[Dict]:
+    """Changes that keep the parent index in line with the student changes among changes"""
+    return _inverted_changes("parents", _parent, view, changes)
+
+def build_search(students: Dict) -> Dict[str, List[str]]:
+    """The search index of a students collection: term -> student IDs (see search.py)"""
+    return _inverted(students, search.terms)
+
+def search_changes(view: Dict[str, Any], changes: List[Dict]) -> List[Dict]:
+    """Changes that keep the search index in line with the student changes among changes"""
+    return _inverted_changes("search", search.terms, view, changes)
+
+def bisect_after(items: List, value: Any, key: Callable[[Any], Any]) -> int:
+    """Position just past the items whose key is at most value, in items sorted by key
+    (bisect.bisect_right with the key argument of Python 3.10)"""
+    lo, hi = 0, len(items)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if value < key(items[mid]):
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+def bisect_before(items: List, value: Any, key: Callable[[Any], Any]) -> int:
+    """Position of the first item whose key is at least value, in items sorted by key
+    (bisect.bisect_left with the key argument of Python 3.10)"""
+    lo, hi = 0, len(items)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if key(items[mid]) < value:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+# The attendance date index: per student, per subject and for all subjects
+# together ("*"), the positions of their records in date order, with running
+# per-status counts, so a date range is found by bisection and counted by
+# subtraction:
+#   {"student_1": {"*": {"positions": [1, 0], "counts": {"present": [0, 0, 1], ...}}, "Math": {...}}}
+ATTENDANCE_STATUSES = ("present", "absent", "late")
+
+def _date_entry() -> Dict:
+    return {"positions": [], "counts": {status: [0] for status in ATTENDANCE_STATUSES}}
+
+def build_student_dates(records: List[Dict]) -> Dict[str, Dict]:
+    """One student's entry of the attendance date index"""
+    index = {"*": _date_entry()}
+    for position in sorted(range(len(records)), key=lambda p: records[p]["date"]):
+        for key in ("*", records[position]["subject"]):
+            entry = index.setdefault(key, _date_entry())
+            entry["positions"].append(position)
+            for status, counts in entry["counts"].items():
+                counts.append(counts[-1] + (records[position]["status"] == status))
+    return index
+
+def build_attendance_index(attendance: Dict) -> Dict:
+    """The attendance date index of an attendance collection"""
+    return {student_id: build_student_dates(records) for student_id, records in attendance.items()}
+
+def _appended_dates(student_id: str, index: Dict, old: List[Dict], new: List[Dict]) -> Optional[List[Dict]]:
+    # Changes adding the records appended after old to the student's index;
+    # None if one of them is dated before the last of its entry
+    result = []
+    last: Dict[str, Tuple[str, Dict[str, int]]] = {}
+    for position in range(len(old), len(new)):
+        record = new[position]
+        for key in ("*", record["subject"]):
+            if key not in last:
+                entry = index.get(key)
+                if entry is None:
+                    result.append(change("set", ["attendanceIndex", student_id, key], _date_entry()))
+                    entry = _date_entry()
+                date = new[entry["positions"][-1]]["date"] if entry["positions"] else ""
+                last[key] = (date, {status: counts[-1] for status, counts in entry["counts"].items()})
+            date, counts = last[key]
+            if record["date"] < date:
+                return None
+            counts = {status: count + (record["status"] == status) for status, count in counts.items()}
+            last[key] = (record["date"], counts)
+            result.append(change("append", ["attendanceIndex", student_id, key, "positions"], position))
+            result += [change("append", ["attendanceIndex", student_id, key, "counts", status], count)
+                       for status, count in counts.items()]
+    return result
+
+def attendance_changes(view: Dict[str, Any], changes: List[Dict]) -> List[Dict]:
+    """Changes that keep the attendance date index in line with the attendance changes among changes.
+
+    Records appended in date order extend a student's entry; any other
+    change builds that student's entry again.
+    """
+    records = _relative([record for record in changes if record["path"][0] == "attendance"])
+    if not records:
+        return []
+
+    attendance = view.get("attendance", {})
+    if any(not record["path"] for record in records):
+        for record in records:
+            attendance = (record.get("value") or {}) if not record["path"] else updated_all(attendance, [record])
+        return [change("set", ["attendanceIndex"], build_attendance_index(attendance))]
+
+    stored = view.get("attendanceIndex") or {}
+    ids = list(dict.fromkeys(record["path"][0] for record in records))
+    after = updated_all({s: attendance[s] for s in ids if s in attendance}, records)
+    result = []
+    for student_id in ids:
+        if student_id not in after:
+            if student_id in stored:
+                result.append(change("delete", ["attendanceIndex", student_id]))
+            continue
+        appended = None
+        if student_id in stored and all(record["op"] == "append" and len(record["path"]) == 1
+                                        for record in records if record["path"][0] == student_id):
+            appended = _appended_dates(student_id, stored[student_id], attendance.get(student_id, []),
+                                       after[student_id])
+        if appended is None:
+            appended = [change("set", ["attendanceIndex", student_id], build_student_dates(after[student_id]))]
+        result += appended
+    return result
+
+def _student_dates(view: Dict[str, Any], student_id: str, records: List[Dict]) -> Dict[str, Dict]:
+    # The student's entry of the date index when the view holds it, as the
+    # JSON documents do; otherwise their records are sorted here
+    index = view.get("attendanceIndex", {}).get(student_id)
+    return index if index is not None else build_student_dates(records)
+
+def _date_slice(entry: Dict, records: List[Dict], start: Optional[str], end: Optional[str]) -> Tuple[int, int]:
+    # The span of the entry's positions whose records are dated in [start, end)
+    def date(position: int) -> str:
+        return records[position]["date"]
+
+    lo = bisect_before(entry["positions"], start, date) if start else 0
+    hi = bisect_before(entry["positions"], end, date) if end else len(entry["positions"])
+    return lo, max(lo, hi)
+
+# The assignment index: the IDs of the assignments, in creation order, per
+# subject, per creator and per due date, and the creation order itself:
+#   {"subject": {"Math": [...]}, "createdBy": {"MathTeacher": [...]},
+#    "dueDate": {"2025-10-01": [...]}, "position": {"assignment_1": 0, ...}}
+ASSIGNMENT_FIELDS = ("subject", "createdBy", "dueDate")
+
+def build_assignment_index(assignments: Dict) -> Dict:
+    """The assignment index of an assignments collection"""
+    index: Dict[str, Dict] = {field: {} for field in ASSIGNMENT_FIELDS}
+    for assignment_id, assignment in assignments.items():
+        for field in ASSIGNMENT_FIELDS:
+            index[field].setdefault(assignment[field], []).append(assignment_id)
+    index["position"] = {assignment_id: i for i, assignment_id in enumerate(assignments)}
+    return index
+
+def assignment_changes(view: Dict[str, Any], changes: List[Dict]) -> List[Dict]:
+    """Changes that keep the assignment index in line with the assignment changes among changes"""
+    records = _relative([record for record in changes if record["path"][0] == "assignments"])
+    if not records:
+        return []
+
+    assignments = view.get("assignments", {})
+    stored = view.get("assignmentIndex")
+    ids = list(dict.fromkeys(record["path"][0] for record in records if record["path"]))
+    after = updated_all({a: assignments[a] for a in ids if a in assignments}, records) if stored else {}
+    # Removing an assignment renumbers the ones after it, so the index is built again
+    if (stored is None or "position" not in stored or any(not record["path"] for record in records)
+            or any(a not in after for a in ids)):
+        for record in records:
+            assignments = (record.get("value") or {}) if not record["path"] else updated_all(assignments, [record])
+        return [change("set", ["assignmentIndex"], build_assignment_index(assignments))]
+
+    position = dict(stored["position"])
+    result = []
+    lists: Dict[Tuple[str, Any], List[str]] = {}
+    for assignment_id in ids:
+        if assignment_id not in position:
+            position[assignment_id] = len(position)
+            result.append(change("set", ["assignmentIndex", "position", assignment_id], position[assignment_id]))
+        old = assignments.get(assignment_id)
+        for field in ASSIGNMENT_FIELDS:
+            new_value = after[assignment_id][field]
+            if old is not None and old[field] == new_value:
+                continue
+            if old is not None:
+                key = (field, old[field])
+                lists[key] = [a for a in lists.get(key, stored[field].get(old[field], [])) if a != assignment_id]
+            # In creation order, which a changed assignment may be in the middle of
+            key = (field, new_value)
+            ids_for_value = list(lists.get(key, stored[field].get(new_value, [])))
+            ids_for_value.insert(bisect_after(ids_for_value, position[assignment_id], position.__getitem__),
+                                 assignment_id)
+            lists[key] = ids_for_value
+    result += [change("set", ["assignmentIndex", field, value], assignment_ids) if assignment_ids
+               else change("delete", ["assignmentIndex", field, value])
+               for (field, value), assignment_ids in lists.items()]
+    return result
+
+def build_submission_index(submissions: Dict) -> Dict:
+    """The submission index of a submissions collection: assignment ID -> {student ID: position in their list}"""
+    index: Dict[str, Dict[str, int]] = {}
+    for student_id, entries in submissions.items():
+        for position, submission in enumerate(entries):
+            index.setdefault(submission["assignmentId"], {})[student_id] = position
+    return index
+
+def submission_changes(view: Dict[str, Any], changes: List[Dict]) -> List[Dict]:
+    """Changes that keep the submission index in line with the submission changes among changes"""
+    records = _relative([record for record in changes if record["path"][0] == "submissions"])
+    if not records:
+        return []
+
+    submissions = view.get("submissions", {})
+    stored = view.get("submissionIndex")
+    if stored is None or any(not record["path"] for record in records):
+        for record in records:
+            submissions = (record.get("value") or {}) if not record["path"] else updated_all(submissions, [record])
+        return [change("set", ["submissionIndex"], build_submission_index(submissions))]
+
+    # Only the lists of the students whose submissions changed are compared
+    ids = list(dict.fromkeys(record["path"][0] for record in records))
+    after = updated_all({s: submissions[s] for s in ids if s in submissions}, records)
+    result = []
+    removed: Dict[str, Dict[str, int]] = {}
+    for student_id in ids:
+        old = {s["assignmentId"]: i for i, s in enumerate(submissions.get(student_id, []))}
+        new = {s["assignmentId"]: i for i, s in enumerate(after.get(student_id, []))}
+        for assignment_id in old:
+            if assignment_id not in new:
+                removed.setdefault(assignment_id, dict(stored.get(assignment_id, {}))).pop(student_id, None)
+        for assignment_id, position in new.items():
+            if old.get(assignment_id) != position:
+                result.append(change("set", ["submissionIndex", assignment_id, student_id], position))
+    result += [change("set", ["submissionIndex", assignment_id], students) if students
+               else change("delete", ["submissionIndex", assignment_id])
+               for assignment_id, students in removed.items()]
+    return result
+
+# Indexes the engines maintain: collection -> (the collection it follows,
+# changes keeping it in line with that one's changes, how to build it from
+# scratch). A document without an index gets it built with its next change.
+DERIVED: Dict[str, Tuple[str, Callable[[Dict[str, Any], List[Dict]], List[Dict]], Callable[[Dict], Dict]]] = {
+    "aggregates": ("grades", aggregate_changes, aggregates.build),
+    "parents": ("students", parent_changes, build_parents),
+    "search": ("students", search_changes, build_search),
+    "attendanceIndex": ("attendance", attendance_changes, build_attendance_index),
+    "assignmentIndex": ("assignments", assignment_changes, build_assignment_index),
+    "submissionIndex": ("submissions", submission_changes, build_submission_index)
+}
+
+def derived_changes(view: Dict[str, Any], changes: List[Dict], indexes: Optional[List[str]] = None) -> List[Dict]:
+    """Changes to the indexes (default: all of DERIVED) that the changes call for"""
+    result = []
+    for name in DERIVED if indexes is None else indexes:
+        result += DERIVED[name][1](view, changes)
+    return result
+
+def _feed_keys(changes: List[Dict]) -> Optional[List[str]]:
+    # "collection/record" of the FEED records the changes touch; None if
+    # they replace a FEED collection whole
+    keys = []
+    for record in changes:
+        if record["path"][0] in FEED:
+            if len(record["path"]) < 2:
+                return None
+            keys.append(f"{record['path'][0]}/{record['path'][1]}")
+    return list(dict.fromkeys(keys))
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class ChangeLog:
+    """Version numbers of a JSON store's changes, kept in a journal of their own.
+
+    The journal is a file of JSON lines, the first giving the version and
+    base the rest starts from:
+
+        {"version": 40, "base": 40}
+        {"begin": "9f2c41d07a3be815", "pid": 4121, "keys": ["students/student_2", "grades/student_2"]}
+        {"commit": ["9f2c41d07a3be815"]}
+        {"keys": ["grades/student_1"]}
+
+    version counts the commits that changed FEED collections: every commit
+    line, and every keys line (a commit folded in by compaction), is the
+    next version, and the records it lists changed in it. A null list stands
+    for every record (a reset); base is the version of the last one, before
+    which nothing is known record by record.
+
+    A begin line is synced before the data it describes is written, and
+    committed once the data is (so a record read after a version is never
+    older than it); the updates of one transaction share both.
+    Until then its records are reported as changed after every version, so
+    that a crash between writing the data and committing cannot lose them;
+    the first reader to find the writing process gone commits it.
+
+    Writers only hold a shared lock while appending, so those of different
+    documents or shards do not wait for each other. Past MAX_BYTES the
+    journal is compacted to its last KEEP versions; clients further behind
+    start over.
+    """
+
+    MAX_BYTES = 1 << 20
+    KEEP = 1000
+
+    def __init__(self, path: str):
+        self.path = path
+        # The journal as last read, extended while it only grows
+        self._state: Optional[Dict] = None
+        self._reading = threading.Lock()
+
+    def begin(self, changes: List[Dict]) -> List[str]:
+        """Journal the FEED records the changes are about to touch; commit the returned IDs once written.
+
+        In a transaction the begin line is written when it commits, and
+        committed after it, so nothing is returned.
+        """
+        keys = _feed_keys(changes)
+        if keys == []:
+            return []
+        scope = transaction_scope()
+        if scope is None:
+            return [self._begin(keys)]
+        pending = scope.get(self)
+        if pending is None:
+            pending = scope[self] = {"keys": [], "begun": []}
+            before_commit(lambda: pending["begun"].append(self._begin(pending["keys"])))
+            after_commit(lambda: self.commit(pending["begun"]))
+        if keys is None or pending["keys"] is None:
+            pending["keys"] = None
+        else:
+            pending["keys"] = list(dict.fromkeys(pending["keys"] + keys))
+        return []
+
+    def commit(self, begun: List[str]):
+        """Record that the begun changes are written: the next version"""
+        if not begun:
+            return
+        if self._append({"commit": begun}) > self.MAX_BYTES:
+            self.compact()
+
+    @contextmanager
+    def resetting(self):
+        """Journal a reset of the store around the block writing it"""
+        begun = self._begin(None)
+        try:
+            yield
+        finally:
+            self.commit([begun])
+
+    def _begin(self, keys: Optional[List[str]]) -> str:
+        begun = os.urandom(8).hex()
+        self._append({"begin": begun, "pid": os.getpid(), "keys": keys}, sync=True)
+        return begun
+
+    def _lock(self, operation: int):
+        # Open and lock the journal's lock file; close it to unlock
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        f = open(self.path + ".lock", "a")
+        try:
+            fcntl.flock(f, operation)
+        except BaseException:
+            f.close()
+            raise
+        return f
+
+    def _write(self, entries: List[Dict]):
+        # Replace the journal (the caller holds the exclusive lock)
+        fd, tmp = temp_file(self.path)
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.writelines(json.dumps(entry) + "\n" for entry in entries)
+                f.flush()
+                os.fsync(f.fileno())
+            replace_file(tmp, self.path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def _append(self, entry: Dict, sync: bool = False) -> int:
+        # Append one line in a single write; returns the journal's size
+        if not os.path.exists(self.path):
+            lock = self._lock(fcntl.LOCK_EX)
+            try:
+                if not os.path.exists(self.path):
+                    self._write([{"version": 0, "base": 0}])
+            finally:
+                lock.close()
+
+        line = (json.dumps(entry) + "\n").encode("utf-8")
+        lock = self._lock(fcntl.LOCK_SH)
+        try:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+            try:
+                os.write(fd, line)
+                if sync:
+                    os.fsync(fd)
+                return os.fstat(fd).st_size
+            finally:
+                os.close(fd)
+        finally:
+            lock.close()
+
+    def compact(self) -> bool:
+        """Fold the journal into its last KEEP versions; False if a writer is appending"""
+        try:
+            lock = self._lock(fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        try:
+            with self._reading:
+                state = self._read()
+                kept = state["changes"][-self.KEEP:]
+                start = state["version"] - len(kept)
+                entries = [{"version": start, "base": start}]
+                entries += [{"keys": keys} for keys in kept]
+                entries += [{"begin": begun, "pid": pid, "keys": keys} for begun, (pid, keys) in state["begun"].items()]
+                self._write(entries)
+        finally:
+            lock.close()
+        return True
+
+    def _read(self) -> Dict:
+        # The journal parsed (the caller holds _reading): {"version", "base",
+        # "changes": keys of each version after base, "begun": {ID: (pid,
+        # keys)} not committed yet}. Only the lines added since the last read
+        # are parsed, unless compaction replaced the file.
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return {"version": 0, "base": 0, "changes": [], "begun": {}}
+        with f:
+            header = f.readline()
+            state = self._state
+            if state is None or state["header"] != header or os.fstat(f.fileno()).st_size < state["offset"]:
+                start = json.loads(header)
+                state = {"header": header, "offset": len(header), "version": start["version"],
+                         "base": start["base"], "changes": [], "begun": {}}
+            f.seek(state["offset"])
+            data = f.read()
+
+        # A last line without its newline is still being written
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Torn by a crash, taking what was appended after it: start over
+                entry = {"keys": None}
+            if "begin" in entry:
+                state["begun"][entry["begin"]] = (entry["pid"], entry["keys"])
+                continue
+
+            if "commit" in entry:
+                begun = [state["begun"].pop(b)[1] for b in entry["commit"] if b in state["begun"]]
+                keys = None if None in begun else list(dict.fromkeys(itertools.chain.from_iterable(begun)))
+            else:
+                keys = entry["keys"]
+            state["version"] += 1
+            if keys is None:
+                state["base"] = state["version"]
+                state["changes"] = []
+            else:
+                state["changes"].append(keys)
+        state["offset"] += end
+        self._state = state
+        return state
+
+    def since(self, version: Optional[int]) -> Tuple[int, Optional[List[Tuple[str, str]]]]:
+        """See Engine.changed_since"""
+        with self._reading:
+            state = self._read()
+            orphans = [begun for begun, (pid, _) in state["begun"].items() if not _alive(pid)]
+        if orphans:
+            self.commit(orphans)
+
+        with self._reading:
+            state = self._read()
+            pending = list(state["begun"].values())
+            if version is None or not state["base"] <= version <= state["version"] \
+                    or any(keys is None for _, keys in pending):
+                return state["version"], None
+            changed: Dict[str, None] = {}
+            for keys in state["changes"][version - state["base"]:] + [keys for _, keys in pending]:
+                for key in keys:
+                    changed.pop(key, None)
+                    changed[key] = None
+            return state["version"], [tuple(key.split("/", 1)) for key in changed]
+
+class _JsonEngine(Engine):
+    # Shared by the JSON engines, whose per-student collections may be sharded
+    # and whose change feed is a ChangeLog
+    changelog: Optional[ChangeLog] = None
+
+    def _document(self, collection: str) -> str:
+        raise NotImplementedError
+
+    def _begin(self, changes: List[Dict]) -> List[str]:
+        return self.changelog.begin(changes) if self.changelog is not None else []
+
+    def _commit(self, begun: List[str]):
+        if self.changelog is not None:
+            self.changelog.commit(begun)
+
+    @contextmanager
+    def _resetting(self):
+        if self.changelog is None:
+            yield
+            return
+        with self.changelog.resetting():
+            yield
+
+    def changed_since(self, version: Optional[int]) -> Tuple[int, Optional[List[Tuple[str, str]]]]:
+        if self.changelog is None:
+            raise ValueError("This store keeps no change log")
+        return self.changelog.since(version)
+
+    def get_many(self, collection: str, keys: List[str]) -> Dict[str, Any]:
+        import shards
+        if collection in PER_STUDENT and shards.is_sharded(self._document(collection)):
+            return super().get_many(collection, keys)
+        records = self.load(collection)
+        return {key: records[key] for key in keys if key in records}
+
+class DocumentEngine(_JsonEngine):
+    """Every collection in one JSON document, as in data/database.json"""
+
+    def __init__(self, path: str, init: Callable[[], Dict], changelog: Optional[str] = None):
+        self.path = path
+        # Creates the document when it does not exist yet, returning it
+        self.init = init
+        # Path of the change log, if the store keeps one
+        if changelog is not None:
+            self.changelog = ChangeLog(changelog)
+
+    def export(self, shard: Optional[str] = None) -> Dict:
+        if not exists(self.path):
+            return self.init()
+        return load(self.path, shard)
+
+    def _document(self, collection: str) -> str:
+        return self.path
+
+    def view(self, collections: List[str], shard: Optional[str] = None) -> Dict[str, Any]:
+        db = self.export(shard)
+        for name in collections:
+            if name in DERIVED and name not in db:
+                # Documents written before the index existed
+                source, _, build = DERIVED[name]
+                db = {**db, name: build(db.get(source, {}))}
+        return db
+
+    def update(self, plan: Plan, collections: Optional[List[str]] = None, shard: Optional[str] = None) -> Any:
+        begun = []
+
+        def document_plan(db):
+            result, changes = plan(db)
+            derived = derived_changes(db, changes)
+            begun.extend(self._begin(changes))
+            return result, list(changes) + derived
+
+        try:
+            return update(self.path, document_plan, self.export, shard)
+        finally:
+            self._commit(begun)
+
+    def reset(self, collection: str, data: Dict):
+        self.update(lambda db: (None, [change("set", [collection], data)]))
+
+    def reset_all(self, data: Dict):
+        with self._resetting():
+            reset(self.path, data)
+
+    def subject_averages(self, student_id: str) -> Optional[Dict[str, float]]:
+        db = self.export(student_id)
+        if student_id not in db.get("grades", {}):
+            return None
+        student_grades = db["grades"][student_id]
+        if "aggregates" in db:
+            pairs = db["aggregates"]["students"].get(student_id, {})
+            return {subject: aggregates.average(pairs[subject])[0] for subject in student_grades if subject in pairs}
+        return {
+            subject: sum(g["grade"] for g in grade_list) / len(grade_list)
+            for subject, grade_list in student_grades.items()
+            if len(grade_list) > 0
+        }
+
+class FilesEngine(_JsonEngine):
+    """A JSON document per collection, as in data/students.json, data/grades.json and data/users.json"""
+
+    def __init__(self, files: Dict[str, str], defaults: Optional[Dict[str, Callable[[], Dict]]] = None,
+                 changelog: Optional[str] = None):
+        # Collection -> document path. Updates lock the documents in this
+        # order, so each index (see DERIVED) should follow its collection.
+        self.files = files
+        # Collection -> contents of a document that does not exist yet (empty
+        # if not given; indexes are built from their collections)
+        self.defaults = defaults or {}
+        # Path of the change log, if the store keeps one
+        if changelog is not None:
+            self.changelog = ChangeLog(changelog)
+
+    def feed(self) -> List[str]:
+        return [collection for collection in FEED if collection in self.files]
+
+    def _path(self, collection: str) -> str:
+        if collection not in self.files:
+            raise ValueError(f"Unknown collection: {collection}")
+        return self.files[collection]
+
+    def _document(self, collection: str) -> str:
+        return self._path(collection)
+
+    def _indexes(self, collections) -> List[str]:
+        # The indexes kept here that follow the collections
+        return [name for name, (source, _, _) in DERIVED.items() if source in collections and name in self.files]
+
+    def _load(self, collection: str, shard: Optional[str] = None) -> Dict:
+        path = self._path(collection)
+        if not exists(path):
+            if collection in DERIVED:
+                source, _, build = DERIVED[collection]
+                contents = build(self.load(source) if source in self.files else {})
+            else:
+                contents = self.defaults.get(collection, dict)()
+            reset(path, contents)
+        return load(path, shard)
+
+    def export(self, shard: Optional[str] = None) -> Dict:
+        return self.view(list(self.files), shard)
+
+    def view(self, collections: List[str], shard: Optional[str] = None) -> Dict[str, Any]:
+        return {collection: self._load(collection, shard) for collection in collections}
+
+    def update(self, plan: Plan, collections: Optional[List[str]] = None, shard: Optional[str] = None) -> Any:
+        reads = set(self.files if collections is None else collections)
+        for collection in reads:
+            self._path(collection)
+        reads.update(self._indexes(reads))
+        names = [collection for collection in self.files if collection in reads]
+
+        views = {}
+        planned = {}
+        begun = []
+
+        def run(level: int) -> Any:
+            if level == len(names):
+                result, changes = plan(dict(views))
+                own = [record for record in changes if record["path"][0] in views]
+                planned["own"] = own + derived_changes(views, own, self._indexes(views))
+                planned["others"] = [record for record in changes if record["path"][0] not in views]
+                for record in planned["own"] + planned["others"]:
+                    self._path(record["path"][0])
+                    if len(record["path"]) < 2:
+                        raise ValueError(f"Use reset to replace the {record['path'][0]} collection")
+                begun.extend(self._begin(own))
+                return result
+
+            name = names[level]
+
+            def file_plan(data):
+                views[name] = data
+                result = run(level + 1)
+                return result, _relative([record for record in planned["own"] if record["path"][0] == name])
+
+            return update(self.files[name], file_plan, lambda: self._load(name), shard)
+
+        try:
+            result = run(0)
+        finally:
+            self._commit(begun)
+
+        # Changes to collections the plan did not read, one collection at a time
+        others = planned.get("others", [])
+        for name in self.files:
+            records = [record for record in others if record["path"][0] == name]
+            if records:
+                students = {record["path"][1] for record in records}
+                target = students.pop() if name in PER_STUDENT and len(students) == 1 else None
+                self.update(lambda view, records=records: (None, records), [name], target)
+        return result
+
+    def reset(self, collection: str, data: Dict):
+        if collection in FEED:
+            with self._resetting():
+                self._reset(collection, data)
+        else:
+            self._reset(collection, data)
+
+    def _reset(self, collection: str, data: Dict):
+        reset(self._path(collection), data)
+        for name in self._indexes([collection]):
+            reset(self.files[name], DERIVED[name][2](data))
+
+    def subject_average(self, subject: str) -> Tuple[Optional[float], int]:
+        # The columnar store answers from the subject's grade column alone
+        path = self.files.get("grades", "")
+        if path.endswith(COLUMNAR_SUFFIX):
+            if not exists(path):
+                return 0.0, 0
+            import columnar
+            return columnar.subject_average(path, subject)
+        return super().subject_average(subject)
+
+class SqliteEngine(Engine):
+    """Tables in data/school.db, queried through their indexes (see sqlite_store.py)"""
+
+    def __init__(self):
+        # Imported here so the JSON engines never load sqlite3
+        import sqlite_store
+        self.store = sqlite_store
+        # Where the data lives, as for DocumentEngine
+        self.path = sqlite_store.DB_FILE
+
+    def export(self, shard: Optional[str] = None) -> Dict:
+        return self.store.export_db()
+
+    def view(self, collections: List[str], shard: Optional[str] = None) -> Dict[str, Any]:
+        return self.store.collections(self.store.connect())
+
+    def update(self, plan: Plan, collections: Optional[List[str]] = None, shard: Optional[str] = None) -> Any:
+        return self.store.run_plan(plan)
+
+    def reset(self, collection: str, data: Dict):
+        self.store.reset_collection(collection, data)
+
+    def reset_all(self, data: Dict):
+        self.store.import_db(data)
+
+    def load(self, collection: str, shard: Optional[str] = None) -> Dict:
+        return self.store.export_collection(collection)
+
+    def get(self, collection: str, key: str) -> Any:
+        if collection == "grades":
+            # All of the student's grades with two queries, rather than one per subject
+            return self.store.get_student_grades(key)
+        return self.view([collection]).get(collection, {}).get(key)
+
+    def count(self, collection: str) -> int:
+        return len(self.view([collection])[collection])
+
+    def scan(self, collection: str, sort: Optional[str] = None, after: Optional[List] = None,
+             limit: Optional[int] = None) -> Iterator[Tuple[str, Any]]:
+        if collection != "students":
+            yield from super().scan(collection, sort, after, limit)
+            return
+        for student in self.store.iter_students(sort, after, limit):
+            yield student["id"], student
+
+    def subject_average(self, subject: str) -> Tuple[Optional[float], int]:
+        result = self.store.class_average(subject)
+        return result["average"], result["count"]
+
+    def subject_averages(self, student_id: str) -> Optional[Dict[str, float]]:
+        return self.store.subject_averages(student_id)
+
+    def attendance(self, student_id: str, subject: Optional[str] = None, start: Optional[str] = None,
+                   end: Optional[str] = None) -> List[Dict]:
+        return self.store.get_attendance(student_id, subject, start, end)
+
+    def attendance_counts(self, student_id: str, subject: Optional[str] = None, start: Optional[str] = None,
+                          end: Optional[str] = None) -> Dict[str, int]:
+        return self.store.attendance_counts(student_id, subject, start, end)
+
+    def query_assignments(self, subject: Optional[str] = None, created_by: Optional[str] = None,
+                          due_from: Optional[str] = None, due_to: Optional[str] = None, by_due_date: bool = False,
+                          limit: Optional[int] = None, after: Optional[str] = None) -> List[Dict]:
+        return self.store.query_assignments(subject, created_by, due_from, due_to, by_due_date, limit, after)
+
+    def assignment_submissions(self, assignment_id: str) -> Tuple[Optional[Dict], List[Dict]]:
+        return self.store.get_assignment(assignment_id), self.store.get_assignment_submissions(assignment_id)
+
+    def check_aggregates(self, rebuild: bool = False) -> List:
+        # The totals are kept by triggers, so a rebuild recounts them from the grades table
+        with self.store.transaction():
+            rebuilt = aggregates.build(self.store.export_grades())
+            mismatches = aggregates.compare(self.store.export_totals(), rebuilt)
+            if rebuild:
+                self.store.rebuild_totals()
+        return mismatches
+
+    def changed_since(self, version: Optional[int]) -> Tuple[int, Optional[List[Tuple[str, str]]]]:
+        # Kept by triggers on the tables
+        return self.store.changed_since(version)
+
+    def search_index(self) -> search.Index:
+        # Reused until the students change, which the change feed tells
+        version = self.store.students_version()
+        if self._search is None or self._search[0] != version:
+            self._search = (version, search.Index(self.store.export_search()))
+        return self._search[1]
+
+@contextmanager
+def transaction():
+    """Commit the updates of the block together: one write per JSON document
+    (see jsonstore.transaction), or one SQLite transaction"""
+    with jsonstore.transaction():
+        if STORAGE_ENGINE != "sqlite":
+            yield
+            return
+        import sqlite_store
+        with sqlite_store.transaction():
+            yield
+
+# Engines selectable with SCHOOL_STORAGE besides the JSON ones, by name
+ENGINES: Dict[str, Callable[[], Engine]] = {"sqlite": SqliteEngine}
+
+def select_engine(default: Engine) -> Engine:
+    """The engine chosen with SCHOOL_STORAGE, or default for the JSON storages (json, wal)"""
+    if STORAGE_ENGINE in ENGINES:
+        return ENGINES[STORAGE_ENGINE]()
+    if ":" in STORAGE_ENGINE:
+        module, name = STORAGE_ENGINE.split(":", 1)
+        return getattr(importlib.import_module(module), name)()
+    return default
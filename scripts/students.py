@@ -1,217 +1,542 @@
+import instrument  # first, so the import phase covers the other imports
+import base64
+import csv
 import json
+import math
 import os
+import sys
 from datetime import datetime
-from typing import Optional, Dict, List
+from typing import Any, Optional, Dict, Iterable, Iterator, List, Tuple
+import storage
+from jsonstore import change
+from subjects import SUBJECTS
+
+# Grade storage format: "json", or "columnar" for the binary column file (see columnar.py)
+GRADE_STORE = os.environ.get("SCHOOL_GRADE_STORE", "json")
 
 # Data file paths
 STUDENTS_FILE = "data/students.json"
-GRADES_FILE = "data/grades.json"
+GRADES_FILE = "data/grades.col" if GRADE_STORE == "columnar" else "data/grades.json"
+TOTALS_FILE = "data/grade_totals.json"
+PARENTS_FILE = "data/parents.json"
+SEARCH_FILE = "data/search.json"
+CHANGES_FILE = "data/changes.log"
+
+# The functions below take the engine to work on (see storage.py);
+# database.py passes its own, the students.py commands use this one
+STORE = storage.select_engine(storage.FilesEngine({
+    "students": STUDENTS_FILE,
+    "parents": PARENTS_FILE,
+    "search": SEARCH_FILE,
+    "grades": GRADES_FILE,
+    "aggregates": TOTALS_FILE
+}, changelog=CHANGES_FILE))
 
 def init_students_db():
     """Initialize students database"""
     os.makedirs(os.path.dirname(STUDENTS_FILE), exist_ok=True)
     
-    with open(STUDENTS_FILE, 'w') as f:
-        json.dump({}, f, indent=2)
-    
-    with open(GRADES_FILE, 'w') as f:
-        json.dump({}, f, indent=2)
+    STORE.reset("students", {})
+    STORE.reset("grades", {})
 
 def load_students() -> Dict:
     """Load students from file"""
-    if not os.path.exists(STUDENTS_FILE):
-        init_students_db()
-        return {}
-    
-    with open(STUDENTS_FILE, 'r') as f:
-        return json.load(f)
+    return STORE.load("students")
 
 def save_students(students: Dict):
     """Save students to file"""
-    os.makedirs(os.path.dirname(STUDENTS_FILE), exist_ok=True)
-    with open(STUDENTS_FILE, 'w') as f:
-        json.dump(students, f, indent=2)
+    STORE.reset("students", students)
 
-def load_grades() -> Dict:
-    """Load grades from file"""
-    if not os.path.exists(GRADES_FILE):
-        init_students_db()
-        return {}
-    
-    with open(GRADES_FILE, 'r') as f:
-        return json.load(f)
+def load_grades(shard: Optional[str] = None) -> Dict:
+    """Load grades from file (only those of student shard when the file is sharded, see shards.py)"""
+    return STORE.load("grades", shard)
 
 def save_grades(grades: Dict):
     """Save grades to file"""
-    os.makedirs(os.path.dirname(GRADES_FILE), exist_ok=True)
-    with open(GRADES_FILE, 'w') as f:
-        json.dump(grades, f, indent=2)
-
-def create_student(name: str, surname: str, age: int) -> Dict:
-    """Create a new student"""
-    students = load_students()
-    grades = load_grades()
-    
-    # Generate student ID
-    student_id = f"student_{len(students) + 1}"
-    
-    student = {
-        "id": student_id,
-        "name": name,
-        "surname": surname,
-        "age": age,
-        "created_at": datetime.now().isoformat()
-    }
-    
-    students[student_id] = student
-    save_students(students)
-    
-    # Initialize grades for this student
-    grades[student_id] = {
-        "English": [],
-        "Math": [],
-        "Biology": [],
-        "Chemistry": [],
-        "Physics": [],
-        "History": [],
-        "Geography": [],
-        "Computer Science": [],
-        "Art": [],
-        "Physical Education": []
-    }
-    save_grades(grades)
+    STORE.reset("grades", grades)
+
+def load_totals() -> Dict:
+    """Load the running grade totals (see aggregates.py)"""
+    return STORE.load("aggregates")
+
+def new_student_grades() -> Dict[str, List]:
+    """Empty grade lists for every subject"""
+    return {subject: [] for subject in SUBJECTS}
+
+def create_student(name: str, surname: str, age: int, parent_id: Optional[str] = None,
+                   store: Optional[storage.Engine] = None) -> Dict:
+    """Create a new student, linked to the parent account parent_id if given"""
+    def plan(view):
+        # Generate student ID
+        student_id = f"student_{len(view['students']) + 1}"
+        
+        student = {
+            "id": student_id,
+            "name": name,
+            "surname": surname,
+            "age": age,
+            "created_at": datetime.now().isoformat()
+        }
+        if parent_id is not None:
+            student["parentId"] = parent_id
+        # A reused ID starts over: the new grade lists replace the old student's
+        return student, [
+            change("set", ["students", student_id], student),
+            change("set", ["grades", student_id], new_student_grades())
+        ]
     
-    return student
+    return (store or STORE).update(plan, ["students"])
 
-def get_all_students() -> List[Dict]:
+def get_all_students(store: Optional[storage.Engine] = None) -> List[Dict]:
     """Get all students"""
-    students = load_students()
-    return list(students.values())
+    return [student for _, student in (store or STORE).scan("students")]
 
-def get_student(student_id: str) -> Optional[Dict]:
-    """Get a specific student"""
-    students = load_students()
-    return students.get(student_id)
+# Student fields that listings can sort by and project
+STUDENT_FIELDS = ["id", "name", "surname", "age", "created_at"]
 
-def remove_student(student_id: str) -> bool:
-    """Delete a student"""
-    students = load_students()
-    grades = load_grades()
+def encode_cursor(student: Dict, sort: Optional[str] = None) -> str:
+    """Opaque cursor pointing just after a student in a listing"""
+    position = [student.get(sort) if sort else None, student["id"]]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> List:
+    """[sort value, student ID] of a cursor from encode_cursor"""
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    if not isinstance(position, list) or len(position) != 2:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return position
+
+def iter_students(sort: Optional[str] = None, cursor: Optional[str] = None,
+                  limit: Optional[int] = None) -> Iterator[Dict]:
+    """Yield students in creation order (or by a STUDENT_FIELDS key, then ID), starting after cursor.
+
+    Only the returned students are materialised: creation order walks the
+    file's own order, and a sorted page keeps just the smallest `limit`
+    candidates.
+    """
+    if sort is not None and sort not in STUDENT_FIELDS:
+        raise ValueError(f"Unknown sort key: {sort}")
+    after = decode_cursor(cursor) if cursor else None
     
-    if student_id in students:
-        del students[student_id]
-        save_students(students)
-        
-        if student_id in grades:
-            del grades[student_id]
-            save_grades(grades)
-        
-        return True
-    return False
+    try:
+        for _, student in STORE.scan("students", sort, after, limit):
+            yield student
+    except KeyError:
+        raise ValueError(f"Invalid cursor: {cursor}")
 
-def add_student_grade(student_id: str, subject: str, grade: float, teacher: str) -> Optional[Dict]:
-    """Add a grade for a student"""
-    grades = load_grades()
+def list_students(sort: Optional[str] = None, cursor: Optional[str] = None, limit: Optional[int] = None,
+                  fields: Optional[List[str]] = None) -> Iterator[Dict]:
+    """Yield one page of students, projected to fields, then {"next": cursor} if a limit was given.
+
+    The next cursor is None on the last page.
+    """
+    if fields is not None:
+        unknown = [f for f in fields if f not in STUDENT_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
     
-    if student_id not in grades:
-        return None
+    last = None
+    more = False
+    # One extra student tells whether another page follows
+    for i, student in enumerate(iter_students(sort, cursor, None if limit is None else limit + 1)):
+        if limit is not None and i == limit:
+            more = True
+            break
+        last = student
+        yield student if fields is None else {f: student.get(f) for f in fields}
     
+    if limit is not None:
+        yield {"next": encode_cursor(last, sort) if more else None}
+
+def get_student(student_id: str, store: Optional[storage.Engine] = None) -> Optional[Dict]:
+    """Get a specific student"""
+    return (store or STORE).get("students", student_id)
+
+def list_for_parent(username: str, store: Optional[storage.Engine] = None) -> List[Dict]:
+    """Students linked to a parent, in creation order.
+
+    Looks the children up in the parents index, so only their records are
+    read rather than every student's.
+    """
+    store = store or STORE
+    student_ids = store.get("parents", username) or []
+    found = store.get_many("students", student_ids)
+    return [found[student_id] for student_id in student_ids if student_id in found]
+
+def search_students(query: str, limit: int = 10, store: Optional[storage.Engine] = None) -> Dict:
+    """The limit students best matching query, by prefix and with typos, and how many match.
+
+    Each word of the query has to match a word of the student's name or
+    surname, or their ID (see search.py); only the returned students'
+    records are read.
+    """
+    store = store or STORE
+    student_ids, total = store.search_index().search(query, limit)
+    found = store.get_many("students", student_ids)
+    return {"students": [found[student_id] for student_id in student_ids if student_id in found], "total": total}
+
+def grades_for_parent(username: str, store: Optional[storage.Engine] = None) -> List[Dict]:
+    """Each of a parent's children with their grades"""
+    store = store or STORE
+    children = list_for_parent(username, store)
+    grades = store.get_many("grades", [student["id"] for student in children])
+    return [{"student": student, "grades": grades.get(student["id"], {})} for student in children]
+
+def remove_student(student_id: str, store: Optional[storage.Engine] = None) -> bool:
+    """Delete a student"""
+    def plan(view):
+        if student_id not in view["students"]:
+            return False, []
+        return True, [change("delete", ["students", student_id]), change("delete", ["grades", student_id])]
+    
+    return (store or STORE).update(plan, ["students"])
+
+def add_student_grade(student_id: str, subject: str, grade: float, teacher: str, comment: Optional[str] = None,
+                      store: Optional[storage.Engine] = None) -> Optional[Dict]:
+    """Add a grade for a student; a comment of None leaves the key out of the entry"""
     grade_entry = {
         "grade": grade,
         "teacher": teacher,
         "date": datetime.now().isoformat()
     }
+    if comment is not None:
+        grade_entry["comment"] = comment
     
-    grades[student_id][subject].append(grade_entry)
-    save_grades(grades)
+    def plan(view):
+        grades = view["grades"]
+        if student_id not in grades or subject not in grades[student_id]:
+            return None, []
+        return grade_entry, [change("append", ["grades", student_id, subject], grade_entry)]
     
-    return grade_entry
+    return (store or STORE).update(plan, ["grades"], student_id)
+
+# Columns of a bulk grade import, in CSV order
+GRADE_ROW_FIELDS = ["student_id", "subject", "grade", "teacher", "comment"]
+
+def read_grade_rows(lines: Iterable[str]) -> Tuple[List[Dict], List[Dict]]:
+    """Parse CSV or JSON-lines grade rows into (rows, errors).
+
+    JSON lines are objects with the GRADE_ROW_FIELDS keys; anything else is
+    read as CSV in GRADE_ROW_FIELDS order, with an optional header row. Every
+    row and error carries its line number.
+    """
+    lines = iter(lines)
+    first = ""
+    for first in lines:
+        if first.strip():
+            break
+    if not first.strip():
+        return [], []
+
+    def rest():
+        yield first
+        yield from lines
 
-def get_student_grades(student_id: str) -> Optional[Dict]:
+    rows = []
+    errors = []
+    if first.lstrip().startswith("{"):
+        for number, line in enumerate(rest(), 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                errors.append({"row": number, "error": f"Invalid JSON: {e}"})
+                continue
+            if not isinstance(row, dict):
+                errors.append({"row": number, "error": "Expected a JSON object"})
+                continue
+            row["row"] = number
+            rows.append(row)
+        return rows, errors
+
+    reader = csv.reader(rest())
+    for values in reader:
+        if not values or not any(v.strip() for v in values):
+            continue
+        if reader.line_num == 1 and values[0].strip().lower() == "student_id":
+            continue
+        row = dict(zip(GRADE_ROW_FIELDS, (v.strip() for v in values)))
+        row["row"] = reader.line_num
+        rows.append(row)
+    return rows, errors
+
+def _check_grade_row(row: Dict) -> Dict:
+    # Raises ValueError describing the first problem with the row
+    for field in ("student_id", "subject", "teacher"):
+        if not isinstance(row.get(field), str) or not row[field]:
+            raise ValueError(f"Missing {field}")
+    try:
+        grade = float(row.get("grade"))
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid grade: {row.get('grade')!r}")
+    if math.isnan(grade) or not 0 <= grade <= 100:
+        raise ValueError(f"Grade out of range 0-100: {row['grade']!r}")
+    comment = row.get("comment")
+    if comment is not None and not isinstance(comment, str):
+        raise ValueError("Comment must be text")
+    return {
+        "student_id": row["student_id"],
+        "subject": row["subject"],
+        "grade": grade,
+        "teacher": row["teacher"],
+        "comment": comment or None
+    }
+
+def add_grades_bulk(rows: Iterable[Dict], strict: bool = False, store: Optional[storage.Engine] = None) -> Dict:
+    """Add many grades with a single load and a single save.
+
+    Rows are dicts with the GRADE_ROW_FIELDS keys and optionally the "row"
+    number to report errors against (defaults to the position). Invalid rows
+    and rows for unknown students or subjects are reported in "errors"; the
+    rest are added, unless strict is set, in which case nothing is added if
+    any row fails.
+    """
+    valid = []
+    errors = []
+    for position, row in enumerate(rows, 1):
+        number = row.get("row", position)
+        try:
+            valid.append((number, _check_grade_row(row)))
+        except ValueError as e:
+            errors.append({"row": number, "error": str(e)})
+    
+    not_found = "Student or subject not found"
+    
+    if strict and errors:
+        return {"added": 0, "errors": errors}
+    
+    date = datetime.now().isoformat()
+    
+    def plan(view):
+        grades = view["grades"]
+        missing = []
+        changes = []
+        for number, row in valid:
+            student_id = row["student_id"]
+            subject = row["subject"]
+            if student_id not in grades or subject not in grades[student_id]:
+                missing.append({"row": number, "error": not_found})
+                continue
+            grade_entry = {"grade": row["grade"], "teacher": row["teacher"], "date": date}
+            if row["comment"] is not None:
+                grade_entry["comment"] = row["comment"]
+            changes.append(change("append", ["grades", student_id, subject], grade_entry))
+        if strict and missing:
+            return missing, []
+        return missing, changes
+    
+    missing = (store or STORE).update(plan, ["grades"])
+    errors = sorted(errors + missing, key=lambda e: e["row"])
+    added = 0 if strict and missing else len(valid) - len(missing)
+    return {"added": added, "errors": errors}
+
+def get_changes(since: Optional[int] = None, store: Optional[storage.Engine] = None) -> Dict:
+    """Students and grades changed after version since (see storage.Engine.changes)"""
+    return (store or STORE).changes(since)
+
+def get_student_grades(student_id: str, store: Optional[storage.Engine] = None) -> Optional[Dict]:
     """Get all grades for a student"""
-    grades = load_grades()
-    return grades.get(student_id)
+    return (store or STORE).get("grades", student_id)
 
-if __name__ == "__main__":
-    import sys
+def get_class_average(subject: str, store: Optional[storage.Engine] = None) -> Dict:
+    """Average of every grade in a subject.
+
+    The columnar store answers from the subject's grade column alone;
+    otherwise the running totals are used.
+    """
+    average, count = (store or STORE).subject_average(subject)
     
-    if len(sys.argv) < 2:
-        print("Usage: python students.py <command> [args]")
-        sys.exit(1)
+    if count == 0:
+        return {"average": 0.0, "count": 0}
+    return {"average": round(average, 2), "count": count}
+
+def _list_options(args: List[str]) -> Tuple[bool, Dict[str, Any]]:
+    """Parse `list` options into (ndjson, list_students keyword arguments)"""
+    ndjson = False
+    options: Dict[str, Any] = {"sort": None, "cursor": None, "limit": None, "fields": None}
+    i = 0
+    while i < len(args):
+        if args[i] == "--ndjson":
+            ndjson = True
+            i += 1
+            continue
+        if args[i] not in ("--limit", "--cursor", "--sort", "--fields") or i + 1 >= len(args):
+            raise ValueError(f"Unexpected argument: {args[i]}")
+        name, value = args[i][2:], args[i + 1]
+        if name == "limit":
+            value = int(value)
+            if value < 1:
+                raise ValueError("--limit must be positive")
+        elif name == "fields":
+            value = [f.strip() for f in value.split(",") if f.strip()]
+        options[name] = value
+        i += 2
+    return ndjson, options
+
+def run_command(args: List[str]) -> Tuple[str, int]:
+    """Run a CLI command and return its output and exit code"""
+    if len(args) < 1:
+        return "Usage: python students.py <command> [args]", 1
     
-    command = sys.argv[1]
+    command = args[0]
     
     if command == "init":
         init_students_db()
-        print(json.dumps({"success": True, "message": "Students database initialized"}))
+        return json.dumps({"success": True, "message": "Students database initialized"}), 0
     
     elif command == "add":
-        if len(sys.argv) < 5:
-            print(json.dumps({"success": False, "error": "Name, surname, and age required"}))
-            sys.exit(1)
+        if len(args) < 4:
+            return json.dumps({"success": False, "error": "Name, surname, and age required"}), 1
         
-        name = sys.argv[2]
-        surname = sys.argv[3]
-        age = int(sys.argv[4])
-        student = create_student(name, surname, age)
-        print(json.dumps({"success": True, "student": student}))
+        name = args[1]
+        surname = args[2]
+        age = int(args[3])
+        parent_id = args[4] if len(args) > 4 else None
+        student = create_student(name, surname, age, parent_id)
+        return json.dumps({"success": True, "student": student}), 0
     
     elif command == "list":
-        students = get_all_students()
-        print(json.dumps({"success": True, "students": students}))
+        if len(args) == 1:
+            students = get_all_students()
+            return json.dumps({"success": True, "students": students}), 0
+        
+        try:
+            ndjson, options = _list_options(args[1:])
+            rows = list_students(**options)
+            if ndjson:
+                return "\n".join(json.dumps(row) for row in rows), 0
+            
+            students = list(rows)
+            page = {"success": True, "students": students}
+            if options["limit"] is not None:
+                page.update(students.pop())
+            return json.dumps(page), 0
+        except ValueError as e:
+            return json.dumps({"success": False, "error": str(e)}), 1
     
     elif command == "get":
-        if len(sys.argv) < 3:
-            print(json.dumps({"success": False, "error": "Student ID required"}))
-            sys.exit(1)
+        if len(args) < 2:
+            return json.dumps({"success": False, "error": "Student ID required"}), 1
         
-        student_id = sys.argv[2]
+        student_id = args[1]
         student = get_student(student_id)
         
         if student:
-            print(json.dumps({"success": True, "student": student}))
+            return json.dumps({"success": True, "student": student}), 0
         else:
-            print(json.dumps({"success": False, "error": "Student not found"}))
+            return json.dumps({"success": False, "error": "Student not found"}), 0
+    
+    elif command == "list_for_parent":
+        if len(args) < 2:
+            return json.dumps({"success": False, "error": "Parent username required"}), 1
+        
+        return json.dumps({"success": True, "students": list_for_parent(args[1])}), 0
+    
+    elif command == "search":
+        if len(args) not in (2, 4) or args[2:3] not in ([], ["--limit"]):
+            return json.dumps({"success": False, "error": "Usage: search <query> [--limit <count>]"}), 1
+        if len(args) == 4 and not (args[3].isdigit() and int(args[3]) > 0):
+            return json.dumps({"success": False, "error": f"Invalid limit: {args[3]}"}), 1
+        
+        limit = int(args[3]) if len(args) == 4 else 10
+        return json.dumps({"success": True, **search_students(args[1], limit)}), 0
+    
+    elif command == "grades_for_parent":
+        if len(args) < 2:
+            return json.dumps({"success": False, "error": "Parent username required"}), 1
+        
+        return json.dumps({"success": True, "children": grades_for_parent(args[1])}), 0
     
     elif command == "delete":
-        if len(sys.argv) < 3:
-            print(json.dumps({"success": False, "error": "Student ID required"}))
-            sys.exit(1)
+        if len(args) < 2:
+            return json.dumps({"success": False, "error": "Student ID required"}), 1
         
-        student_id = sys.argv[2]
+        student_id = args[1]
         success = remove_student(student_id)
         
         if success:
-            print(json.dumps({"success": True, "message": "Student deleted"}))
+            return json.dumps({"success": True, "message": "Student deleted"}), 0
         else:
-            print(json.dumps({"success": False, "error": "Student not found"}))
+            return json.dumps({"success": False, "error": "Student not found"}), 0
     
     elif command == "add_grade":
-        if len(sys.argv) < 6:
-            print(json.dumps({"success": False, "error": "Student ID, subject, grade, and teacher required"}))
-            sys.exit(1)
+        if len(args) < 5:
+            return json.dumps({"success": False, "error": "Student ID, subject, grade, and teacher required"}), 1
         
-        student_id = sys.argv[2]
-        subject = sys.argv[3]
-        grade = float(sys.argv[4])
-        teacher = sys.argv[5]
+        student_id = args[1]
+        subject = args[2]
+        grade = float(args[3])
+        teacher = args[4]
         
         grade_entry = add_student_grade(student_id, subject, grade, teacher)
         
         if grade_entry:
-            print(json.dumps({"success": True, "grade": grade_entry}))
+            return json.dumps({"success": True, "grade": grade_entry}), 0
+        else:
+            return json.dumps({"success": False, "error": "Failed to add grade"}), 0
+    
+    elif command == "class_average":
+        if len(args) < 2:
+            return json.dumps({"success": False, "error": "Subject required"}), 1
+        
+        return json.dumps({"success": True, **get_class_average(args[1])}), 0
+    
+    elif command == "add_grades_bulk":
+        if len(args) < 2:
+            return json.dumps({"success": False, "error": "File (or - for stdin) required"}), 1
+        
+        strict = "--strict" in args[2:]
+        if args[1] == "-":
+            rows, errors = read_grade_rows(sys.stdin)
         else:
-            print(json.dumps({"success": False, "error": "Failed to add grade"}))
+            with open(args[1], newline="") as f:
+                rows, errors = read_grade_rows(f)
+        
+        if strict and errors:
+            return json.dumps({"success": False, "added": 0, "errors": errors}), 0
+        
+        result = add_grades_bulk(rows, strict)
+        result["errors"] = sorted(errors + result["errors"], key=lambda e: e["row"])
+        return json.dumps({"success": not (strict and result["errors"]), **result}), 0
+    
+    elif command == "changes":
+        if len(args) not in (1, 3) or args[1:2] not in ([], ["--since"]):
+            return json.dumps({"success": False, "error": "Usage: changes [--since <version>]"}), 1
+        if len(args) == 3 and not args[2].isdigit():
+            return json.dumps({"success": False, "error": f"Invalid version: {args[2]}"}), 1
+        
+        since = int(args[2]) if len(args) == 3 else None
+        return json.dumps({"success": True, **get_changes(since)}), 0
     
     elif command == "get_grades":
-        if len(sys.argv) < 3:
-            print(json.dumps({"success": False, "error": "Student ID required"}))
-            sys.exit(1)
+        if len(args) < 2:
+            return json.dumps({"success": False, "error": "Student ID required"}), 1
         
-        student_id = sys.argv[2]
+        student_id = args[1]
         grades = get_student_grades(student_id)
         
         if grades:
-            print(json.dumps({"success": True, "grades": grades}))
+            return json.dumps({"success": True, "grades": grades}), 0
         else:
-            print(json.dumps({"success": False, "error": "Student not found"}))
+            return json.dumps({"success": False, "error": "Student not found"}), 0
+    
+    return "", 0
+
+def run_streaming_command(args: List[str]) -> Tuple[str, int]:
+    """run_command, except that `list --ndjson` writes rows to stdout as they are produced"""
+    if args[:1] == ["list"] and "--ndjson" in args:
+        try:
+            _, options = _list_options(args[1:])
+            for row in list_students(**options):
+                sys.stdout.write(json.dumps(row) + "\n")
+        except ValueError as e:
+            return json.dumps({"success": False, "error": str(e)}), 1
+        return "", 0
+    return run_command(args)
+
+if __name__ == "__main__":
+    sys.exit(instrument.run_cli("students.py", run_streaming_command, sys.argv[1:]))
@@ -0,0 +1,18 @@
+"""
+The subjects every student is enrolled in, in report column order.
+
+Grade data may hold other subjects too; reports list those after these.
+"""
+
+SUBJECTS = [
+    "English",
+    "Math",
+    "Biology",
+    "Chemistry",
+    "Physics",
+    "History",
+    "Geography",
+    "Computer Science",
+    "Art",
+    "Physical Education"
+]
@@ -0,0 +1,47 @@
+"""
+Change feed of the school database, for clients that keep a copy in sync.
+
+Every commit that changes students, grades, attendance, assignments or
+submissions gets the next version number of the store. A client asks once
+without --since and gets everything with the current version, then asks
+with the last version it has seen and gets only the records changed since
+(null for deleted ones). When the answer has "full": true the client
+replaces its copy instead, which happens after the store is reset. See
+storage.Engine.changes; `students.py changes` is the same feed for the
+students.json/grades.json layout.
+
+Usage:
+    python3 scripts/sync.py version
+    python3 scripts/sync.py changes [--since <version>]
+"""
+
+import instrument  # first, so the import phase covers the other imports
+import json
+import sys
+from typing import List, Tuple
+import database
+
+def run_command(args: List[str]) -> Tuple[str, int]:
+    """Run a CLI command and return its output and exit code"""
+    if len(args) < 1:
+        return json.dumps({"success": False, "error": "Usage: python sync.py changes [--since <version>]"}), 1
+
+    command = args[0]
+
+    if command == "version":
+        version, _ = database.STORE.changed_since(None)
+        return json.dumps({"success": True, "version": version}), 0
+
+    elif command == "changes":
+        if len(args) not in (1, 3) or args[1:2] not in ([], ["--since"]):
+            return json.dumps({"success": False, "error": "Usage: changes [--since <version>]"}), 1
+        if len(args) == 3 and not args[2].isdigit():
+            return json.dumps({"success": False, "error": f"Invalid version: {args[2]}"}), 1
+
+        since = int(args[2]) if len(args) == 3 else None
+        return json.dumps({"success": True, **database.get_changes(since)}), 0
+
+    return json.dumps({"success": False, "error": "Unknown command"}), 1
+
+if __name__ == "__main__":
+    sys.exit(instrument.run_cli("sync.py", run_command, sys.argv[1:]))
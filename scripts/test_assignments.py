@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Tests for assignment indexes, pagination and submission summaries.
+"""
+
+import json
+
+import pytest
+
+import assignments
+import database
+import storage
+from jsonstore import change
+
+def test_pages_follow_the_cursor_through_an_index(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    database.init_db()
+    for i, (subject, teacher, due) in enumerate([
+        ("Math", "MathTeacher", "2025-10-03"),
+        ("Art", "ArtTeacher", "2025-10-01"),
+        ("Math", "MathTeacher", "2025-10-01"),
+        ("Math", "MathTeacher", "2025-10-02"),
+    ]):
+        assignments.create_assignment(f"Homework {i}", "", subject, due, teacher)
+
+    first, cursor = assignments.query_assignments(created_by="MathTeacher", by_due_date=True, limit=2)
+    second, end = assignments.query_assignments(created_by="MathTeacher", by_due_date=True, limit=2, after=cursor)
+
+    assert [a["title"] for a in first + second] == ["Homework 2", "Homework 3", "Homework 0"]
+    assert end is None
+
+    art, _ = assignments.query_assignments(subject="Art")
+    assert database.load_db()["assignmentIndex"]["subject"]["Art"] == [art[0]["id"]]
+
+def test_the_assignment_index_follows_changed_assignments(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    database.init_db()
+    ids = [json.loads(assignments.create_assignment(f"Homework {i}", "", subject, "2025-10-01", "MathTeacher"))["id"]
+           for i, subject in enumerate(["Math", "Art", "Math"])]
+
+    # Moved to Math, it goes between the two it was created between
+    database.update_db(lambda db: (None, [change("set", ["assignments", ids[1], "subject"], "Math")]))
+    index = database.load_db()["assignmentIndex"]
+    assert index["subject"] == {"Math": ids}
+    assert index == storage.build_assignment_index(database.load_db()["assignments"])
+
+    page, cursor = assignments.query_assignments(subject="Math", limit=1, after=ids[0])
+    assert [a["id"] for a in page] == [ids[1]] and cursor == ids[1]
+    with pytest.raises(ValueError):
+        assignments.query_assignments(after="assignment_unknown")
+
+def test_assignment_submissions_are_summarised(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    database.init_db()
+    assignment = json.loads(assignments.create_assignment("Essay", "", "English", "2000-01-01", "EnglishTeacher"))
+    other = json.loads(assignments.create_assignment("Poem", "", "English", "2000-01-01", "EnglishTeacher"))
+
+    assignments.update_submission("student_1", other["id"], "submitted")
+    assignments.update_submission("student_1", assignment["id"], "pending")
+    assignments.update_submission("student_2", assignment["id"], "late", 55)
+    assignments.update_submission("student_1", assignment["id"], "graded", 92)
+
+    summary = json.loads(assignments.get_assignment_submissions(assignment["id"]))
+
+    assert summary["total"] == 2
+    assert summary["statusCounts"] == {"graded": 1, "late": 1}
+    assert summary["late"] == 1
+    assert summary["grades"]["distribution"]["90-100"] == 1
+    assert summary["grades"]["average"] == 73.5
+    assert database.load_db()["submissionIndex"][assignment["id"]] == {"student_1": 1, "student_2": 0}
+
+    # Removing a student's submissions drops them from the index
+    database.update_db(lambda db: (None, [change("delete", ["submissions", "student_2"])]))
+    assert database.load_db()["submissionIndex"] == {assignment["id"]: {"student_1": 1}, other["id"]: {"student_1": 0}}
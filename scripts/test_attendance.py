@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Tests for date-range attendance queries.
+"""
+
+import json
+
+import attendance
+import database
+import storage
+from jsonstore import change
+
+def _record(date, status, subject):
+    return {"date": date, "status": status, "subject": subject, "teacher": "MathTeacher", "notes": ""}
+
+def test_stats_and_get_honour_date_range_and_subject(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    database.init_db()
+    # Imported records are not necessarily in date order
+    records = [
+        _record("2025-09-03T09:00:00", "present", "Math"),
+        _record("2025-09-01T09:00:00", "absent", "Math"),
+        _record("2025-09-02T09:00:00", "late", "Art"),
+        _record("2025-10-01T09:00:00", "present", "Math"),
+    ]
+    database.update_db(lambda db: (None, [change("set", ["attendance", "student_1"], records)]))
+
+    stats = json.loads(attendance.get_attendance_stats("student_1", "Math", "2025-09-01", "2025-09-30"))
+    assert stats == {"present": 1, "absent": 1, "late": 0, "total": 2, "percentage": 50.0}
+
+    september = json.loads(attendance.get_attendance("student_1", start="2025-09-02", end="2025-09-03"))
+    assert [r["date"] for r in september] == ["2025-09-02T09:00:00", "2025-09-03T09:00:00"]
+
+    output, status = attendance.run_command(["stats", "student_1", "--from", "2025-09-15"])
+    assert status == 0 and json.loads(output)["total"] == 1
+
+def test_the_date_index_is_stored_and_follows_appends(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    database.init_db()
+    database.update_db(lambda db: (None, [change("set", ["attendance", "student_1"],
+                                                 [_record("2025-09-02T09:00:00", "present", "Math"),
+                                                  _record("2025-09-01T09:00:00", "absent", "Art")])]))
+    database.STORE.append("attendance", ["student_1"], _record("2025-09-03T09:00:00", "late", "Math"))
+    # Dated before the last Math record, so the student's entry is built again
+    database.STORE.append("attendance", ["student_1"], _record("2025-09-01T10:00:00", "present", "Math"))
+
+    db = database.load_db()
+    assert db["attendanceIndex"] == storage.build_attendance_index(db["attendance"])
+    assert db["attendanceIndex"]["student_1"]["Math"]["positions"] == [3, 0, 2]
+
+    # Queries read the stored index rather than sorting the records
+    def unsorted(records):
+        raise AssertionError("sorted the records")
+
+    monkeypatch.setattr(storage, "build_student_dates", unsorted)
+    stats = json.loads(attendance.get_attendance_stats("student_1", "Math", "2025-09-02"))
+    assert stats == {"present": 1, "absent": 0, "late": 1, "total": 2, "percentage": 50.0}
+    assert [r["status"] for r in json.loads(attendance.get_attendance("student_1", start="2025-09-01T10:00:00"))] == \
+        ["present", "present", "late"]
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Tests for password hashing and login sessions.
+"""
+
+import json
+import time
+
+import auth
+from sessions import SessionStore
+
+def test_login_upgrades_plain_passwords_and_issues_tokens(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    auth.init_auth_db()
+
+    output, _ = auth.run_command(["login", "MathTeacher", "Math"])
+    session = json.loads(output)
+
+    stored = auth.load_users()["MathTeacher"]["password"]
+    assert stored.startswith("pbkdf2_sha256$")
+    assert auth.authenticate("MathTeacher", "Math") is not None
+    assert auth.authenticate("MathTeacher", "math") is None
+
+    output, _ = auth.run_command(["verify_token", session["token"]])
+    assert json.loads(output)["user"]["username"] == "MathTeacher"
+    auth.run_command(["logout", session["token"]])
+    output, _ = auth.run_command(["verify_token", session["token"]])
+    assert json.loads(output)["success"] is False
+
+def test_session_store_expires_and_evicts(tmp_path):
+    path = str(tmp_path / "sessions.json")
+    store = SessionStore(path, ttl=60, capacity=2)
+    first, _ = store.create({"username": "a"})
+    second, _ = store.create({"username": "b"})
+    store.get(first)
+    third, _ = store.create({"username": "c"})
+
+    # The least recently used session made room for the new one
+    assert store.get(second) is None
+    assert store.get(first) == {"username": "a"}
+
+    # Another process sees the persisted sessions
+    assert SessionStore(path, ttl=60, capacity=2).get(third) == {"username": "c"}
+
+    expired = SessionStore(str(tmp_path / "short.json"), ttl=0, capacity=2)
+    token, _ = expired.create({"username": "d"})
+    time.sleep(0.01)
+    assert expired.get(token) is None
+
+def test_eviction_follows_uses_seen_in_other_processes(tmp_path):
+    path = str(tmp_path / "sessions.json")
+    store = SessionStore(path, ttl=60, capacity=2, touch=0)
+    first, _ = store.create({"username": "a"})
+    second, _ = store.create({"username": "b"})
+
+    # Used through another process only: this one learns of it from the file
+    assert SessionStore(path, ttl=60, capacity=2, touch=0).get(first) == {"username": "a"}
+    store.create({"username": "c"})
+    assert store.get(second) is None
+    assert store.get(first) == {"username": "a"}
+
+def test_account_changes_reach_open_sessions(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    auth.init_auth_db()
+    math = json.loads(auth.run_command(["login", "MathTeacher", "Math"])[0])["token"]
+    art = json.loads(auth.run_command(["login", "ArtTeacher", "Art"])[0])["token"]
+
+    users = {username: dict(user) for username, user in auth.load_users().items() if username != "ArtTeacher"}
+    users["MathTeacher"]["name"] = "Head of Math"
+    auth.save_users(users)
+
+    assert json.loads(auth.run_command(["verify_token", math])[0])["user"]["name"] == "Head of Math"
+    assert json.loads(auth.run_command(["verify_token", art])[0])["success"] is False
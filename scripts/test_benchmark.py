@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Tests for the synthetic school generator and benchmark harness.
+"""
+
+import benchmark
+import database
+import gpa
+
+def test_generated_schools_are_deterministic():
+    first = benchmark.generate_school(20, years=2, seed=7)
+    assert benchmark.generate_school(20, years=2, seed=7) == first
+    assert benchmark.generate_school(20, years=2, seed=8) != first
+    assert benchmark.record_counts(first) == {
+        "students": 20, "grades": 20 * 10 * 2 * benchmark.GRADES_PER_YEAR,
+        "attendance": 20 * 2 * benchmark.ATTENDANCE_PER_YEAR, "assignments": 10 * 2 * benchmark.ASSIGNMENTS_PER_YEAR,
+        "submissions": 10 * 2 * benchmark.ASSIGNMENTS_PER_YEAR * 20
+    }
+
+def test_benchmark_reports_percentiles_and_memory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    result = benchmark.benchmark_school(20, repeat=3, only=["gpa.calculate_gpa", "database.add_grade"])
+
+    assert gpa.check_aggregates() == {database.DATA_FILE: [], "data/grade_totals.json": []}
+    assert [(r["name"], r["mode"], r["n"]) for r in result["results"]] == [
+        ("database.add_grade", "inprocess", 3), ("gpa.calculate_gpa", "inprocess", 3)
+    ]
+    for r in result["results"]:
+        assert r["ms"]["min"] <= r["ms"]["p50"] <= r["ms"]["p99"] <= r["ms"]["max"]
+        assert r["peakBytes"] > 0
+
+def test_percentile_interpolates():
+    assert benchmark.percentile([1.0, 2.0, 3.0, 4.0], 50) == 2.5
+    assert benchmark.percentile([5.0], 99) == 5.0
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Tests for the columnar grade store.
+"""
+
+import columnar
+import storage
+import students
+
+def test_columnar_store_round_trips_grades_and_averages_from_the_column(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(students, "GRADE_STORE", "columnar")
+    monkeypatch.setattr(students, "GRADES_FILE", "data/grades.col")
+    monkeypatch.setattr(students, "STORE", storage.FilesEngine({
+        "students": students.STUDENTS_FILE, "grades": "data/grades.col", "aggregates": students.TOTALS_FILE
+    }))
+    students.init_students_db()
+    students.create_student("Emma", "Johnson", 15)
+    students.create_student("Michael", "Brown", 16)
+    students.add_student_grade("student_1", "Math", 88.3, "MathTeacher")
+    students.add_grades_bulk([
+        {"student_id": "student_1", "subject": "Math", "grade": 91, "teacher": "MathTeacher", "comment": "Très bien"},
+        {"student_id": "student_2", "subject": "Math", "grade": 70, "teacher": "MathTeacher"},
+        {"student_id": "student_2", "subject": "Art", "grade": 60, "teacher": "ArtTeacher"},
+    ])
+
+    math = students.get_student_grades("student_1")["Math"]
+    assert [e["grade"] for e in math] == [88.3, 91.0]
+    assert math[1]["comment"] == "Très bien" and "comment" not in math[0]
+    assert math[0]["teacher"] == "MathTeacher" and len(math[0]["date"]) == 19
+    assert students.get_class_average("Math") == {"average": 83.1, "count": 3}
+
+    # A reused ID starts over: the old student's rows drop out of the column scan
+    students.remove_student("student_2")
+    students.create_student("Olivia", "Davis", 15)
+    students.add_student_grade("student_2", "Math", 50, "MathTeacher")
+    assert students.get_class_average("Math") == {"average": 76.43, "count": 3}
+    assert students.get_student_grades("student_2")["Art"] == []
+
+    before = students.load_grades()
+    columnar.compact("data/grades.col")
+    assert students.load_grades() == before
+    assert columnar.subject_average("data/grades.col", "Art") == (None, 0)
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Tests for the school-wide GPA table.
+"""
+
+import pytest
+
+import database
+import gpa
+
+def _school(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    database.init_db()
+    for name in ("Emma", "Michael", "Olivia", "Liam"):
+        database.add_student(name, "Smith", 15)
+    for student_id, subject, grade in [("student_1", "Math", 90), ("student_1", "Art", 70),
+                                       ("student_2", "Math", 80), ("student_2", "Art", 80),
+                                       ("student_3", "Math", 95), ("student_3", "History", 40)]:
+        database.add_grade(student_id, subject, grade, "MathTeacher")
+
+def test_table_ranks_students_and_subjects(tmp_path, monkeypatch):
+    monkeypatch.setattr(gpa, "_numpy", lambda: None)
+    _school(tmp_path, monkeypatch)
+    table = gpa.gpa_table()
+
+    assert [(row["studentId"], row["gpa"], row["rank"]) for row in table] == [
+        ("student_1", 80.0, 1), ("student_2", 80.0, 1), ("student_3", 67.5, 3), ("student_4", 0.0, None)]
+    assert table[2]["subjects"] == {"Math": {"average": 95.0, "rank": 1}, "History": {"average": 40.0, "rank": 1}}
+    assert table[0]["percentile"] == 50.0 and table[3]["percentile"] is None
+
+def test_numpy_table_matches_plain_python(tmp_path, monkeypatch):
+    numpy = pytest.importorskip("numpy")
+    _school(tmp_path, monkeypatch)
+    monkeypatch.setattr(gpa, "_numpy", lambda: numpy)
+    vectorized = gpa.gpa_table()
+    monkeypatch.setattr(gpa, "_numpy", lambda: None)
+    assert vectorized == gpa.gpa_table()
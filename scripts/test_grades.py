@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tests for grade trend series.
+"""
+
+import json
+from collections import OrderedDict
+
+import database
+import grades
+import jsonstore
+import students
+
+def _grade(day, grade):
+    return {"grade": grade, "teacher": "MathTeacher", "date": f"{day}T10:00:00"}
+
+def test_buckets_start_on_mondays_months_and_terms():
+    assert grades.bucket_start("2025-10-09T08:30:00", "week") == "2025-10-06"
+    assert grades.bucket_start("2025-10-09", "month") == "2025-10-01"
+    assert grades.bucket_start("2025-10-09", "term") == "2025-09-01"
+    assert grades.bucket_start("2026-03-31", "term") == "2026-01-01"
+
+def test_trend_series_aggregate_each_bucket_with_a_rolling_average(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    database.init_db()
+    student_id = database.add_student("Emma", "Johnson", 15)["id"]
+    database.STORE.put("grades", student_id, {"Math": [
+        _grade("2025-09-02", 60), _grade("2025-09-20", 80), _grade("2025-10-01", 90),
+        {"grade": 10, "teacher": "MathTeacher"}, _grade("2025-11-15", 100), _grade("2026-01-05", 50)
+    ], "Art": []})
+
+    trend = grades.grade_trend(student_id, bucket="month", window=2)
+    assert trend["subjects"]["Art"] == []
+    assert trend["subjects"]["Math"] == [
+        {"bucket": "2025-09-01", "mean": 70.0, "min": 60, "max": 80, "count": 2, "rolling": 70.0},
+        {"bucket": "2025-10-01", "mean": 90.0, "min": 90, "max": 90, "count": 1, "rolling": 76.67},
+        {"bucket": "2025-11-01", "mean": 100.0, "min": 100, "max": 100, "count": 1, "rolling": 95.0},
+        {"bucket": "2026-01-01", "mean": 50.0, "min": 50, "max": 50, "count": 1, "rolling": 75.0},
+    ]
+    terms = grades.grade_trend(student_id, "Math", "term")["subjects"]["Math"]
+    assert [(p["bucket"], p["count"]) for p in terms] == [("2025-09-01", 4), ("2026-01-01", 1)]
+
+    output, code = grades.run_command(["trend", student_id, "--bucket", "year"])
+    assert code == 1 and json.loads(output)["error"] == "Unknown bucket: year"
+    assert json.loads(grades.run_command(["trend", "student_9"])[0]) == {"success": False, "error": "Student not found"}
+
+def test_cached_totals_take_in_only_new_grades(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(grades, "_totals", OrderedDict())
+    monkeypatch.setattr(jsonstore, "_cache_enabled", True)
+    jsonstore.clear_cache()
+    database.init_db()
+    student_id = database.add_student("Emma", "Johnson", 15)["id"]
+    for grade in (70, 80):
+        students.add_student_grade(student_id, "Math", grade, "MathTeacher", store=database.STORE)
+    assert grades.grade_trend(student_id, "Math")["subjects"]["Math"][0]["count"] == 2
+
+    added = []
+    add = grades._add
+    monkeypatch.setattr(grades, "_add", lambda totals, entries: (added.append(len(entries)), add(totals, entries)))
+    students.add_student_grade(student_id, "Math", 90, "MathTeacher", store=database.STORE)
+    point = grades.grade_trend(student_id, "Math")["subjects"]["Math"][0]
+    assert (point["count"], point["mean"], added) == (3, 80.0, [1])
+
+    # Anything but an append counts the grades again
+    database.STORE.put("grades", student_id, {"Math": [_grade("2025-09-02", 40)]})
+    assert grades.grade_trend(student_id, "Math")["subjects"]["Math"][0]["mean"] == 40.0
+    assert added == [1, 1]
+    jsonstore.clear_cache()
+
+def test_cached_totals_are_bounded(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(grades, "CACHED_TOTALS", 2)
+    monkeypatch.setattr(grades, "_totals", OrderedDict())
+    monkeypatch.setattr(jsonstore, "_cache_enabled", True)
+    jsonstore.clear_cache()
+    database.init_db()
+    student_id = database.add_student("Emma", "Johnson", 15)["id"]
+    for subject in ("Math", "Art", "Math", "History"):
+        students.add_student_grade(student_id, subject, 80, "MathTeacher", store=database.STORE)
+        grades.grade_trend(student_id, subject)
+    assert list(grades._totals) == [(student_id, "Math"), (student_id, "History")]
+    jsonstore.clear_cache()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Tests for the opt-in command instrumentation.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import instrument
+
+SCRIPTS = os.path.dirname(os.path.abspath(__file__))
+
+def _run(tmp_path, *args, env=None):
+    return subprocess.run([sys.executable, os.path.join(SCRIPTS, args[0]), *args[1:]], cwd=tmp_path,
+                          capture_output=True, text=True, env={**os.environ, **(env or {})})
+
+def test_profile_flag_reports_phases_and_counters(tmp_path):
+    _run(tmp_path, "students.py", "add", "Ada", "Lovelace", "12")
+    result = _run(tmp_path, "students.py", "list", "--profile")
+
+    assert result.returncode == 0
+    assert json.loads(result.stdout)["success"]
+    metrics = json.loads(result.stderr.strip().splitlines()[-1])
+    assert metrics["script"] == "students.py" and metrics["command"] == "list" and metrics["exitCode"] == 0
+    assert set(metrics["ms"]) == set(instrument.PHASES) | {"total"}
+    assert metrics["ms"]["import"] > 0
+    assert sum(v for k, v in metrics["ms"].items() if k != "total") <= metrics["ms"]["total"] + 0.01
+    assert metrics["bytesRead"] > 0 and metrics["records"]["filesRead"] >= 1
+
+def test_metrics_file_collects_one_line_per_command(tmp_path):
+    metrics_file = str(tmp_path / "metrics.jsonl")
+    env = {"SCHOOL_PROFILE": metrics_file, "SCHOOL_STORAGE": "wal"}
+    added = _run(tmp_path, "students.py", "add", "Ada", "Lovelace", "12", env=env)
+    listed = _run(tmp_path, "students.py", "list", env=env)
+
+    assert added.stderr == "" and listed.stderr == ""
+    with open(metrics_file) as f:
+        lines = [json.loads(line) for line in f]
+    assert [line["command"] for line in lines] == ["add", "list"]
+    assert lines[0]["engine"] == "wal"
+    assert lines[0]["bytesWritten"] > 0 and lines[0]["records"]["changesWritten"] > 0
+    assert lines[1]["records"]["logRecordsReplayed"] > 0
+
+def test_disabled_by_default(tmp_path):
+    env = {k: v for k, v in os.environ.items() if k != "SCHOOL_PROFILE"}
+    result = subprocess.run([sys.executable, os.path.join(SCRIPTS, "students.py"), "list"], cwd=tmp_path,
+                            capture_output=True, text=True, env=env)
+    assert result.returncode == 0 and result.stderr == ""
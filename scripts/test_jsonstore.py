@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Tests for the cached, read-only JSON document store.
+"""
+
+import copy
+import json
+import os
+import threading
+import time
+
+import jsonstore
+from jsonstore import change, read_json, update, updated
+
+def test_cache_reuses_parsed_file_until_it_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(jsonstore, "_cache_enabled", True)
+    monkeypatch.setattr(jsonstore, "_cache", {})
+    path = str(tmp_path / "grades.json")
+    with open(path, "w") as f:
+        json.dump({"student_1": {"Math": []}}, f)
+
+    first = read_json(path)
+    assert read_json(path) is first
+
+    # Rewritten by another process: same mtime is possible, size differs
+    stat = os.stat(path)
+    with open(path, "w") as f:
+        json.dump({"student_1": {"Math": [{"grade": 90}]}}, f)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    second = read_json(path)
+    assert second is not first
+    assert second["student_1"]["Math"] == [{"grade": 90}]
+
+def test_cached_documents_are_read_only(tmp_path, monkeypatch):
+    monkeypatch.setattr(jsonstore, "_cache_enabled", True)
+    monkeypatch.setattr(jsonstore, "_cache", {})
+    path = str(tmp_path / "students.json")
+    with open(path, "w") as f:
+        json.dump({"student_1": {"name": "Emma"}}, f)
+
+    students = read_json(path)
+    for modify in (
+        lambda: students.__setitem__("student_2", {}),
+        lambda: students["student_1"].update(name="Sarah"),
+        lambda: students.pop("student_1"),
+    ):
+        try:
+            modify()
+        except TypeError:
+            pass
+        else:
+            raise AssertionError("cached document was modified")
+
+    # Copies are plain and modifiable
+    mutable = copy.deepcopy(students)
+    mutable["student_1"]["name"] = "Sarah"
+    assert read_json(path)["student_1"]["name"] == "Emma"
+
+def test_updated_copies_only_the_changed_path():
+    original = jsonstore.freeze({
+        "grades": {
+            "student_1": {"Math": [{"grade": 80}], "Art": []},
+            "student_2": {"Math": []}
+        }
+    })
+
+    new = updated(original, change("append", ["grades", "student_1", "Math"], {"grade": 90}))
+
+    assert [g["grade"] for g in new["grades"]["student_1"]["Math"]] == [80, 90]
+    assert [g["grade"] for g in original["grades"]["student_1"]["Math"]] == [80]
+    assert new["grades"]["student_2"] is original["grades"]["student_2"]
+    assert new["grades"]["student_1"]["Art"] is original["grades"]["student_1"]["Art"]
+    assert isinstance(new["grades"]["student_1"]["Math"][1], jsonstore.FrozenDict)
+
+def test_update_writes_changes_and_refreshes_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(jsonstore, "_cache_enabled", True)
+    monkeypatch.setattr(jsonstore, "_cache", {})
+    path = str(tmp_path / "database.json")
+    with open(path, "w") as f:
+        json.dump({"students": {"student_1": {"name": "Emma"}}}, f)
+
+    db = read_json(path)
+    result = update(path, lambda current: ("done", [
+        change("set", ["students", "student_2"], {"name": "Michael"}),
+        change("delete", ["students", "student_1"])
+    ]), lambda: read_json(path))
+
+    assert result == "done"
+    assert list(read_json(path)["students"]) == ["student_2"]
+    assert list(db["students"]) == ["student_1"]
+    with open(path) as f:
+        assert json.load(f) == {"students": {"student_2": {"name": "Michael"}}}
+
+def test_write_json_keeps_the_mode_of_the_file_it_replaces(tmp_path):
+    umask = os.umask(0o022)
+    try:
+        new = str(tmp_path / "new.json")
+        jsonstore.write_json(new, {})
+        assert os.stat(new).st_mode & 0o777 == 0o644
+
+        for mode in (0o640, 0o664):
+            os.chmod(new, mode)
+            jsonstore.write_json(new, {"mode": mode})
+            assert os.stat(new).st_mode & 0o777 == mode
+    finally:
+        os.umask(umask)
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+def test_concurrent_updates_are_not_lost(tmp_path, monkeypatch):
+    monkeypatch.setattr(jsonstore, "_cache", {})
+    path = str(tmp_path / "grades.json")
+    with open(path, "w") as f:
+        json.dump({"student_1": {"Math": []}}, f)
+
+    writes = []
+    write_json = jsonstore.write_json
+    monkeypatch.setattr(jsonstore, "write_json", lambda p, d: (writes.append(p), write_json(p, d)))
+
+    def add(grade):
+        update(path, lambda grades: (None, [change("append", ["student_1", "Math"], {"grade": grade})]),
+               lambda: read_json(path))
+
+    # Hold the lock as another process would while the writers queue up
+    threads = [threading.Thread(target=add, args=(grade,)) for grade in range(50)]
+    with jsonstore.locked(path):
+        for thread in threads:
+            thread.start()
+        time.sleep(0.2)
+    for thread in threads:
+        thread.join()
+
+    with open(path) as f:
+        grades = json.load(f)["student_1"]["Math"]
+    assert sorted(g["grade"] for g in grades) == list(range(50))
+    # Writers queued behind the lock were flushed together
+    assert len(writes) <= 3
+
+def test_transaction_writes_each_document_once_at_the_end(tmp_path, monkeypatch):
+    monkeypatch.setattr(jsonstore, "_cache", {})
+    path = str(tmp_path / "grades.json")
+    with open(path, "w") as f:
+        json.dump({"student_1": {"Math": []}}, f)
+
+    writes = []
+    write_json = jsonstore.write_json
+    monkeypatch.setattr(jsonstore, "write_json", lambda p, d: (writes.append(p), write_json(p, d)))
+
+    def add(grade):
+        return update(path, lambda grades: (len(grades["student_1"]["Math"]), [
+            change("append", ["student_1", "Math"], {"grade": grade})
+        ]), lambda: read_json(path))
+
+    with jsonstore.transaction():
+        # Each plan sees the changes of the ones before it
+        assert [add(grade) for grade in (90, 80, 70)] == [0, 1, 2]
+        assert writes == []
+    assert writes == [path]
+    assert [g["grade"] for g in read_json(path)["student_1"]["Math"]] == [90, 80, 70]
+
+    try:
+        with jsonstore.transaction():
+            add(60)
+            raise RuntimeError("abandoned")
+    except RuntimeError:
+        pass
+    assert len(read_json(path)["student_1"]["Math"]) == 3
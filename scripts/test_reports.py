@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Tests for report-card generation.
+"""
+
+import csv
+import json
+
+import assignments
+import attendance
+import database
+import gpa
+import reports
+
+def _school(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    database.init_db()
+    for name in ("Emma", "Michael", "Olivia"):
+        database.add_student(name, "Smith", 15)
+    for grade in (70, 80, 96):
+        database.add_grade("student_1", "Math", grade, "MathTeacher")
+    database.add_grade("student_1", "Art", 60, "ArtTeacher")
+    database.add_grade("student_2", "Math", 50, "MathTeacher")
+    attendance.add_attendance("student_1", "present", "Math", "MathTeacher")
+    attendance.add_attendance("student_1", "absent", "Math", "MathTeacher")
+    assignments.create_assignment("Essay", "", "Math", "2030-01-01", "MathTeacher")
+    assignments.create_assignment("Poster", "", "Art", "2030-01-01", "ArtTeacher")
+    first = next(iter(database.load_db()["assignments"]))
+    assignments.update_submission("student_1", first, "submitted")
+    return database.load_db()
+
+def test_report_cards_match_the_single_student_commands(tmp_path, monkeypatch):
+    db = _school(tmp_path, monkeypatch)
+    cards = list(reports.generate(db, jobs=1))
+
+    assert [card["studentId"] for card in cards] == ["student_1", "student_2", "student_3"]
+    emma = cards[0]
+    assert emma["gpa"] == json.loads(gpa.calculate_gpa("student_1"))["gpa"]
+    assert emma["subjects"]["Math"] == {"average": 82.0, "count": 3, "trend": 13.0}
+    assert emma["subjects"]["Art"]["trend"] is None
+    stats = json.loads(attendance.get_attendance_stats("student_1"))
+    assert emma["attendance"] == stats
+    assert emma["assignments"] == {"assigned": 2, "completed": 1, "percentage": 50.0}
+    assert cards[2]["gpa"] == 0.0 and cards[2]["subjects"] == {}
+
+def test_process_pool_streams_the_same_reports_to_disk(tmp_path, monkeypatch):
+    db = _school(tmp_path, monkeypatch)
+    expected = list(reports.generate(db, jobs=1))
+
+    result = reports.write_reports(db, combined="out/all.json", jobs=2, batch_size=1)
+    assert result == {"students": 3, "file": "out/all.json"}
+    with open("out/all.json") as f:
+        assert json.load(f) == expected
+
+    reports.write_reports(db, "csv", "out/cards", jobs=2, batch_size=2)
+    with open("out/cards/student_1.csv", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 1 and rows[0]["gpa"] == str(expected[0]["gpa"]) and rows[0]["Math trend"] == "13.0"
+
+    output, status = reports.run_command(["generate", "--combined", "out/all.csv", "--format", "csv", "--jobs", "1"])
+    assert status == 0 and json.loads(output)["students"] == 3
+    output, status = reports.run_command(["generate", "--format", "xml"])
+    assert status == 1 and "Unknown format" in output
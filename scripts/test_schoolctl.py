@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Tests for the single command-line entry point and its zipapp packaging.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import benchmark
+import schoolctl
+
+SCRIPTS = os.path.dirname(os.path.abspath(__file__))
+
+def _run(cwd, *args):
+    return subprocess.run([sys.executable, *args], cwd=cwd, capture_output=True, text=True)
+
+def test_dispatches_like_the_module_scripts(tmp_path):
+    added = _run(tmp_path, os.path.join(SCRIPTS, "schoolctl.py"), "students", "add", "Ada", "Lovelace", "12")
+    assert added.returncode == 0 and json.loads(added.stdout)["student"]["id"] == "student_1"
+
+    for args in (["students", "get", "student_1"], ["students", "get", "student_9"], ["auth", "nope"]):
+        direct = _run(tmp_path, os.path.join(SCRIPTS, f"{args[0]}.py"), *args[1:])
+        dispatched = _run(tmp_path, os.path.join(SCRIPTS, "schoolctl.py"), *args)
+        assert (dispatched.stdout, dispatched.returncode) == (direct.stdout, direct.returncode)
+
+    unknown = _run(tmp_path, os.path.join(SCRIPTS, "schoolctl.py"), "nope")
+    assert unknown.returncode == 1 and "schoolctl.py <module>" in unknown.stdout
+
+def test_imports_only_the_named_module(tmp_path):
+    code = ("import sys, schoolctl\n"
+            "try:\n"
+            "    schoolctl.main(['attendance'])\n"
+            "except SystemExit:\n"
+            "    pass\n"
+            "print(sorted(m for m in sys.modules if m in schoolctl.MODULES or m in ('passwords', 'tempfile')))\n")
+    result = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, capture_output=True, text=True,
+                            env={**os.environ, "PYTHONPATH": SCRIPTS})
+    assert result.stdout.strip().splitlines()[-1] == "['attendance']"
+
+def test_json_mode_does_not_load_sqlite(tmp_path):
+    code = ("import sys, assignments, attendance, gpa, reports\n"
+            "print(sorted(m for m in ('sqlite3', 'sqlite_store', 'students') if m in sys.modules))\n")
+    result = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, capture_output=True, text=True,
+                            env={**os.environ, "PYTHONPATH": SCRIPTS, "SCHOOL_STORAGE": "json"})
+    assert result.stdout.strip().splitlines()[-1] == "[]"
+
+def test_gpa_commands_other_than_table_do_not_load_numpy(tmp_path):
+    code = ("import sys, schoolctl\n"
+            "for args in (['gpa', 'calculate', 'student_1'], ['gpa', 'class_average', 'Math']):\n"
+            "    try:\n"
+            "        schoolctl.main(args)\n"
+            "    except SystemExit:\n"
+            "        pass\n"
+            "print(sorted(m for m in ('numpy', 'sqlite3') if m in sys.modules))\n")
+    # Keeping the caller's path, where NumPy may be installed
+    path = os.pathsep.join(filter(None, [SCRIPTS, os.environ.get("PYTHONPATH")]))
+    result = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, capture_output=True, text=True,
+                            env={**os.environ, "PYTHONPATH": path, "SCHOOL_STORAGE": "json"})
+    assert result.stdout.strip().splitlines()[-1] == "[]"
+
+def test_zipapp_runs_commands(tmp_path):
+    built = schoolctl.build(str(tmp_path / "dist" / "schoolctl.pyz"))
+    assert built["modules"] >= len(schoolctl.MODULES)
+
+    added = _run(tmp_path, built["target"], "students", "add", "Ada", "Lovelace", "12")
+    listed = _run(tmp_path, built["target"], "students", "list", "--ndjson")
+    assert added.returncode == 0
+    assert [json.loads(line)["name"] for line in listed.stdout.splitlines()] == ["Ada"]
+
+def test_startup_report_can_be_compared():
+    report = benchmark.startup(repeat=1, budget=0)
+    assert {(r["name"], r["mode"]) for r in report["startup"]} >= {("students", "script"), ("gpa", "schoolctl")}
+    assert all(r["n"] == 1 and r["peakRssBytes"] > 0 for r in report["startup"])
+    assert len(benchmark.compare(report, report)) == len(report["startup"])
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Tests for the student search index.
+"""
+
+import search
+import storage
+
+STUDENTS = {
+    "student_1": {"name": "Emma", "surname": "Johnson"},
+    "student_2": {"name": "Emmanuel", "surname": "Brown"},
+    "student_3": {"name": "Anna-Maria", "surname": "Emm"},
+    "student_12": {"name": "Jon", "surname": "Smith"},
+}
+
+def _search(query, limit=10):
+    return search.Index(storage.build_search(STUDENTS)).search(query, limit)
+
+def test_whole_words_rank_before_prefixes_and_typos():
+    assert _search("emma") == (["student_1", "student_2", "student_3"], 3)
+    assert _search("EMM") == (["student_3", "student_1", "student_2"], 3)
+    assert _search("emma", 1) == (["student_1"], 3)
+    assert _search("maria emm") == (["student_3"], 1)
+    assert _search("student_1") == (["student_1", "student_12"], 2)
+
+def test_typos_are_tolerated_in_longer_words_only():
+    # A swap of neighbours is one typo, in the whole word or in a prefix
+    assert _search("emam") == (["student_3", "student_1", "student_2"], 3)
+    assert _search("jhonson") == (["student_1"], 1)
+    assert _search("jhon") == (["student_12", "student_1"], 2)
+    assert _search("jn") == ([], 0)
+    assert _search("stduent_12") == ([], 0)
+    assert _search("") == ([], 0)
+
+def test_distance_stops_above_the_limit():
+    assert search.distance("johnson", "jhonson", 2) == 1
+    assert search.distance("kitten", "sitting", 2) == 3
+    assert search.distance("a", "abcd", 1) == 2
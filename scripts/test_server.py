@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Tests for the asyncio front end of the backend server.
+"""
+
+import asyncio
+import io
+import json
+import os
+import time
+import types
+from unittest.mock import ANY
+
+import jsonstore
+import server
+import students
+
+def test_identical_concurrent_reads_are_computed_once(monkeypatch):
+    calls = []
+
+    def run_command(args):
+        calls.append(args)
+        time.sleep(0.05)
+        return json.dumps({"success": True, "args": args}), 0
+
+    monkeypatch.setitem(server.MODULES, "students", types.SimpleNamespace(run_command=run_command))
+    backend = server.AsyncBackend()
+
+    async def burst():
+        requests = [{"id": i, "module": "students", "args": ["get_grades", "student_1"]} for i in range(10)]
+        requests.append({"id": 10, "module": "students", "args": ["get_grades", "student_2"]})
+        return await asyncio.gather(*(backend.handle(request) for request in requests))
+
+    responses = asyncio.run(burst())
+
+    assert len(calls) == 2
+    assert [r["id"] for r in responses] == list(range(11))
+    assert responses[9]["result"]["args"] == ["get_grades", "student_1"]
+    stats = backend.stats()
+    assert stats["coalesced"] == 9
+    assert stats["commands"]["students get_grades"]["requests"] == 11
+    assert stats["commands"]["students get_grades"]["p99Ms"] >= 50
+
+def test_concurrent_writes_are_committed_in_one_batch(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    students.init_students_db()
+    students.create_student("Emma", "Johnson", 15)
+    version = students.get_changes()["version"]
+    with open(students.CHANGES_FILE) as f:
+        journaled = len(f.readlines())
+
+    writes = []
+    write_json = jsonstore.write_json
+    monkeypatch.setattr(jsonstore, "write_json", lambda p, d: (writes.append(p), write_json(p, d)))
+    backend = server.AsyncBackend(flush_interval=0.05)
+
+    async def burst():
+        grades = [backend.handle({"id": grade, "module": "students",
+                                  "args": ["add_grade", "student_1", "Math", str(grade), "MathTeacher"]})
+                  for grade in range(60, 80)]
+        failed = backend.handle({"id": "x", "module": "students", "args": ["add_grade", "student_9", "Math", "1", "T"]})
+        responses = await asyncio.gather(*grades, failed)
+        # A read after the writes were answered sees them
+        after = await backend.handle({"id": "r", "module": "students", "args": ["class_average", "Math"]})
+        return responses, after
+
+    responses, after = asyncio.run(burst())
+
+    assert all(r["result"]["success"] for r in responses[:-1])
+    assert responses[-1]["result"] == {"success": False, "error": "Failed to add grade"}
+    assert after["result"]["count"] == 20
+    assert backend.stats()["flushes"] == 1
+    # One write per document, and the batch is one version of the change feed
+    assert sorted(writes) == sorted({students.GRADES_FILE, students.TOTALS_FILE})
+    with open(students.CHANGES_FILE) as f:
+        assert len(f.readlines()) == journaled + 2
+    assert students.get_changes(version) == {"version": version + 1, "full": False,
+                                             "changes": {"grades": {"student_1": ANY}}}
+
+def test_socket_round_trip(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = os.path.join(str(tmp_path), "backend.sock")
+
+    async def session():
+        serving = asyncio.ensure_future(server.serve_async(path))
+        while not os.path.exists(path):
+            await asyncio.sleep(0.01)
+        reader, writer = await asyncio.open_unix_connection(path)
+        writer.write(b'{"id": 1, "module": "students", "args": ["add", "Ada", "Lovelace", "12"]}\n'
+                     b'not json\n'
+                     b'{"id": 2, "module": "server", "args": ["stats"]}\n')
+        responses = [json.loads(await reader.readline()) for _ in range(3)]
+        writer.close()
+        serving.cancel()
+        return {r["id"]: r for r in responses}
+
+    responses = asyncio.run(session())
+
+    assert responses[1]["result"]["student"]["id"] == "student_1"
+    assert responses[None]["error"] == "Invalid JSON"
+    assert "commands" in responses[2]["result"]
+
+def test_stdin_commands_read_the_request_input_not_the_protocol_stream(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    students.init_students_db()
+    students.create_student("Emma", "Johnson", 15)
+    lines = [
+        {"id": 1, "module": "students", "args": ["add_grades_bulk", "-"]},
+        {"id": 2, "module": "students", "args": ["add_grades_bulk", "-"], "input": "student_1,Math,90,T\n"},
+        {"id": 3, "module": "students", "args": ["get_grades", "student_1"]},
+    ]
+    monkeypatch.setattr("sys.stdin", io.StringIO("".join(json.dumps(line) + "\n" for line in lines)))
+    out = io.StringIO()
+    monkeypatch.setattr("sys.stdout", out)
+
+    server.serve_stdio()
+
+    responses = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [r["id"] for r in responses] == [1, 2, 3]
+    assert responses[0]["status"] == 1 and "input" in responses[0]["error"]
+    assert responses[1]["result"]["added"] == 1
+    assert [g["grade"] for g in responses[2]["result"]["grades"]["Math"]] == [90]
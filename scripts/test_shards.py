@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Tests for per-student sharded data files.
+"""
+
+import os
+
+import attendance
+import database
+import gpa
+import shards
+import students
+
+def _read(path):
+    with open(path) as f:
+        return f.read()
+
+def test_student_writes_only_touch_their_shard(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    database.init_db()
+    database.add_student("Emma", "Johnson", 15)
+    database.add_student("Michael", "Brown", 16)
+    database.add_grade("student_2", "Math", 70, "MathTeacher")
+    before = database.load_db()
+
+    assert shards.shard(database.DATA_FILE) == {"shards": 2}
+    assert database.load_db() == before
+
+    top = _read(database.DATA_FILE)
+    other = _read(shards.shard_path(database.DATA_FILE, "student_2"))
+    database.add_grade("student_1", "Math", 90, "MathTeacher")
+    attendance.add_attendance("student_1", "present", "Math", "MathTeacher")
+    assert _read(database.DATA_FILE) == top
+    assert _read(shards.shard_path(database.DATA_FILE, "student_2")) == other
+
+    assert database.get_student_grades("student_1")["Math"][0]["grade"] == 90
+    assert gpa.get_class_average("Math") == '{"average": 80.0, "count": 2}'
+    assert gpa.check_aggregates() == {database.DATA_FILE: []}
+
+    # Removing a student goes through the whole document and drops their shard
+    database.delete_student("student_2")
+    assert [s["student"] for s in shards.list_shards(database.DATA_FILE)] == ["student_1"]
+
+    sharded = database.load_db()
+    shards.unshard(database.DATA_FILE)
+    assert not os.path.exists(shards.shard_dir(database.DATA_FILE))
+    assert database.load_db() == sharded
+
+def test_students_layout_shards_grades_and_totals(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    students.init_students_db()
+    students.create_student("Emma", "Johnson", 15)
+    shards.shard(students.GRADES_FILE)
+    shards.shard(students.TOTALS_FILE)
+
+    students.create_student("Michael", "Brown", 16)
+    students.add_student_grade("student_1", "Math", 90, "MathTeacher")
+    students.add_student_grade("student_2", "Math", 70, "MathTeacher")
+
+    assert students.get_student_grades("student_2")["Math"][0]["grade"] == 70
+    assert students.load_totals()["subjects"]["Math"] == {"count": 2, "sum": 160.0}
+    assert students.get_class_average("Math") == {"average": 80.0, "count": 2}
+    assert sorted(students.load_grades()) == ["student_1", "student_2"]
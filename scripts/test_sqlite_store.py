@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tests for the SQLite store.
+"""
+
+import json
+import sqlite3
+
+import pytest
+
+import sqlite_store
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    sqlite_store.close()
+    yield sqlite_store
+    sqlite_store.close()
+
+def _student(student_id, name):
+    return {"id": student_id, "name": name, "surname": "Smith", "age": 15, "created_at": "2025-09-01T08:00:00"}
+
+def test_import_db_replaces_everything_in_one_transaction(store, monkeypatch):
+    store.import_db({"students": {"student_1": _student("student_1", "Emma")},
+                     "grades": {"student_1": {"Math": [{"grade": 90, "teacher": "MathTeacher", "date": "2025-09-02"}]}}})
+
+    # Seen from another connection while the import is under way
+    seen = []
+    put_student = store._put_student
+
+    def observed(conn, student, subjects):
+        reader = sqlite3.connect(store.DB_FILE)
+        seen.append(reader.execute("SELECT id FROM students").fetchall())
+        reader.close()
+        put_student(conn, student, subjects)
+
+    monkeypatch.setattr(store, "_put_student", observed)
+    store.import_db({"students": {"student_2": _student("student_2", "Liam")}})
+    assert seen == [[("student_1",)]]
+    assert list(store.export_students()) == ["student_2"]
+
+    # A failed import leaves the store as it was
+    monkeypatch.setattr(store, "_put_student", lambda conn, student, subjects: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        store.import_db({"students": {"student_3": _student("student_3", "Olivia")}})
+    assert list(store.export_students()) == ["student_2"]
+
+def test_reset_collection_replaces_only_that_collection(store, monkeypatch):
+    store.import_db({"students": {"student_1": _student("student_1", "Emma"), "student_2": _student("student_2", "Liam")},
+                     "grades": {"student_1": {"Math": [{"grade": 90, "teacher": "MathTeacher", "date": "2025-09-02"}]}},
+                     "attendance": {"student_1": [{"date": "2025-09-02", "status": "present"}]}})
+
+    store.reset_collection("grades", {"student_2": {"History": [{"grade": 80, "teacher": "HistoryTeacher"}]}})
+    grades = store.export_grades()
+    assert grades["student_1"] == {subject: [] for subject in store.SUBJECTS}
+    assert [e["grade"] for e in grades["student_2"]["History"]] == [80]
+    assert store.class_average("Math")["count"] == 0
+    assert store.export_attendance() == {"student_1": [{"date": "2025-09-02", "status": "present", "subject": None,
+                                                        "teacher": None, "notes": ""}]}
+
+    # The students' grades go with them
+    store.reset_collection("students", {"student_2": _student("student_2", "Liam")})
+    assert list(store.export_students()) == ["student_2"] and list(store.export_grades()) == ["student_2"]
+
+    # A failed reset leaves the collection as it was
+    monkeypatch.setattr(store, "_upsert_student", lambda conn, student: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        store.reset_collection("students", {"student_3": _student("student_3", "Olivia")})
+    assert list(store.export_students()) == ["student_2"]
+
+def test_migrate_reports_the_split_layout_students_it_skips(store, tmp_path):
+    (tmp_path / "data").mkdir(exist_ok=True)
+    math = {"Math": [{"grade": 90, "teacher": "MathTeacher", "date": "2025-09-02"}]}
+    (tmp_path / "data" / "database.json").write_text(json.dumps({
+        "students": {"student_1": _student("student_1", "Emma")}, "grades": {"student_1": math}}))
+    (tmp_path / "data" / "students.json").write_text(json.dumps({
+        "student_1": _student("student_1", "Other"), "student_2": _student("student_2", "Liam")}))
+    (tmp_path / "data" / "grades.json").write_text(json.dumps({"student_1": math, "student_2": math}))
+
+    result = store.migrate()
+    assert result["skippedStudents"] == ["student_1"]
+    assert result["imported"]["students"] == 2 and result["imported"]["grades"] == 2
+    assert store.export_students()["student_1"]["name"] == "Emma"
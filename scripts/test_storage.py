@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Tests for the storage engines behind students.py, auth.py, database.py, assignments.py and attendance.py.
+"""
+
+import json
+import os
+
+import aggregates
+import assignments
+import attendance
+import pytest
+import sqlite_store
+import storage
+import students
+from auth import authenticate, register_parent_user, teacher_accounts
+from jsonstore import change, updated_all
+
+class MemoryEngine(storage.Engine):
+    """The smallest complete engine: every collection in a dictionary"""
+
+    def __init__(self):
+        self.data = {"users": teacher_accounts(), "students": {}, "grades": {}, "aggregates": aggregates.build({}),
+                     "parents": {}, "search": {}}
+
+    def export(self, shard=None):
+        return self.data
+
+    def view(self, collections, shard=None):
+        return self.data
+
+    def update(self, plan, collections=None, shard=None):
+        result, changes = plan(self.data)
+        self.data = updated_all(self.data, list(changes) + storage.derived_changes(self.data, changes))
+        return result
+
+    def reset(self, collection, data):
+        self.update(lambda view: (None, [change("set", [collection], data)]))
+
+@pytest.fixture(params=["document", "files", "sqlite", "memory"])
+def engine(request, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    sqlite_store.close()
+    if request.param == "document":
+        import database
+        yield storage.DocumentEngine(database.DATA_FILE, database.init_db, database.CHANGES_FILE)
+    elif request.param == "files":
+        yield storage.FilesEngine({
+            "users": "data/users.json",
+            "students": students.STUDENTS_FILE,
+            "parents": students.PARENTS_FILE,
+            "search": students.SEARCH_FILE,
+            "grades": students.GRADES_FILE,
+            "aggregates": students.TOTALS_FILE
+        }, {"users": teacher_accounts}, students.CHANGES_FILE)
+    elif request.param == "sqlite":
+        yield storage.SqliteEngine()
+    else:
+        yield MemoryEngine()
+    sqlite_store.close()
+
+def _strip_dates(value):
+    if isinstance(value, dict):
+        return {k: _strip_dates(v) for k, v in value.items() if k not in ("date", "created_at")}
+    if isinstance(value, list):
+        return [_strip_dates(v) for v in value]
+    return value
+
+def test_every_engine_runs_the_same_operations_with_the_same_results(engine):
+    assert students.create_student("Emma", "Johnson", 15, store=engine)["id"] == "student_1"
+    assert students.create_student("Michael", "Brown", 16, store=engine)["id"] == "student_2"
+    assert students.add_student_grade("student_1", "Math", 90, "MathTeacher", store=engine)["grade"] == 90
+    assert students.add_student_grade("student_1", "Math", 70, "MathTeacher", "ok", engine)["comment"] == "ok"
+    assert students.add_student_grade("student_9", "Math", 70, "MathTeacher", store=engine) is None
+    result = students.add_grades_bulk([
+        {"student_id": "student_2", "subject": "Math", "grade": 50, "teacher": "MathTeacher"},
+        {"student_id": "student_2", "subject": "Latin", "grade": 50, "teacher": "MathTeacher"},
+    ], store=engine)
+    assert result == {"added": 1, "errors": [{"row": 2, "error": "Student or subject not found"}]}
+
+    assert students.get_class_average("Math", engine) == {"average": 70.0, "count": 3}
+    assert engine.subject_averages("student_1") == {"Math": 80.0}
+    assert [s["id"] for s in students.get_all_students(engine)] == ["student_1", "student_2"]
+    assert [key for key, _ in engine.scan("students", sort="age", after=[15, "student_1"])] == ["student_2"]
+
+    # A reused ID starts over, and the totals forget the old student
+    assert students.remove_student("student_2", engine)
+    assert not students.remove_student("student_2", engine)
+    students.create_student("Olivia", "Davis", 15, store=engine)
+    assert students.get_student_grades("student_2", engine)["Math"] == []
+    assert students.get_class_average("Math", engine) == {"average": 80.0, "count": 2}
+    assert _strip_dates(students.get_student_grades("student_1", engine)["Math"]) == [
+        {"grade": 90, "teacher": "MathTeacher"},
+        {"grade": 70, "teacher": "MathTeacher", "comment": "ok"}
+    ]
+
+    assert register_parent_user("mom", "secret", "Mom", engine) is not None
+    assert register_parent_user("mom", "other", "Mom", engine) is None
+    assert authenticate("mom", "secret", engine)["role"] == "parent"
+    # A plain (seeded) password is replaced by its hash at the first login
+    assert authenticate("MathTeacher", "Math", engine)["subject"] == "Math"
+    assert engine.get("users", "MathTeacher")["password"] != "Math"
+    assert authenticate("MathTeacher", "Math", engine) is not None
+
+def test_engines_keep_the_aggregates_in_line_with_the_grades(engine):
+    students.create_student("Emma", "Johnson", 15, store=engine)
+    students.create_student("Michael", "Brown", 16, store=engine)
+    engine.append("grades", ["student_1", "Art"], {"grade": 40, "teacher": "ArtTeacher"})
+    engine.put("grades", "student_2", {"Math": [{"grade": 60, "teacher": "MathTeacher"}]})
+    engine.update(lambda view: (None, [change("delete", ["grades", "student_1", "Art"])]), ["grades"])
+
+    assert aggregates.compare(engine.load("aggregates"), aggregates.build(engine.load("grades"))) == []
+    assert engine.subject_average("Math") == (60.0, 1)
+    assert engine.subject_average("Art")[1] == 0
+
+def test_engines_keep_the_parents_index_in_line_with_the_students(engine):
+    students.create_student("Emma", "Johnson", 15, "mom", engine)
+    students.create_student("Michael", "Brown", 16, store=engine)
+    students.create_student("Olivia", "Davis", 15, "mom", engine)
+    students.add_student_grade("student_3", "Math", 90, "MathTeacher", store=engine)
+
+    assert [s["id"] for s in students.list_for_parent("mom", engine)] == ["student_1", "student_3"]
+    assert students.list_for_parent("dad", engine) == []
+    children = students.grades_for_parent("mom", engine)
+    assert [child["student"]["name"] for child in children] == ["Emma", "Olivia"]
+    assert [e["grade"] for e in children[1]["grades"]["Math"]] == [90]
+
+    # Moving or removing a child updates the index
+    engine.update(lambda view: (None, [change("set", ["students", "student_1", "parentId"], "dad")]), ["students"])
+    students.remove_student("student_3", engine)
+    assert [s["id"] for s in students.list_for_parent("dad", engine)] == ["student_1"]
+    assert students.list_for_parent("mom", engine) == []
+    assert engine.load("parents") == storage.build_parents(engine.load("students"))
+
+def test_engines_keep_the_search_index_in_line_with_the_students(engine):
+    students.create_student("Emma", "Johnson", 15, store=engine)
+    students.create_student("Emmett", "Brown", 16, store=engine)
+    students.create_student("Olivia", "Johnston", 15, store=engine)
+
+    found = students.search_students("JOHN", store=engine)
+    assert [s["id"] for s in found["students"]] == ["student_1", "student_3"] and found["total"] == 2
+    assert [s["id"] for s in students.search_students("emma johnsen", store=engine)["students"]] == ["student_1"]
+    assert [s["id"] for s in students.search_students("student_2", store=engine)["students"]] == ["student_2"]
+
+    students.remove_student("student_1", engine)
+    engine.update(lambda view: (None, [change("set", ["students", "student_2", "surname"], "Johns")]), ["students"])
+    assert [s["id"] for s in students.search_students("john", store=engine)["students"]] == ["student_2", "student_3"]
+    assert students.search_students("emma", 1, engine) == {"students": [engine.get("students", "student_2")],
+                                                           "total": 1}
+    assert engine.load("search") == storage.build_search(engine.load("students"))
+
+def test_assignments_attendance_and_gpa_checks_run_on_every_engine(engine, monkeypatch):
+    if isinstance(engine, storage.FilesEngine):
+        pytest.skip("The students.py layout keeps no assignments or attendance")
+    # As SCHOOL_STORAGE would make them
+    monkeypatch.setattr(assignments, "STORE", engine)
+    monkeypatch.setattr(attendance, "STORE", engine)
+
+    created = [json.loads(assignments.create_assignment(f"Homework {i}", "", subject, due, "MathTeacher"))["id"]
+               for i, (subject, due) in enumerate([("Math", "2025-10-03"), ("Art", "2025-10-01"),
+                                                   ("Math", "2025-10-01")])]
+    first, cursor = assignments.query_assignments(subject="Math", by_due_date=True, limit=1)
+    rest, end = assignments.query_assignments(subject="Math", by_due_date=True, limit=1, after=cursor)
+    assert [a["id"] for a in first + rest] == [created[2], created[0]] and end is None
+
+    assignments.update_submission("student_1", created[1], "submitted")
+    assignments.update_submission("student_1", created[0], "pending")
+    assignments.update_submission("student_1", created[0], "graded", 90)
+    assert [s["status"] for s in json.loads(assignments.get_student_submissions("student_1"))] == ["submitted", "graded"]
+    summary = json.loads(assignments.get_assignment_submissions(created[0]))
+    assert summary["statusCounts"] == {"graded": 1} and summary["grades"]["average"] == 90
+
+    for date, status in [("2025-09-02T09:00:00", "present"), ("2025-09-01T09:00:00", "absent")]:
+        engine.append("attendance", ["student_1"], {"date": date, "status": status, "subject": "Math",
+                                                    "teacher": "MathTeacher", "notes": ""})
+    assert [r["status"] for r in json.loads(attendance.get_attendance("student_1", "Math"))] == ["absent", "present"]
+    stats = json.loads(attendance.get_attendance_stats("student_1", "Math", "2025-09-02"))
+    assert stats == {"present": 1, "absent": 0, "late": 0, "total": 1, "percentage": 100.0}
+
+    students.create_student("Emma", "Johnson", 15, store=engine)
+    students.add_student_grade("student_1", "Math", 90, "MathTeacher", store=engine)
+    assert engine.check_aggregates() == []
+
+def test_change_feed_lists_what_changed_after_a_version(engine):
+    if isinstance(engine, MemoryEngine):
+        pytest.skip("MemoryEngine keeps no change log")
+    students.create_student("Emma", "Johnson", 15, store=engine)
+    students.create_student("Michael", "Brown", 16, store=engine)
+    first = engine.changes()
+    assert first["full"] and sorted(first["changes"]["students"]) == ["student_1", "student_2"]
+
+    students.add_student_grade("student_1", "Math", 90, "MathTeacher", store=engine)
+    students.remove_student("student_2", engine)
+    feed = engine.changes(first["version"])
+    assert not feed["full"] and feed["version"] > first["version"]
+    assert feed["changes"]["students"] == {"student_2": None}
+    assert feed["changes"]["grades"]["student_2"] is None
+    assert [e["grade"] for e in feed["changes"]["grades"]["student_1"]["Math"]] == [90]
+    assert engine.changes(feed["version"]) == {"version": feed["version"], "full": False, "changes": {}}
+
+    # After a reset, or for a version the store never had, clients start over
+    engine.reset("students", {})
+    assert engine.changes(feed["version"])["full"]
+    assert engine.changes(10 ** 6)["full"]
+
+def test_change_log_survives_a_crash_between_data_and_commit(tmp_path, monkeypatch):
+    log = storage.ChangeLog(str(tmp_path / "changes.log"))
+    log.commit(log.begin([change("set", ["students", "student_1"], {})]))
+    assert log.since(0) == (1, [("students", "student_1")])
+
+    # Begun and maybe written, never committed: reported after every version
+    log.begin([change("set", ["grades", "student_2"], {}), change("set", ["parents", "ann"], [])])
+    assert log.since(1) == (1, [("grades", "student_2")])
+
+    # Once its process is gone, the next reader commits it
+    monkeypatch.setattr(storage, "_alive", lambda pid: False)
+    assert log.since(1) == (2, [("grades", "student_2")])
+    assert log.since(2) == (2, [])
+    assert storage.ChangeLog(log.path).since(0) == (2, [("students", "student_1"), ("grades", "student_2")])
+
+def test_change_log_compacts_to_its_last_versions(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage.ChangeLog, "MAX_BYTES", 1000)
+    monkeypatch.setattr(storage.ChangeLog, "KEEP", 3)
+    log = storage.ChangeLog(str(tmp_path / "changes.log"))
+    for i in range(30):
+        log.commit(log.begin([change("delete", ["students", f"student_{i}"])]))
+
+    assert os.path.getsize(log.path) <= 1000
+    version, changed = log.since(29)
+    assert (version, changed) == (30, [("students", "student_29")])
+    assert log.since(27) == (30, [("students", f"student_{i}") for i in range(27, 30)])
+    assert log.since(3) == (30, None)
+
+def test_select_engine_loads_engines_named_by_module_and_class(monkeypatch):
+    reference = storage.FilesEngine({})
+    monkeypatch.setattr(storage, "STORAGE_ENGINE", "json")
+    assert storage.select_engine(reference) is reference
+    monkeypatch.setattr(storage, "STORAGE_ENGINE", "test_storage:MemoryEngine")
+    assert type(storage.select_engine(reference)).__name__ == "MemoryEngine"
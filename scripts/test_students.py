@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Tests for bulk grade imports, running grade totals and paged listings.
+"""
+
+import aggregates
+import students
+
+def _setup(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    students.init_students_db()
+    students.create_student("Emma", "Johnson", 15)
+
+def test_bulk_import_adds_valid_rows_and_reports_the_rest(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    rows, errors = students.read_grade_rows([
+        "student_id,subject,grade,teacher,comment\n",
+        "student_1,Math,90,MathTeacher,\"Good, steady work\"\n",
+        "student_1,Art,75,ArtTeacher,\n",
+        "student_2,Math,80,MathTeacher,\n",
+        "student_1,Math,eighty,MathTeacher,\n",
+    ])
+    assert errors == []
+
+    result = students.add_grades_bulk(rows)
+
+    assert result["added"] == 2
+    assert result["errors"] == [
+        {"row": 4, "error": "Student or subject not found"},
+        {"row": 5, "error": "Invalid grade: 'eighty'"},
+    ]
+    grades = students.get_student_grades("student_1")
+    assert grades["Math"][0]["comment"] == "Good, steady work"
+    assert grades["Art"][0]["grade"] == 75.0
+    assert "comment" not in grades["Art"][0]
+
+def test_strict_bulk_import_adds_nothing_on_error(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    rows, errors = students.read_grade_rows([
+        '{"student_id": "student_1", "subject": "Math", "grade": 90, "teacher": "MathTeacher"}\n',
+        '{"student_id": "student_1", "subject": "Latin", "grade": 70, "teacher": "MathTeacher"}\n',
+    ])
+
+    result = students.add_grades_bulk(rows, strict=True)
+
+    assert result == {"added": 0, "errors": [{"row": 2, "error": "Student or subject not found"}]}
+    assert students.get_student_grades("student_1")["Math"] == []
+
+def test_grade_totals_follow_every_write(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    students.create_student("Michael", "Brown", 16)
+    students.add_student_grade("student_1", "Math", 90, "MathTeacher")
+    students.add_student_grade("student_2", "Math", 70, "MathTeacher")
+    students.add_grades_bulk([
+        {"student_id": "student_1", "subject": "Art", "grade": 60, "teacher": "ArtTeacher"},
+        {"student_id": "student_2", "subject": "Math", "grade": 80, "teacher": "MathTeacher"},
+    ])
+
+    totals = students.load_totals()
+    assert totals["students"]["student_2"]["Math"] == {"count": 2, "sum": 150.0}
+    assert totals["subjects"]["Math"] == {"count": 3, "sum": 240.0}
+
+    students.remove_student("student_2")
+
+    totals = students.load_totals()
+    assert "student_2" not in totals["students"]
+    assert totals["subjects"]["Math"] == {"count": 1, "sum": 90.0}
+    assert aggregates.compare(totals, aggregates.build(students.load_grades())) == []
+
+def test_paged_listing_visits_every_student_once(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    for name in ["Zoe", "Adam", "Mia", "Adam"]:
+        students.create_student(name, "Smith", 14)
+
+    seen = []
+    cursor = None
+    while True:
+        page = list(students.list_students(sort="name", cursor=cursor, limit=2, fields=["id", "name"]))
+        cursor = page.pop()["next"]
+        seen.extend(page)
+        if cursor is None:
+            break
+
+    assert seen == [
+        {"id": "student_3", "name": "Adam"},
+        {"id": "student_5", "name": "Adam"},
+        {"id": "student_1", "name": "Emma"},
+        {"id": "student_4", "name": "Mia"},
+        {"id": "student_2", "name": "Zoe"},
+    ]
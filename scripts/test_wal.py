@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Tests for the write-ahead log storage.
+"""
+
+import os
+import subprocess
+import sys
+import threading
+
+import jsonstore
+import wal
+from jsonstore import change
+
+def test_compaction_waits_for_loads_replaying_its_segments(tmp_path, monkeypatch):
+    path = str(tmp_path / "doc.json")
+    wal.reset(path, {"n": []})
+    for i in range(5):
+        wal.append(path, [change("append", ["n"], i)])
+
+    # Run a compaction between the load's snapshot lookup and its segment
+    # listing, giving it time to finish if nothing stops it
+    compaction = threading.Thread(target=wal.compact, args=(path,))
+    latest_snapshot = wal._latest_snapshot
+
+    def interleaved(target):
+        found = latest_snapshot(target)
+        if not compaction.is_alive() and compaction.ident is None:
+            compaction.start()
+            compaction.join(0.5)
+        return found
+
+    monkeypatch.setattr(wal, "_latest_snapshot", interleaved)
+    assert wal.load(path) == {"n": [0, 1, 2, 3, 4]}
+    monkeypatch.setattr(wal, "_latest_snapshot", latest_snapshot)
+    compaction.join()
+
+    assert len(wal._numbered(path, "snap")) == 1
+    wal.append(path, [change("append", ["n"], 5)])
+    assert wal.load(path) == {"n": [0, 1, 2, 3, 4, 5]}
+
+def test_cached_loads_see_resets_by_other_processes(tmp_path, monkeypatch):
+    monkeypatch.setattr(jsonstore, "_cache_enabled", True)
+    monkeypatch.setattr(wal, "_state", {})
+    path = str(tmp_path / "doc.json")
+    wal.reset(path, {"a": {"x": 1}})
+    wal.append(path, [change("set", ["a", "y"], 2)])
+    assert wal.load(path) == {"a": {"x": 1, "y": 2}}
+
+    # Another process replaces the document and logs a change to it: both
+    # are snapshot 0 and segment 1 again, with the base file rewritten
+    code = ("import wal\n"
+            "from jsonstore import change\n"
+            f"wal.reset({path!r}, {{'a': {{'fresh': True}}}})\n"
+            f"wal.append({path!r}, [change('set', ['b'], 1)])\n")
+    subprocess.run([sys.executable, "-c", code], check=True,
+                   env={**os.environ, "PYTHONPATH": os.path.dirname(os.path.abspath(__file__))})
+
+    assert wal.load(path) == {"a": {"fresh": True}, "b": 1}
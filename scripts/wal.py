@@ -0,0 +1,312 @@
+"""
+Write-ahead log storage for the JSON data files.
+
+With SCHOOL_STORAGE=wal every change (see jsonstore.change) is appended as one
+JSON line to a log segment instead of rewriting the whole data file, so
+recording a grade costs a single small append. Loading reads the latest
+snapshot and replays the segments written after it.
+
+Files for a document stored at data/database.json:
+    data/database.json          base snapshot (the plain JSON file)
+    data/database.json.snap.N   snapshot including every segment up to N
+    data/database.json.wal.N    log segment N
+    data/database.json.wal.lock appends and loads share it; rotation and the
+                                removal of folded files take it exclusively
+    data/database.json.wal.compact held by the process running a compaction
+
+Once the active segment grows past WAL_COMPACT_BYTES it is rotated and the
+finished segments are folded into a new snapshot on a background thread.
+
+Usage:
+    python3 scripts/wal.py compact <data file>
+    python3 scripts/wal.py checkpoint <data file>
+"""
+
+import fcntl
+import json
+import os
+import sys
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import instrument
+from jsonstore import apply_change, cache_enabled, freeze, locked, replace_file, updated_all
+
+# Active segment size that triggers background compaction
+WAL_COMPACT_BYTES = 1024 * 1024
+
+# In-memory replay state per document, only kept when caching is enabled:
+# path -> {"snapshot": (N, file identity), "offsets": {segment: bytes
+# replayed}, "data": ...}. The identity tells a base file rewritten by a
+# reset or checkpoint (in any process) from the one replayed, as both are
+# snapshot 0.
+_state: Dict[str, Dict] = {}
+_compacting = threading.Lock()
+
+def _numbered(path: str, kind: str) -> List[Tuple[int, str]]:
+    """List path.<kind>.<N> files sorted by N"""
+    directory = os.path.dirname(path) or "."
+    prefix = os.path.basename(path) + "." + kind + "."
+    found = []
+    if not os.path.isdir(directory):
+        return found
+    for name in os.listdir(directory):
+        if name.startswith(prefix) and name[len(prefix):].isdigit():
+            found.append((int(name[len(prefix):]), os.path.join(directory, name)))
+    return sorted(found)
+
+def _segments(path: str) -> List[Tuple[int, str]]:
+    return _numbered(path, "wal")
+
+def _latest_snapshot(path: str) -> Tuple[int, Optional[str]]:
+    """Return (N, file) of the newest snapshot; N is 0 for the base file"""
+    snapshots = _numbered(path, "snap")
+    if snapshots:
+        return snapshots[-1]
+    if os.path.exists(path):
+        return 0, path
+    return 0, None
+
+def _lock(path: str, exclusive: bool):
+    """Open and lock the log's lock file; close the returned file to unlock"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    f = open(path + ".wal.lock", "a")
+    fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+    return f
+
+def _replay(data: Any, segment: str, offset: int = 0, records: Optional[List[Dict]] = None) -> int:
+    """Apply the records of a segment from offset on; return the new offset.
+
+    Records are applied to data in place, or collected into records when
+    that is given so the caller can apply them itself.
+    """
+    with instrument.phase("read"):
+        with open(segment, "rb") as f:
+            f.seek(offset)
+            lines = f.readlines()
+    instrument.add("filesRead")
+
+    with instrument.phase("parse"):
+        for line in lines:
+            if not line.endswith(b"\n"):
+                # Record still being written, picked up on the next load
+                break
+            offset += len(line)
+            instrument.add("bytesRead", len(line))
+            instrument.add("logRecordsReplayed")
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Torn write left behind by a crashed writer
+                continue
+            if records is None:
+                apply_change(data, record)
+            else:
+                records.append(record)
+    return offset
+
+def _snapshot_key(path: str) -> Tuple[int, Optional[Tuple[int, int, int]]]:
+    """(N, (mtime_ns, size, inode)) of the newest snapshot; the identity is None without one"""
+    number, snapshot = _latest_snapshot(path)
+    if snapshot is None:
+        return number, None
+    try:
+        st = os.stat(snapshot)
+    except FileNotFoundError:
+        return number, None
+    return number, (st.st_mtime_ns, st.st_size, st.st_ino)
+
+def exists(path: str) -> bool:
+    """Whether the document has a snapshot or any logged changes"""
+    return _latest_snapshot(path)[1] is not None or bool(_segments(path))
+
+def _load_fresh(path: str) -> Dict:
+    key = _snapshot_key(path)
+    number, snapshot = _latest_snapshot(path)
+    data = {}
+    if snapshot is not None:
+        data = instrument.load_json(snapshot)
+
+    offsets = {}
+    for segment_number, segment in _segments(path):
+        if segment_number > number:
+            offsets[segment_number] = _replay(data, segment)
+
+    return {"snapshot": key, "offsets": offsets, "data": data}
+
+def load(path: str) -> Any:
+    """Load the latest snapshot and replay the log on top of it.
+
+    The shared lock is held from reading the snapshot number to the end of
+    the replay, so a compaction cannot remove the segments in between.
+    """
+    lock = _lock(path, exclusive=False)
+    try:
+        return _load(path)
+    finally:
+        lock.close()
+
+def _load(path: str) -> Any:
+    if not cache_enabled():
+        return _load_fresh(path)["data"]
+
+    state = _state.get(path)
+    if state is None or state["snapshot"] != _snapshot_key(path):
+        state = _load_fresh(path)
+        state["data"] = freeze(state["data"])
+        _state[path] = state
+        return state["data"]
+
+    # Same snapshot as last time: only replay what was appended since.
+    # The cached document is shared with earlier callers, so new records
+    # produce a new version of it rather than editing it.
+    records = []
+    for segment_number, segment in _segments(path):
+        if segment_number > state["snapshot"][0]:
+            offset = state["offsets"].get(segment_number, 0)
+            if os.path.getsize(segment) > offset:
+                state["offsets"][segment_number] = _replay(None, segment, offset, records)
+
+    if records:
+        state["data"] = updated_all(state["data"], records)
+    return state["data"]
+
+def append(path: str, changes: List[Dict]):
+    """Append changes to the active log segment"""
+    with instrument.phase("serialize"):
+        payload = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in changes)
+
+    lock = _lock(path, exclusive=False)
+    try:
+        segments = _segments(path)
+        last = segments[-1][0] if segments else 0
+        snapshot_number = _latest_snapshot(path)[0]
+        number = last if last > snapshot_number else snapshot_number + 1
+        segment = f"{path}.wal.{number}"
+
+        fd = os.open(segment, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            size = os.fstat(fd).st_size
+            if size and os.pread(fd, 1, size - 1) != b"\n":
+                # Start on a fresh line after a torn write
+                payload = "\n" + payload
+            with instrument.phase("write"):
+                os.write(fd, payload.encode("utf-8"))
+                os.fsync(fd)
+            instrument.add("bytesWritten", len(payload))
+            instrument.add("filesWritten")
+            size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+    finally:
+        lock.close()
+
+    if size >= WAL_COMPACT_BYTES:
+        threading.Thread(target=compact, args=(path,)).start()
+
+def _rotate(path: str) -> int:
+    """Start a new active segment; return the number of the last finished one"""
+    lock = _lock(path, exclusive=True)
+    try:
+        segments = _segments(path)
+        last = max(segments[-1][0] if segments else 0, _latest_snapshot(path)[0])
+        open(f"{path}.wal.{last + 1}", "a").close()
+        return last
+    finally:
+        lock.close()
+
+def _write_atomic(target: str, data: Any):
+    text = instrument.dump_json(data, indent=2)
+    tmp = target + ".tmp"
+    with instrument.phase("write"):
+        with open(tmp, "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        replace_file(tmp, target)
+    instrument.add("bytesWritten", len(text))
+    instrument.add("filesWritten")
+
+def compact(path: str) -> bool:
+    """Fold every finished log segment into a new snapshot"""
+    if not _compacting.acquire(blocking=False):
+        return False
+
+    guard = None
+    try:
+        guard = open(path + ".wal.compact", "a")
+        try:
+            fcntl.flock(guard, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            # Another process is already compacting
+            return False
+
+        last = _rotate(path)
+        number, snapshot = _latest_snapshot(path)
+        if last <= number:
+            return False
+
+        data = {}
+        if snapshot is not None:
+            with open(snapshot, "r") as f:
+                data = json.load(f)
+        for segment_number, segment in _segments(path):
+            if number < segment_number <= last:
+                _replay(data, segment)
+
+        _write_atomic(f"{path}.snap.{last}", data)
+
+        # The new snapshot is durable; older files are now redundant, once
+        # no reader is replaying them
+        lock = _lock(path, exclusive=True)
+        try:
+            for snapshot_number, old in _numbered(path, "snap"):
+                if snapshot_number < last:
+                    os.remove(old)
+            for segment_number, segment in _segments(path):
+                if segment_number <= last:
+                    os.remove(segment)
+        finally:
+            lock.close()
+        return True
+    finally:
+        if guard is not None:
+            guard.close()
+        _compacting.release()
+
+def checkpoint(path: str):
+    """Write the fully replayed document back to the plain JSON file"""
+    with locked(path):
+        lock = _lock(path, exclusive=True)
+        try:
+            data = _load_fresh(path)["data"]
+            _write_atomic(path, data)
+            _remove_log(path)
+        finally:
+            lock.close()
+
+def reset(path: str, data: Any):
+    """Replace the document and discard its log"""
+    lock = _lock(path, exclusive=True)
+    try:
+        _write_atomic(path, data)
+        _remove_log(path)
+    finally:
+        lock.close()
+
+def _remove_log(path: str):
+    for _, old in _numbered(path, "snap") + _segments(path):
+        os.remove(old)
+    _state.pop(path, None)
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ("compact", "checkpoint"):
+        print("Usage: python wal.py <compact|checkpoint> <data file>")
+        sys.exit(1)
+
+    if sys.argv[1] == "compact":
+        compacted = compact(sys.argv[2])
+        print(json.dumps({"success": True, "compacted": compacted}))
+    else:
+        checkpoint(sys.argv[2])
+        print(json.dumps({"success": True, "message": "Log folded into " + sys.argv[2]}))